@@ -1,14 +1,36 @@
-from flask import Flask, send_from_directory
+from flask import Flask, jsonify
 from flask_cors import CORS
 from login import login_bp
 from empleado import empleado_bp
+from importacion import importacion_bp
+from exportacion import exportacion_bp
+from estaticos import estaticos_bp
+from busqueda import busqueda_bp, construir_indice
+from reportes import reportes_bp, construir_reportes
+from cambios import cambios_bp, seguidor
+from trabajos import trabajos_bp
 from departamento import departamento_bp
 from supervisor import supervisor_bp
-from conexion import get_db_connection
+import admision
+import conexion
+import metricas
+import serializacion
+import compresion
+import trabajos
+from conexion import get_circuit_stats, get_db_connection, get_pool_stats, get_replica_stats
+import configuracion
+from cache import get_cache_stats
+from imagenes import cargar_variantes
 import os
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=[conexion.RYW_HEADER])  # Leer lo escrito desde otros orígenes (ver conexion)
+conexion.init_app(app)  # Devolver al pool la conexión de cada petición
+serializacion.init_app(app)  # JSON con orjson si está instalado (antes de metricas, que mide app.json.dumps)
+metricas.init_app(app)  # Latencias por ruta, tiempos de base de datos y /metrics
+admision.init_app(app)  # Límite de peticiones por ruta, 503 al saturarse y plazo por petición
+compresion.init_app(app)  # gzip/brotli de las respuestas grandes
+trabajos.init_app(app)  # Cola de trabajos en segundo plano (GET /jobs/<id>)
 
 # Configurar la carpeta donde se guardarán las fotos
 UPLOAD_FOLDER = 'uploads/'
@@ -16,28 +38,66 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Limitar tamaño máximo de archivo a 16MB
+app.config['USE_X_SENDFILE'] = configuracion.get('USE_X_SENDFILE', False, bool)  # Delegar las fotos al servidor web frontal
 
 # Función para verificar si el archivo tiene una extensión válida
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Ruta para servir las imágenes
-@app.route('/uploads/<filename>')
-def serve_image(filename):
-    # Servir la imagen desde la carpeta 'uploads'
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
 # Registrar los Blueprints
 app.register_blueprint(login_bp)
 app.register_blueprint(empleado_bp)
+app.register_blueprint(importacion_bp)
+app.register_blueprint(exportacion_bp)  # GET /empleados/export en CSV, NDJSON o Parquet
 app.register_blueprint(departamento_bp)
 app.register_blueprint(supervisor_bp)
+app.register_blueprint(estaticos_bp)  # Servir las fotos de 'uploads'
+app.register_blueprint(busqueda_bp)
+app.register_blueprint(reportes_bp)
+app.register_blueprint(cambios_bp)  # Registro de cambios y stream SSE
+app.register_blueprint(trabajos_bp)
 
 @app.route('/')
 def index():
     return "Bienvenido a la API de Login y Empleados"
 
+# Estadísticas del pool de conexiones (en uso, en espera, tiempos de espera), del disyuntor,
+# de las réplicas y de la admisión por ruta
+@app.route('/pool/stats')
+def pool_stats():
+    stats = get_pool_stats()
+    stats['circuit'] = get_circuit_stats()
+    stats['admission'] = admision.get_admision_stats()
+    replicas = get_replica_stats()
+    if replicas:
+        stats['replicas'] = replicas
+    return jsonify(stats), 200
+
+# Aciertos y fallos de la caché de lecturas
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(get_cache_stats()), 200
+
+# Estado del pool y de las cachés en /metrics
+metricas.Gauges('db_pool', 'Estado del pool de conexiones', ('stat',),
+                lambda: {(key,): value for key, value in get_pool_stats().items()})
+metricas.Gauges('db_circuit', 'Disyuntor de la base de datos principal', ('stat',),
+                lambda: {(key,): float(value) for key, value in get_circuit_stats().items()
+                         if isinstance(value, (int, float))})
+metricas.Gauges('admission', 'Peticiones en curso, en espera y rechazadas por ruta', ('endpoint', 'stat'),
+                lambda: {(endpoint, key): value for endpoint, stats in admision.get_admision_stats().items()
+                         for key, value in stats.items()})
+metricas.Gauges('db_replica', 'Estado de los pools de las réplicas de lectura', ('replica', 'stat'),
+                lambda: {(name, key): float(value) for name, stats in get_replica_stats().items()
+                         for key, value in stats.items() if isinstance(value, (int, float))})
+metricas.Gauges('response_cache', 'Contadores de la caché de lecturas', ('cache', 'stat'),
+                lambda: {(name, key): value for name, stats in get_cache_stats().items() for key, value in stats.items()})
+
 def verificar_conexion():
+    try:
+        conexion.init_pool()  # Precalentar el pool con todas sus conexiones
+    except Exception as e:
+        print(f"Error al precalentar el pool de conexiones: {e}")
     connection = get_db_connection()
     if connection and connection.is_connected():
         print("🔗 Base de datos conectada exitosamente.")
@@ -45,6 +105,25 @@ def verificar_conexion():
     else:
         print("❌ Error al conectar con la base de datos.")
 
+# Cargar los datos en memoria antes de atender peticiones
+def preparar():
+    cargar_variantes()    # Registrar miniaturas existentes y generar las que falten
+    construir_indice()    # Cargar el índice de búsqueda en memoria
+    construir_reportes()  # Totales por departamento y supervisor
+
 if __name__ == '__main__':
-    verificar_conexion()  # Verificar conexión a la base de datos al iniciar
-    app.run(debug=True)
+    # API_MODE: sync (servidor de desarrollo), asgi (ver APIRUN_async.py; también con su nombre
+    # anterior, async) o production (ver servidor.py)
+    mode = configuracion.get('API_MODE', 'sync')
+    if mode in ('asgi', 'async'):
+        import APIRUN_async
+        APIRUN_async.run()
+    elif mode == 'production':
+        import servidor
+        servidor.run()
+    else:
+        verificar_conexion()  # Verificar conexión a la base de datos al iniciar
+        preparar()
+        trabajos.iniciar()  # Ejecutar los trabajos en segundo plano en este proceso
+        seguidor.iniciar()  # Aplicar los cambios de la tabla cambios a los datos en memoria
+        app.run(debug=True)
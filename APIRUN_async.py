@@ -0,0 +1,74 @@
+#APIRUN_async.py
+# Modo ASGI de la API: la misma app Flask de APIRUN.py, con las mismas rutas, respuestas y
+# middlewares, servida por hypercorn. El bucle de eventos atiende las conexiones (keep-alive,
+# cuerpos que llegan por partes, clientes lentos recibiendo un stream), pero los manejadores
+# siguen siendo síncronos: cada petición ocupa un hilo del ejecutor mientras espera a MySQL,
+# así que las peticiones en curso por proceso están acotadas por ASYNC_THREADS, como con los
+# hilos de gunicorn. No hay manejadores async con un driver async: serían un segundo juego de
+# rutas que repetir (autenticación, admisión, cachés, réplicas, versiones, registro de cambios).
+# Se arranca con API_MODE=asgi python APIRUN.py (async es el nombre anterior del modo) o con
+# un servidor ASGI: hypercorn APIRUN_async:app
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+
+import APIRUN
+import conexion
+from cambios import CAMBIOS_SSE_MAX, seguidor
+import configuracion
+import trabajos
+
+ASYNC_THREADS = configuracion.get('ASYNC_THREADS', 64, int)  # Hilos del ejecutor: peticiones en curso a la vez en el proceso
+
+_wsgi = AsyncioWSGIMiddleware(APIRUN.app, max_body_size=APIRUN.app.config['MAX_CONTENT_LENGTH'])
+
+
+def _arrancar():
+    APIRUN.verificar_conexion()  # Precalentar el pool
+    APIRUN.preparar()
+    trabajos.iniciar()
+    seguidor.iniciar()
+
+
+async def _lifespan(receive, send):
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Las peticiones usan el ejecutor por defecto del bucle: se dimensiona aquí. Cada
+            # GET /changes/stream ocupa un hilo mientras está abierto: tienen hilos propios
+            # para que los suscriptores no dejen sin hilos a las escrituras que ellos esperan
+            hilos = ASYNC_THREADS + CAMBIOS_SSE_MAX
+            loop.set_default_executor(ThreadPoolExecutor(hilos, thread_name_prefix='api'))
+            try:
+                await loop.run_in_executor(None, _arrancar)
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await loop.run_in_executor(None, conexion.close_pool)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    else:
+        await _wsgi(scope, receive, send)
+
+
+def run():
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [configuracion.get('API_BIND', '0.0.0.0:5000')]
+    config.accesslog = configuracion.get('WEB_ACCESSLOG', '-')
+    asyncio.run(serve(app, config, mode='asgi'))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,136 @@
+#admision.py
+# Control de admisión por ruta: cada endpoint atiende como mucho N peticiones a la vez y deja
+# esperar turno a unas pocas durante un tiempo acotado; las demás reciben 503 con Retry-After
+# al momento en lugar de acumularse mientras la base de datos va lenta. Cada petición admitida
+# lleva además un plazo que conexion respeta al esperar el pool y traslada a MySQL.
+import threading
+import time
+
+from flask import g, jsonify, request
+
+import configuracion
+
+ADMISION_LIMITE = configuracion.get('ADMISION_LIMITE', 16, int)     # Peticiones simultáneas por ruta (0 = sin límite)
+ADMISION_COLA = configuracion.get('ADMISION_COLA', 16, int)         # Peticiones esperando turno por ruta
+ADMISION_ESPERA = configuracion.get('ADMISION_ESPERA', 1.0, float)  # Segundos máximos esperando turno
+ADMISION_PLAZO = configuracion.get('ADMISION_PLAZO', 30.0, float)   # Segundos por petición (0 = sin plazo)
+ADMISION_RETRY_AFTER = 1
+
+# Límites propios de las rutas pesadas; ADMISION_RUTAS los cambia: "endpoint=N,endpoint=N"
+RUTAS = {
+    'exportacion.export_users': 2,
+    'importacion.bulk_import': 2,
+    'reportes.reporte_reconstruir': 1,
+}
+RUTAS.update({endpoint.strip(): int(limite)
+              for endpoint, _, limite in (item.partition('=') for item in configuracion.get('ADMISION_RUTAS', '').split(','))
+              if endpoint.strip()})
+# Sin límite: el estado del servicio tiene que responder también bajo carga
+EXENTAS = {'index', 'metrics', 'pool_stats', 'cache_stats'}
+
+
+class Limite:
+    """Peticiones en curso de una ruta, con una cola de espera acotada en tamaño y en tiempo."""
+
+    def __init__(self, maximo, cola=ADMISION_COLA):
+        self.maximo = maximo
+        self.cola = cola
+        self.activas = 0
+        self.esperando = 0
+        self.rechazadas = 0
+        self._lock = threading.Condition()
+
+    def entrar(self, espera):
+        with self._lock:
+            if self.activas < self.maximo:
+                self.activas += 1
+                return True
+            if self.esperando >= self.cola:
+                self.rechazadas += 1
+                return False
+            self.esperando += 1
+            try:
+                limite = time.monotonic() + espera
+                while self.activas >= self.maximo:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.rechazadas += 1
+                        return False
+                    self._lock.wait(restante)
+                self.activas += 1
+                return True
+            finally:
+                self.esperando -= 1
+
+    def salir(self):
+        with self._lock:
+            self.activas -= 1
+            self._lock.notify()
+
+    def stats(self):
+        with self._lock:
+            return {'limit': self.maximo, 'active': self.activas, 'waiting': self.esperando,
+                    'rejected': self.rechazadas}
+
+
+_limites = {}
+_limites_lock = threading.Lock()
+
+
+def _limite(endpoint):
+    limite = _limites.get(endpoint)
+    if limite is None:
+        maximo = RUTAS.get(endpoint, ADMISION_LIMITE)
+        if not maximo:
+            return None
+        with _limites_lock:
+            limite = _limites.setdefault(endpoint, Limite(maximo))
+    return limite
+
+
+def sobrecargado(retry_after=ADMISION_RETRY_AFTER):
+    response = jsonify({'error': 'Servidor ocupado, inténtalo de nuevo'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+
+def restante():
+    """Segundos que le quedan a la petición en curso (None fuera de una petición o sin plazo)."""
+    plazo = g.get('_plazo')
+    return plazo - time.monotonic() if plazo is not None else None
+
+
+def sin_plazo():
+    # Respuestas que se transmiten durante minutos (exportaciones, ?stream=): sin plazo
+    g._plazo = None
+
+
+def _admitir():
+    # El plazo cuenta desde la llegada, incluida la espera de turno
+    g._plazo = time.monotonic() + ADMISION_PLAZO if ADMISION_PLAZO else None
+    if request.endpoint is None or request.endpoint in EXENTAS:
+        return None
+    limite = _limite(request.endpoint)
+    if limite is None:
+        return None
+    if not limite.entrar(ADMISION_ESPERA):
+        return sobrecargado()
+    g._admision = limite
+    return None
+
+
+def _salir(exception=None):
+    # Con stream_with_context la petición sigue ocupando su plaza hasta terminar de enviar
+    limite = g.pop('_admision', None)
+    if limite is not None:
+        limite.salir()
+
+
+def get_admision_stats():
+    return {endpoint: limite.stats() for endpoint, limite in list(_limites.items())}
+
+
+def init_app(app):
+    # Antes que los before_request de los blueprints (token, etc.): se rechaza sin trabajo previo
+    app.before_request(_admitir)
+    app.teardown_request(_salir)
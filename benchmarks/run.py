@@ -0,0 +1,362 @@
+#benchmarks/run.py
+# Prueba de carga reproducible de la API.
+#
+# Arranca la aplicación en un servidor local con hilos, la conecta a SQLite (por defecto)
+# o a la MySQL configurada, siembra los datos y lanza carga concurrente sobre cada ruta.
+# El resultado (peticiones/s, p50/p95/p99, errores y RSS máximo) se escribe en JSON y,
+# si hay una línea base guardada, se compara con ella: una regresión termina con código 1.
+#
+#   python -m benchmarks.run --empleados 100000 --concurrency 16 --duration 10
+#   python -m benchmarks.run --empleados 1000 --save-baseline
+#   python -m benchmarks.run --backend mysql --seed --empleados 1000000
+import argparse
+import hashlib
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+# --- Escenarios ---
+
+class Scenario:
+    """Una ruta a medir: build(rnd) devuelve (método, ruta, cuerpo, cabeceras)."""
+
+    def __init__(self, name, build):
+        self.name = name
+        self.build = build
+
+
+def get(name, path):
+    return Scenario(name, lambda rnd: ('GET', path(rnd) if callable(path) else path, None, {}))
+
+
+def post_json(name, path, data):
+    body = json.dumps(data).encode()
+    return Scenario(name, lambda rnd: ('POST', path, body, {'Content-Type': 'application/json'}))
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def build_scenarios(empleados, ids, foto_ext, foto, foto_url, id_departamento, id_supervisor):
+    from benchmarks.seed import BENCH_PASSWORD, BENCH_USER
+
+    primero, ultimo = ids
+    contador = iter(range(10 ** 12))
+
+    def upload(rnd):
+        # Bytes distintos tras el final de la imagen para que cada subida sea una foto nueva
+        body, content_type = multipart({
+            'nombre': 'Bench', 'apellido': 'Carga', 'fecha_nac': '1990-01-01', 'ciudad': 'Lima',
+            'direccion': 'Calle 1', 'telefono': '900000000', 'idDepartamento': id_departamento,
+            'idSupervisor': id_supervisor, 'salario': 1500,
+        }, {'foto': (f'foto.{foto_ext}', foto + f'bench-{next(contador)}'.encode())})
+        return 'POST', '/empleados', body, {'Content-Type': content_type}
+
+    scenarios = []
+    # La lista completa solo tiene sentido a escala pequeña; a gran escala cada petición
+    # tardaría segundos y se mide la página máxima en su lugar
+    if empleados <= 10000:
+        scenarios.append(get('empleados_all', '/empleados'))
+    else:
+        scenarios.append(get('empleados_page_max', '/empleados?limit=1000'))
+    scenarios += [
+        get('empleados_page', '/empleados?limit=100'),
+        get('empleados_filter', '/empleados?ciudad=Lima&salario_min=5000&sort=-salario&limit=100'),
+        get('empleados_by_id', lambda rnd: f'/empleados/{rnd.randint(primero, ultimo)}'),
+        get('departamentos', '/departamentos'),
+        get('supervisores', '/supervisores'),
+        post_json('login', '/login', {'user': BENCH_USER, 'pass': BENCH_PASSWORD}),
+        get('uploads_get', foto_url),
+        Scenario('empleados_upload', upload),
+    ]
+    return scenarios
+
+
+# --- Carga ---
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def peak_rss_mb():
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scenario(scenario, port, concurrency, duration, max_requests, warmup):
+    latencies = []
+    statuses = {}
+    errors = []
+    lock = threading.Lock()
+    restantes = [max_requests] if max_requests else None
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        local = []
+        local_status = {}
+        fin_warmup = time.perf_counter() + warmup
+        fin = fin_warmup + duration
+        while True:
+            ahora = time.perf_counter()
+            if ahora >= fin:
+                break
+            if restantes is not None and ahora >= fin_warmup:
+                with lock:
+                    if restantes[0] <= 0:
+                        break
+                    restantes[0] -= 1
+            method, path, body, headers = scenario.build(rnd)
+            inicio = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                with lock:
+                    errors.append(str(e))
+                status = 'error'
+            elapsed = time.perf_counter() - inicio
+            if inicio >= fin_warmup:
+                local.append(elapsed)
+                local_status[status] = local_status.get(status, 0) + 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            for status, count in local_status.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = max(time.perf_counter() - inicio - warmup, 1e-9)
+
+    latencies.sort()
+    failed = sum(count for status, count in statuses.items() if status == 'error' or status >= 400)
+    return {
+        'requests': len(latencies),
+        'errors': failed,
+        'status': {str(k): v for k, v in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'sample_errors': errors[:3],
+    }
+
+
+# --- Línea base ---
+
+def compare(result, baseline, tolerance):
+    """Lista de regresiones de result frente a baseline (mismo nombre de escenario)."""
+    regressions = []
+    for name, actual in result['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        if actual['errors'] > base.get('errors', 0):
+            regressions.append(f"{name}: {actual['errors']} errores (línea base {base.get('errors', 0)})")
+        if base['throughput_rps'] and actual['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: {actual['throughput_rps']} pet/s frente a {base['throughput_rps']}")
+        for key in ('p95_ms', 'p99_ms'):
+            if base[key] and actual[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {actual[key]} frente a {base[key]}")
+    base_rss = baseline.get('peak_rss_mb')
+    if base_rss and result['peak_rss_mb'] > base_rss * (1 + tolerance):
+        regressions.append(f"RSS máximo {result['peak_rss_mb']} MB frente a {base_rss} MB")
+    return regressions
+
+
+# --- Preparación ---
+
+def setup_backend(args, workdir, foto_path):
+    import conexion
+    import repositorio
+    from benchmarks import seed as semilla
+    from seguridad import make_password
+
+    if args.backend == 'sqlite':
+        from benchmarks import sqlite_db
+        path = os.path.join(workdir, 'bench.sqlite3')
+        sqlite_db.create_schema(path)
+        conexion.set_connection_factory(lambda: sqlite_db.connect(path))
+        # Réplicas de prueba: conexiones de solo lectura al mismo archivo (sin retraso de replicación)
+        conexion.set_replica_factories({f'sqlite-ro-{i}': lambda: sqlite_db.connect(path, readonly=True)
+                                        for i in range(args.replicas)})
+        # SQLite no tiene sentencias preparadas en el servidor; guarda compiladas las que se repiten
+        repositorio.set_backend(repositorio.BackendTexto())
+        do_seed = True
+    else:
+        do_seed = args.seed
+
+    connection = conexion.get_db_connection()
+    if connection is None:
+        raise SystemExit('No se pudo conectar con la base de datos')
+    try:
+        if do_seed:
+            inicio = time.perf_counter()
+            datos = semilla.seed(connection, args.empleados, args.departamentos, args.supervisores,
+                                 foto=foto_path, password_hash=make_password(semilla.BENCH_PASSWORD))
+            datos['seconds'] = round(time.perf_counter() - inicio, 2)
+            print(f"🌱 Sembrados {datos['empleados']} empleados en {datos['seconds']} s")
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*), MIN(idEmpleados), MAX(idEmpleados) FROM tb_empleados")
+        total, primero, ultimo = cursor.fetchone()
+        cursor.execute("SELECT MIN(idDepartamento) FROM departamento")
+        id_departamento = cursor.fetchone()[0]
+        cursor.execute("SELECT MIN(idSupervisor) FROM supervisor")
+        id_supervisor = cursor.fetchone()[0]
+    finally:
+        connection.close()
+    if not total:
+        raise SystemExit('La tabla tb_empleados está vacía: usa --seed para sembrarla')
+    return total, (primero, ultimo), id_departamento, id_supervisor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de carga de la API')
+    parser.add_argument('--backend', choices=('sqlite', 'mysql'), default='sqlite')
+    parser.add_argument('--seed', action='store_true', help='Sembrar la MySQL configurada (SQLite siempre se siembra)')
+    parser.add_argument('--replicas', type=int, default=0,
+                        help='Réplicas de lectura de prueba con SQLite (con MySQL se usa DB_REPLICAS)')
+    parser.add_argument('--empleados', type=int, default=1000, help='Filas de tb_empleados (1000, 100000, 1000000...)')
+    parser.add_argument('--departamentos', type=int, default=None)
+    parser.add_argument('--supervisores', type=int, default=None)
+    parser.add_argument('--concurrency', type=int, default=8, help='Clientes simultáneos por escenario')
+    parser.add_argument('--duration', type=float, default=5.0, help='Segundos de medición por escenario')
+    parser.add_argument('--requests', type=int, default=0, help='Máximo de peticiones por escenario (0 = sin límite)')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Segundos de calentamiento sin medir')
+    parser.add_argument('--only', default='', help='Escenarios separados por comas')
+    parser.add_argument('--output', default='-', help='Archivo JSON de resultados (- para la salida estándar)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Guardar este resultado como línea base')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Empeoramiento permitido frente a la línea base')
+    args = parser.parse_args(argv)
+
+    # Rutas y configuración se resuelven antes de cambiar de directorio
+    output_path = args.output if args.output == '-' else os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+    os.environ.setdefault('API_CONFIG', os.path.abspath('config.ini'))
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    # Todos los logins salen de 127.0.0.1: el límite por IP mediría el 429, no la ruta
+    os.environ.setdefault('LOGIN_LIMIT_IP', str(10 ** 9))
+
+    # Las fotos se escriben en ./uploads: usar un directorio temporal
+    workdir = tempfile.mkdtemp(prefix='api-bench-')
+    os.chdir(workdir)
+
+    from benchmarks.seed import sample_photo
+    foto_ext, foto = sample_photo()
+    os.makedirs('uploads', exist_ok=True)
+    foto_path = os.path.join('uploads', f'{hashlib.sha256(foto).hexdigest()}.{foto_ext}')
+    with open(foto_path, 'wb') as f:
+        f.write(foto)
+
+    import APIRUN
+    import conexion
+    import trabajos
+    from werkzeug.serving import make_server
+
+    total, ids, id_departamento, id_supervisor = setup_backend(args, workdir, foto_path)
+    APIRUN.preparar()
+    trabajos.iniciar()  # Variantes de las fotos subidas
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # Sin una línea de log por petición
+    server = make_server('127.0.0.1', 0, APIRUN.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    scenarios = build_scenarios(total, ids, foto_ext, foto, '/' + foto_path, id_departamento, id_supervisor)
+    if args.only:
+        wanted = set(args.only.split(','))
+        scenarios = [s for s in scenarios if s.name in wanted]
+
+    result = {
+        'backend': args.backend,
+        'replicas': len(conexion.get_replica_stats()),
+        'empleados': total,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'scenarios': {},
+    }
+    for scenario in scenarios:
+        data = run_scenario(scenario, port, args.concurrency, args.duration, args.requests, args.warmup)
+        result['scenarios'][scenario.name] = data
+        print(f"{scenario.name:18} {data['throughput_rps']:>9} pet/s  p50 {data['p50_ms']:>8} ms  "
+              f"p95 {data['p95_ms']:>8} ms  p99 {data['p99_ms']:>8} ms  errores {data['errors']}", file=sys.stderr)
+    result['peak_rss_mb'] = peak_rss_mb()
+    server.shutdown()
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if output_path == '-':
+        print(output)
+    else:
+        with open(output_path, 'w') as f:
+            f.write(output + '\n')
+
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            f.write(output + '\n')
+        print(f"💾 Línea base guardada en {baseline_path}", file=sys.stderr)
+        return 0
+
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get('empleados') != total or baseline.get('backend') != args.backend:
+            print('⚠️  La línea base es de otra escala o backend; no se compara.', file=sys.stderr)
+            return 0
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print('❌ Regresiones frente a la línea base:', file=sys.stderr)
+            for line in regressions:
+                print(f'   {line}', file=sys.stderr)
+            return 1
+        print('✅ Sin regresiones frente a la línea base.', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#benchmarks/seed.py
+# Datos sintéticos y reproducibles para los benchmarks: departamentos, supervisores,
+# empleados y un usuario de login, insertados por lotes con executemany.
+import io
+import random
+
+CIUDADES = ['Lima', 'Quito', 'Bogotá', 'Caracas', 'Santiago', 'La Paz', 'Asunción',
+            'Montevideo', 'Buenos Aires', 'Guayaquil', 'Medellín', 'Cusco']
+NOMBRES = ['Ana', 'Luis', 'María', 'Carlos', 'Lucía', 'Jorge', 'Sofía', 'Pedro', 'Elena',
+           'Miguel', 'Valeria', 'Diego', 'Camila', 'Andrés', 'Paula', 'Javier']
+APELLIDOS = ['García', 'Rodríguez', 'Martínez', 'López', 'González', 'Pérez', 'Sánchez',
+             'Ramírez', 'Torres', 'Flores', 'Rivera', 'Gómez', 'Díaz', 'Vargas', 'Castro']
+
+BENCH_USER = 'bench'
+BENCH_PASSWORD = 'bench-password'
+BATCH = 5000
+
+
+def sample_photo():
+    """Imagen JPEG de prueba (GIF de 1x1 si no está Pillow)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return 'gif', (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+                       b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+    image = Image.new('RGB', (640, 480), (30, 120, 200))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return 'jpg', buffer.getvalue()
+
+
+def default_scale(empleados):
+    # Proporciones aproximadas de una empresa real
+    return max(10, empleados // 10000), max(10, empleados // 100)
+
+
+def _insert(connection, query, rows):
+    cursor = connection.cursor()
+    for start in range(0, len(rows), BATCH):
+        cursor.executemany(query, rows[start:start + BATCH])
+    connection.commit()
+    cursor.close()
+
+
+def seed(connection, empleados, departamentos=None, supervisores=None, foto=None, password_hash=None):
+    """Inserta los datos y devuelve un resumen con los ids generados."""
+    rnd = random.Random(42)
+    default_dep, default_sup = default_scale(empleados)
+    departamentos = departamentos or default_dep
+    supervisores = supervisores or default_sup
+
+    _insert(connection, "INSERT INTO departamento (nombre) VALUES (%s)",
+            [(f'Departamento {i + 1}',) for i in range(departamentos)])
+    _insert(connection, "INSERT INTO supervisor (nombre, apellidos, estado, foto) VALUES (%s, %s, %s, %s)",
+            [(rnd.choice(NOMBRES), f'{rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}', 'activo', foto)
+             for _ in range(supervisores)])
+
+    # Los ids pueden no empezar en 1 si la base ya tenía datos
+    cursor = connection.cursor()
+    cursor.execute("SELECT idDepartamento FROM departamento ORDER BY idDepartamento DESC LIMIT %s", (departamentos,))
+    id_departamentos = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT idSupervisor FROM supervisor ORDER BY idSupervisor DESC LIMIT %s", (supervisores,))
+    id_supervisores = [row[0] for row in cursor.fetchall()]
+
+    query = """
+        INSERT INTO tb_empleados (nombre, apellido, fecha_nac, ciudad, direccion, telefono, idDepartamento, idSupervisor, salario, foto)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    for start in range(0, empleados, BATCH):
+        rows = []
+        for i in range(start, min(start + BATCH, empleados)):
+            rows.append((
+                rnd.choice(NOMBRES), rnd.choice(APELLIDOS),
+                f'{rnd.randint(1960, 2004)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}',
+                rnd.choice(CIUDADES), f'Calle {rnd.randint(1, 999)} #{i}', f'9{rnd.randint(10000000, 99999999)}',
+                rnd.choice(id_departamentos), rnd.choice(id_supervisores),
+                round(rnd.uniform(900, 9000), 2), foto if i % 4 == 0 else None,
+            ))
+        cursor.executemany(query, rows)
+        connection.commit()
+    cursor.close()
+
+    if password_hash:
+        _insert(connection, "INSERT INTO login (user, pass) VALUES (%s, %s)", [(BENCH_USER, password_hash)])
+
+    return {'empleados': empleados, 'departamentos': departamentos, 'supervisores': supervisores}
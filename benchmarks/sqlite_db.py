@@ -0,0 +1,175 @@
+#benchmarks/sqlite_db.py
+# Sustituto de mysql.connector sobre SQLite para los benchmarks: implementa lo que usan
+# los blueprints (cursores de diccionario, %s, lastrowid, rowcount...) y se instala con
+# conexion.set_connection_factory, de modo que el código medido es el mismo que en producción.
+import re
+import sqlite3
+
+from mysql.connector import Error
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS departamento (
+    idDepartamento INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS supervisor (
+    idSupervisor INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    apellidos TEXT NOT NULL,
+    estado TEXT,
+    foto TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS tb_empleados (
+    idEmpleados INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    apellido TEXT NOT NULL,
+    fecha_nac TEXT,
+    ciudad TEXT,
+    direccion TEXT,
+    telefono TEXT,
+    idDepartamento INTEGER,
+    idSupervisor INTEGER,
+    salario REAL,
+    foto TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_empleados_departamento ON tb_empleados (idDepartamento);
+CREATE INDEX IF NOT EXISTS idx_empleados_supervisor ON tb_empleados (idSupervisor);
+CREATE INDEX IF NOT EXISTS idx_empleados_ciudad ON tb_empleados (ciudad);
+CREATE INDEX IF NOT EXISTS idx_empleados_salario ON tb_empleados (salario);
+CREATE TABLE IF NOT EXISTS cambios (
+    seq INTEGER PRIMARY KEY,
+    entidad TEXT NOT NULL,
+    accion TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    datos TEXT,
+    creado TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS cambios_secuencia (
+    id INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    purgado INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cambios_secuencia (id, seq, purgado) VALUES (1, 0, 0);
+CREATE TABLE IF NOT EXISTS login (
+    idlogin INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL UNIQUE,
+    pass TEXT NOT NULL
+);
+"""
+
+_PLACEHOLDER = re.compile(r'%s')
+
+
+def _concat(*values):
+    # CONCAT de MySQL devuelve NULL si algún argumento es NULL
+    if any(v is None for v in values):
+        return None
+    return ''.join(str(v) for v in values)
+
+
+class Cursor:
+    def __init__(self, connection, dictionary=False, **kwargs):
+        self._cursor = connection._db.cursor()
+        self._dictionary = dictionary
+        self.rowcount = -1
+        self.lastrowid = None
+        self.description = None
+        self.column_names = ()
+
+    def _run(self, fn, operation, params):
+        try:
+            fn(_PLACEHOLDER.sub('?', operation), params)
+        except sqlite3.Error as e:
+            raise Error(msg=str(e))
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        self.description = self._cursor.description
+        self.column_names = tuple(d[0] for d in self.description) if self.description else ()
+
+    def execute(self, operation, params=None):
+        self._run(self._cursor.execute, operation, tuple(params or ()))
+
+    def executemany(self, operation, seq_params):
+        self._run(self._cursor.executemany, operation, [tuple(p) for p in seq_params])
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    unread_result = False  # SQLite no deja resultados pendientes en el servidor
+
+    def __init__(self, path, readonly=False):
+        # Cada conexión la usa un solo hilo a la vez, pero el pool la pasa entre hilos
+        if readonly:
+            # Réplica de prueba: cualquier escritura enviada por error falla
+            self._db = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=30, check_same_thread=False)
+        else:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.create_function('CONCAT', -1, _concat)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._open = True
+
+    @property
+    def in_transaction(self):
+        return self._db.in_transaction
+
+    def cursor(self, dictionary=False, **kwargs):
+        return Cursor(self, dictionary=dictionary, **kwargs)
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False):
+        if not self._open:
+            raise Error(msg='Conexión cerrada')
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        self._open = False
+        self._db.close()
+
+
+def connect(path, readonly=False):
+    return Connection(path, readonly=readonly)
+
+
+def create_schema(path):
+    db = sqlite3.connect(path)
+    try:
+        db.executescript(SCHEMA)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,279 @@
+from flask import Blueprint, jsonify, request
+from conexion import get_db_connection
+from cambios import secuencia, seguidor
+from seguridad import verificar_token
+import bisect
+import heapq
+import itertools
+import math
+import operator
+import re
+import threading
+import unicodedata
+
+import repositorio
+
+busqueda_bp = Blueprint('busqueda', __name__)
+busqueda_bp.before_request(verificar_token)
+
+# Campos indexados por tipo de documento
+CAMPOS_EMPLEADO = ['nombre', 'apellido', 'ciudad', 'telefono']
+CAMPOS_SUPERVISOR = ['nombre', 'apellidos']
+
+SEARCH_LIMIT_MAX = 100
+FUZZY_MIN = 0.4   # Similitud mínima de trigramas para una coincidencia aproximada
+FUZZY_CANDIDATES_MAX = 2000  # Tokens comparados como mucho por término en la búsqueda aproximada
+SCORE_EXACT = 3.0
+SCORE_PREFIX = 2.0
+
+_TOKEN = re.compile(r'\w+')
+_FIN = chr(0x10FFFF)  # Mayor que cualquier carácter: term + _FIN acota los tokens con ese prefijo
+_TOKEN_DE = operator.itemgetter(0)
+_PUNTUACION = operator.itemgetter(1)
+
+
+def normalizar(texto):
+    # Minúsculas y sin tildes: "García" -> "garcia"
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return texto.lower()
+
+
+def tokens(texto):
+    return _TOKEN.findall(normalizar(texto)) if texto is not None else []
+
+
+def trigramas(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Índice invertido en memoria con búsqueda por prefijo y aproximada por trigramas."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}        # (tipo, id) -> datos mostrados en los resultados
+        self._doc_tokens = {}  # (tipo, id) -> tokens del documento
+        self._postings = {}    # token -> {(tipo, id)}
+        self._vocab = []       # tokens ordenados para buscar por prefijo
+        self._trigrams = {}    # trigrama -> {token}
+        self._ngrams = {}      # token -> número de trigramas
+        self.ready = False
+        self.seq = 0  # Último cambio (tabla cambios) aplicado
+
+    def add(self, tipo, id, datos):
+        campos = CAMPOS_EMPLEADO if tipo == 'empleado' else CAMPOS_SUPERVISOR
+        key = (tipo, id)
+        doc_tokens = set()
+        for campo in campos:
+            doc_tokens.update(tokens(datos.get(campo)))
+        with self._lock:
+            self._remove(key)
+            self._docs[key] = {'tipo': tipo, 'id': id, **{campo: datos.get(campo) for campo in campos}}
+            self._doc_tokens[key] = doc_tokens
+            for token in doc_tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = set()
+                    bisect.insort(self._vocab, token)
+                    token_trigrams = trigramas(token)
+                    self._ngrams[token] = len(token_trigrams)
+                    for trigram in token_trigrams:
+                        self._trigrams.setdefault(trigram, set()).add(token)
+                postings.add(key)
+
+    def remove(self, tipo, id):
+        with self._lock:
+            self._remove((tipo, id))
+
+    def _remove(self, key):
+        self._docs.pop(key, None)
+        for token in self._doc_tokens.pop(key, ()):
+            postings = self._postings.get(token)
+            postings.discard(key)
+            if not postings:
+                del self._postings[token]
+                del self._ngrams[token]
+                del self._vocab[bisect.bisect_left(self._vocab, token)]
+                for trigram in trigramas(token):
+                    bucket = self._trigrams[trigram]
+                    bucket.discard(token)
+                    if not bucket:
+                        del self._trigrams[trigram]
+
+    def _match_term(self, term):
+        # token -> puntuación para un término de la consulta
+        # Los tokens con ese prefijo ocupan un tramo contiguo del vocabulario ordenado
+        vocab = self._vocab
+        start = bisect.bisect_left(vocab, term)
+        end = bisect.bisect_left(vocab, term + _FIN, start)
+        matches = dict.fromkeys(itertools.islice(vocab, start, end), SCORE_PREFIX)
+        if term in matches:
+            matches[term] = SCORE_EXACT
+        if len(term) >= 3:
+            for token, similarity in self._fuzzy(term):
+                matches.setdefault(token, similarity)
+        return matches
+
+    def _fuzzy(self, term):
+        """Tokens con similitud de trigramas (Jaccard) >= FUZZY_MIN."""
+        query_trigrams = trigramas(term)
+        q = len(query_trigrams)
+        # Con similitud >= FUZZY_MIN se comparten al menos ceil(FUZZY_MIN * q) trigramas, así que
+        # el token está en alguno de los q - minimo + 1 grupos más pequeños: los trigramas muy
+        # comunes (el primer dígito de los teléfonos, etc.) no hace falta recorrerlos
+        minimo = max(1, math.ceil(FUZZY_MIN * q))
+        buckets = sorted((self._trigrams.get(trigram, ()) for trigram in query_trigrams), key=len)
+        candidates = set()
+        for bucket in buckets[:q - minimo + 1]:
+            restantes = FUZZY_CANDIDATES_MAX - len(candidates)
+            if restantes <= 0:
+                break
+            candidates.update(itertools.islice(bucket, restantes))
+        for token in candidates:
+            n = self._ngrams[token]
+            # La similitud no puede superar min(q, n) / max(q, n)
+            if n * FUZZY_MIN > q or q * FUZZY_MIN > n:
+                continue
+            count = sum(1 for bucket in buckets if token in bucket)
+            similarity = count / (q + n - count)
+            if similarity >= FUZZY_MIN:
+                yield token, similarity
+
+    def search(self, query, tipo=None, limit=20, offset=0):
+        """Devuelve (total, resultados de la página) ordenados por relevancia."""
+        terms = tokens(query)
+        if not terms:
+            return 0, []
+        with self._lock:
+            # Cada documento suma la mejor puntuación de cada término; se ordena por términos encontrados
+            totals = {}   # documento -> suma de puntuaciones
+            matched = {}  # documento -> términos encontrados (con más de un término)
+            for i, term in enumerate(terms):
+                # De menor a mayor puntuación: cada documento se queda con la última, la mejor.
+                # Los tokens con la misma puntuación se aplican juntos, en una sola operación
+                best = {}
+                por_puntuacion = sorted(self._match_term(term).items(), key=_PUNTUACION)
+                for score, grupo in itertools.groupby(por_puntuacion, key=_PUNTUACION):
+                    keys = itertools.chain.from_iterable(map(self._postings.__getitem__, map(_TOKEN_DE, grupo)))
+                    if tipo:
+                        keys = (key for key in keys if key[0] == tipo)
+                    best.update(dict.fromkeys(keys, score))
+                if i == 0:
+                    totals = best
+                    continue
+                if i == 1:
+                    matched = dict.fromkeys(totals, 1)
+                for key, score in best.items():
+                    totals[key] = totals.get(key, 0.0) + score
+                    matched[key] = matched.get(key, 0) + 1
+            # Solo se ordena y se construye la página pedida, no todas las coincidencias
+            if matched:
+                entries = ((-matched[key], -total, key) for key, total in totals.items())
+            else:
+                entries = zip(map(operator.neg, totals.values()), totals.keys())
+            ranked = heapq.nsmallest(offset + limit, entries)
+            page = [dict(self._docs[entry[-1]], score=round(-entry[-2], 3)) for entry in ranked[offset:]]
+            return len(totals), page
+
+
+indice = SearchIndex()
+_rebuild_lock = threading.Lock()
+_eventos_lock = threading.Lock()
+_pendientes = None  # Cambios recibidos durante una reconstrucción, para aplicarlos al índice nuevo
+
+
+def construir_indice():
+    """Carga empleados y supervisores en un índice nuevo y sustituye el actual.
+
+    Devuelve False si ya había una reconstrucción en curso o no hubo conexión.
+    """
+    global indice, _pendientes
+    if not _rebuild_lock.acquire(blocking=False):
+        return False
+    try:
+        connection = get_db_connection()
+        if not connection or not connection.is_connected():
+            print("❌ No se pudo construir el índice de búsqueda.")
+            return False
+        with _eventos_lock:
+            _pendientes = []
+        try:
+            # La secuencia antes que los datos: los cambios posteriores se aplican después
+            seq = secuencia(connection)[0]
+            empleados = repositorio.empleados_busqueda(connection)
+            supervisores = repositorio.supervisores_busqueda(connection)
+        except Exception:
+            with _eventos_lock:
+                _pendientes = None
+            raise
+        finally:
+            connection.close()
+
+        nuevo = SearchIndex()
+        nuevo.seq = seq
+        for empleado in empleados:
+            nuevo.add('empleado', empleado['idEmpleados'], empleado)
+        for supervisor in supervisores:
+            nuevo.add('supervisor', supervisor['idSupervisor'], supervisor)
+        with _eventos_lock:
+            # Las escrituras confirmadas mientras se leía pueden no estar en la lectura
+            for cambio in _pendientes:
+                _aplicar(nuevo, *cambio)
+            _pendientes = None
+            nuevo.ready = True
+            indice = nuevo
+        seguidor.desde(seq)
+        print(f"🔎 Índice de búsqueda construido: {len(empleados)} empleados, {len(supervisores)} supervisores.")
+        return True
+    finally:
+        _rebuild_lock.release()
+
+
+def _aplicar(destino, seq, entidad, accion, id, datos):
+    if seq <= destino.seq:
+        return
+    destino.seq = seq
+    if entidad not in ('empleado', 'supervisor'):
+        return
+    if accion == 'delete':
+        destino.remove(entidad, id)
+    elif datos is not None:
+        destino.add(entidad, id, datos)
+
+
+# Mantener el índice al día con las escrituras de todos los workers (tabla cambios)
+def actualizar_indice(seq, entidad, accion, id, datos):
+    with _eventos_lock:
+        _aplicar(indice, seq, entidad, accion, id, datos)
+        if _pendientes is not None:
+            _pendientes.append((seq, entidad, accion, id, datos))
+
+
+seguidor.seguir(actualizar_indice, construir_indice)
+
+
+# GET: Buscar empleados y supervisores por nombre, apellidos, ciudad o teléfono
+@busqueda_bp.route('/search', methods=['GET'])
+def search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Falta el parámetro q'}), 400
+
+    tipo = request.args.get('tipo')
+    if tipo not in (None, 'empleado', 'supervisor'):
+        return jsonify({'error': 'tipo debe ser empleado o supervisor'}), 400
+
+    try:
+        limit = int(request.args.get('limit', 20))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'Parámetros de paginación no válidos'}), 400
+    if limit < 1 or limit > SEARCH_LIMIT_MAX or offset < 0:
+        return jsonify({'error': f'limit debe estar entre 1 y {SEARCH_LIMIT_MAX}'}), 400
+
+    if not indice.ready:
+        return jsonify({'error': 'El índice de búsqueda aún no está disponible'}), 503
+
+    total, results = indice.search(query, tipo, limit, offset)
+    return jsonify({'total': total, 'data': results}), 200
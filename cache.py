@@ -0,0 +1,145 @@
+#cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, current_app, request
+
+import configuracion
+from compresion import COMPRESS_MIN_SIZE, comprimir, elegir_codificacion
+from conexion import escritura_del_cliente, lectura_de_replica, secuencia_leida, ultima_escritura
+
+CACHE_TTL = configuracion.get('CACHE_TTL', 300.0, float)       # Segundos de vida de cada entrada
+CACHE_MAXSIZE = configuracion.get('CACHE_MAXSIZE', 512, int)   # Entradas máximas antes de expulsar la menos usada
+
+_caches = {}
+
+
+class CacheEntry:
+    def __init__(self, body, etag, expires, seq=0):
+        self.body = body
+        self.etag = etag
+        self.expires = expires
+        self.seq = seq  # Secuencia de cambios que seguro contienen los datos
+        self._encoded = {}  # Cuerpo comprimido por codificación, calculado la primera vez
+
+    def encoded(self, encoding):
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = self._encoded[encoding] = comprimir(self.body, encoding)
+        return body
+
+
+class ResponseCache:
+    """Caché en memoria de respuestas JSON con TTL y expulsión LRU.
+
+    Con réplicas de lectura no se guarda lo leído de una réplica que aún no ha aplicado la
+    última escritura que invalidó la caché, y un cliente que acaba de escribir (X-Last-Write)
+    no recibe entradas anteriores a su escritura.
+    """
+
+    def __init__(self, name, ttl=CACHE_TTL, maxsize=CACHE_MAXSIZE):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0  # Aumenta con cada invalidación
+        self.seq = 0         # Secuencia de cambios de la última invalidación
+        _caches[name] = self
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            if entry.seq < escritura_del_cliente():
+                # Anterior a lo que el cliente ya escribió: se lee de nuevo (sin descartarla)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, data, generation=None, etag=None):
+        return self.set_json(key, current_app.json.dumps(data), generation, etag)
+
+    def set_json(self, key, body, generation=None, etag=None):
+        # El cuerpo ya serializado (p. ej. las listas que el repositorio devuelve en JSON).
+        # Por defecto el ETag es el hash del cuerpo; las filas con versión usan la versión
+        body = body.encode('utf-8')
+        etag = etag or hashlib.md5(body).hexdigest()
+        entry = CacheEntry(body, etag, time.monotonic() + self.ttl, secuencia_leida())
+        with self._lock:
+            # Si hubo una escritura mientras se leía de la base de datos, no guardar datos viejos
+            if generation is not None and generation != self.generation:
+                return entry
+            # Ni los de una réplica que aún no tiene la escritura que invalidó la caché
+            if entry.seq < self.seq and lectura_de_replica() is not None:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self, seq=None):
+        # seq: el cambio que invalida (por defecto, la escritura de esta petición)
+        with self._lock:
+            self._entries.clear()
+            self._invalidar(seq)
+
+    def discard(self, key, seq=None):
+        # Solo esa entrada (p. ej. datos que dependen de otra tabla); también cuenta como escritura
+        with self._lock:
+            self._entries.pop(key, None)
+            self._invalidar(seq)
+
+    def _invalidar(self, seq):
+        self.invalidations += 1
+        self.generation += 1
+        seq = seq or ultima_escritura()
+        if seq and seq > self.seq:
+            self.seq = seq
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def cached_response(entry):
+    encoding = elegir_codificacion() if len(entry.body) >= COMPRESS_MIN_SIZE else None
+    # Responder 304 si el cliente ya tiene esta versión (comprimida o no)
+    if request.if_none_match.contains_weak(entry.etag):
+        response = Response(status=304)
+    elif encoding:
+        response = Response(entry.encoded(encoding), status=200, mimetype='application/json')
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = Response(entry.body, status=200, mimetype='application/json')
+    response.set_etag(entry.etag, weak=encoding is not None)
+    if len(entry.body) >= COMPRESS_MIN_SIZE:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def get_cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,402 @@
+#cambios.py
+# Registro de cambios para la sincronización incremental de los clientes.
+# Cada escritura de empleados, departamentos y supervisores se anota en la tabla cambios,
+# dentro de su misma transacción, con un número de secuencia creciente. GET /changes?since=N
+# devuelve lo ocurrido después de N y GET /changes/stream lo envía en vivo (server-sent events)
+# desde un único difusor por proceso, que reparte cada lote a todos los suscriptores.
+# Un seguidor por proceso lee esa misma tabla para mantener al día lo que cada worker guarda
+# en memoria (índice de búsqueda, reportes, cachés) con las escrituras de todos los workers.
+# Cubre todos los modos de APIRUN.py: el modo ASGI sirve estos mismos blueprints.
+import json
+import queue
+import threading
+
+from flask import Blueprint, Response, current_app, jsonify, request
+
+import configuracion
+from conexion import anotar_escritura, anotar_secuencia, get_db_connection, sin_conexion
+from eventos import suscribir
+from seguridad import verificar_token
+
+cambios_bp = Blueprint('cambios', __name__)
+cambios_bp.before_request(verificar_token)
+
+CAMBIOS_MAX = configuracion.get('CAMBIOS_MAX', 100000, int)              # Cambios conservados en la tabla
+CAMBIOS_PURGA = configuracion.get('CAMBIOS_PURGA', 1000, int)            # Purgar los antiguos cada N cambios
+CAMBIOS_LIMIT_MAX = 1000                                                  # Cambios por página de GET /changes
+CAMBIOS_POLL = configuracion.get('CAMBIOS_POLL', 1.0, float)             # Segundos entre lecturas del difusor
+CAMBIOS_HEARTBEAT = configuracion.get('CAMBIOS_HEARTBEAT', 15.0, float)  # Comentario SSE para mantener la conexión
+CAMBIOS_COLA = configuracion.get('CAMBIOS_COLA', 100, int)               # Lotes pendientes por suscriptor
+# Cada stream ocupa un hilo mientras está abierto: con gunicorn uno del worker (ver WEB_THREADS);
+# en el modo ASGI, APIRUN_async añade estos hilos a los de ASYNC_THREADS
+CAMBIOS_SSE_MAX = configuracion.get('CAMBIOS_SSE_MAX', 100, int)
+
+CAMBIOS_QUERY = "SELECT seq, entidad, accion, id, datos, creado FROM cambios WHERE seq > %s ORDER BY seq LIMIT %s"
+
+
+def registrar_cambios(connection, cambios):
+    """Anota cambios [(entidad, accion, id, datos), ...] en la transacción en curso.
+
+    Llamar justo antes del commit: el contador de cambios_secuencia queda bloqueado hasta
+    entonces, así que las secuencias se confirman en orden y sin huecos y un lector que ve
+    la N ya ve todas las anteriores.
+    """
+    if not cambios:
+        return
+    dumps = current_app.json.dumps
+    cursor = connection.cursor()
+    try:
+        cursor.execute("UPDATE cambios_secuencia SET seq = seq + %s", (len(cambios),))
+        cursor.execute("SELECT seq FROM cambios_secuencia")
+        ultimo = cursor.fetchall()[0][0]
+        primero = ultimo - len(cambios) + 1
+        cursor.executemany(
+            "INSERT INTO cambios (seq, entidad, accion, id, datos) VALUES (%s, %s, %s, %s, %s)",
+            [(primero + i, entidad, accion, id, dumps(datos) if datos is not None else None)
+             for i, (entidad, accion, id, datos) in enumerate(cambios)])
+        if ultimo // CAMBIOS_PURGA != (primero - 1) // CAMBIOS_PURGA and ultimo > CAMBIOS_MAX:
+            cursor.execute("DELETE FROM cambios WHERE seq <= %s", (ultimo - CAMBIOS_MAX,))
+            cursor.execute("UPDATE cambios_secuencia SET purgado = %s", (ultimo - CAMBIOS_MAX,))
+    finally:
+        cursor.close()
+    anotar_escritura(ultimo)  # La respuesta la devuelve en X-Last-Write (ver conexion)
+
+
+def secuencia(connection):
+    """(última secuencia confirmada, última secuencia purgada)."""
+    cursor = connection.cursor()
+    cursor.execute("SELECT seq, purgado FROM cambios_secuencia")
+    row = cursor.fetchall()[0]
+    cursor.close()
+    return row[0], row[1]
+
+
+def leer_cambios(connection, since, limit):
+    cursor = connection.cursor()
+    cursor.execute(CAMBIOS_QUERY, (since, limit))
+    rows = cursor.fetchall()
+    cursor.close()
+    return [{'seq': seq, 'entidad': entidad, 'accion': accion, 'id': id,
+             'datos': json.loads(datos) if datos is not None else None, 'creado': creado}
+            for seq, entidad, accion, id, datos, creado in rows]
+
+
+def _evento_sse(dumps, cambio):
+    return f"id: {cambio['seq']}\nevent: {cambio['entidad']}.{cambio['accion']}\ndata: {dumps(cambio)}\n\n"
+
+
+class Difusor:
+    """Un hilo por proceso lee los cambios nuevos y reparte cada lote a todos los streams.
+
+    Las escrituras de este proceso lo despiertan al momento; las de otros workers se ven
+    en la siguiente lectura, cada CAMBIOS_POLL segundos. El hilo solo corre mientras hay
+    suscriptores.
+    """
+
+    def __init__(self):
+        self._colas = set()
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._dumps = None
+        self.ultimo = None  # Última secuencia repartida
+
+    def suscribir(self, dumps):
+        cola = queue.Queue(maxsize=CAMBIOS_COLA)
+        with self._lock:
+            if len(self._colas) >= CAMBIOS_SSE_MAX:
+                return None
+            self._colas.add(cola)
+            self._dumps = dumps
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._run, daemon=True)
+                self._hilo.start()
+        return cola
+
+    def cancelar(self, cola):
+        with self._lock:
+            self._colas.discard(cola)
+
+    def activa(self, cola):
+        with self._lock:
+            return cola in self._colas
+
+    def despertar(self):
+        self._despertar.set()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._colas:
+                    self._hilo = None
+                    self.ultimo = None
+                    return
+            # La primera lectura es inmediata: fija la secuencia de partida en cuanto hay un
+            # suscriptor, antes de que otra escritura quede entre su puesta al día y el difusor
+            try:
+                self._repartir()
+            except Exception as e:
+                print(f"Error al leer los cambios para los streams: {e}")
+            self._despertar.wait(CAMBIOS_POLL)
+            self._despertar.clear()
+
+    def _repartir(self):
+        connection = get_db_connection()
+        if not connection or not connection.is_connected():
+            return
+        try:
+            if self.ultimo is None:
+                self.ultimo = secuencia(connection)[0]
+            while True:
+                cambios = leer_cambios(connection, self.ultimo, CAMBIOS_LIMIT_MAX)
+                if not cambios:
+                    return
+                # Cada evento se serializa una vez, no una por suscriptor
+                lote = [(cambio['seq'], _evento_sse(self._dumps, cambio)) for cambio in cambios]
+                self.ultimo = lote[-1][0]
+                with self._lock:
+                    colas = list(self._colas)
+                for cola in colas:
+                    try:
+                        cola.put_nowait(lote)
+                    except queue.Full:
+                        # Suscriptor demasiado lento: se le corta y reanuda con Last-Event-ID
+                        self.cancelar(cola)
+        finally:
+            connection.close()
+
+
+difusor = Difusor()
+
+
+# Las escrituras de este proceso despiertan al difusor sin esperar a la siguiente lectura
+@suscribir
+def avisar_difusor(entidad, accion, id, datos):
+    difusor.despertar()
+
+
+class Seguidor:
+    """Un hilo por proceso lee los cambios por secuencia y se los pasa, en orden, a los
+    componentes en memoria: fn(seq, entidad, accion, id, datos).
+
+    Ve las escrituras de todos los workers, no solo las de este proceso. Cada componente
+    recuerda la última secuencia que aplicó e ignora las demás, así que al reconstruirse lee
+    la secuencia actual antes que los datos y avisa con desde(). Las escrituras de este
+    proceso lo despiertan al momento; las de otros workers se ven en la siguiente lectura,
+    cada CAMBIOS_POLL segundos. Si los cambios pendientes ya se purgaron de la tabla, se
+    reconstruyen los componentes.
+    """
+
+    def __init__(self):
+        self._consumidores = []
+        self._reconstrucciones = []
+        self._lock = threading.Lock()  # Un solo reparto a la vez
+        self._despertar = threading.Event()
+        self._hilo = None
+        self.ultimo = None  # Última secuencia repartida
+
+    def seguir(self, fn, reconstruir=None):
+        """Registra fn y, si se da, reconstruir() para cuando faltan cambios por leer."""
+        self._consumidores.append(fn)
+        if reconstruir is not None:
+            self._reconstrucciones.append(reconstruir)
+
+    def desde(self, seq):
+        """Los cambios posteriores a seq aún están por aplicar (un componente recién construido)."""
+        if self.ultimo is None or seq < self.ultimo:
+            self.ultimo = seq
+
+    def iniciar(self):
+        # Los hilos no sobreviven al fork: cada worker arranca el suyo y se pone al día
+        # desde la secuencia de los datos que heredó
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._run, daemon=True, name='cambios')
+            self._hilo.start()
+
+    def despertar(self):
+        self._despertar.set()
+
+    def _run(self):
+        while True:
+            try:
+                with self._lock:
+                    perdidos = self._repartir()
+                if perdidos:
+                    self._reconstruir()
+            except Exception as e:
+                print(f"Error al aplicar los cambios: {e}")
+            self._despertar.wait(CAMBIOS_POLL)
+            self._despertar.clear()
+
+    def _repartir(self):
+        """Aplica los cambios nuevos; devuelve True si algunos ya no están en la tabla."""
+        connection = get_db_connection()
+        if not connection or not connection.is_connected():
+            return False
+        try:
+            if self.ultimo is None:
+                self.ultimo = secuencia(connection)[0]
+            while True:
+                cambios = leer_cambios(connection, self.ultimo, CAMBIOS_LIMIT_MAX)
+                if not cambios:
+                    anotar_secuencia(self.ultimo)
+                    return False
+                # Las secuencias no tienen huecos: si falta la siguiente, se purgó
+                if cambios[0]['seq'] > self.ultimo + 1:
+                    return True
+                for cambio in cambios:
+                    for fn in self._consumidores:
+                        try:
+                            fn(cambio['seq'], cambio['entidad'], cambio['accion'], cambio['id'], cambio['datos'])
+                        except Exception as e:
+                            print(f"Error al aplicar el cambio {cambio['seq']}: {e}")
+                self.ultimo = cambios[-1]['seq']
+                if len(cambios) < CAMBIOS_LIMIT_MAX:
+                    anotar_secuencia(self.ultimo)
+                    return False
+        finally:
+            connection.close()
+
+    def _reconstruir(self):
+        print(f"⚠️ Faltan cambios posteriores a {self.ultimo}: se reconstruyen los datos en memoria.")
+        self.ultimo = None
+        for reconstruir in self._reconstrucciones:
+            reconstruir()
+
+
+seguidor = Seguidor()
+
+
+# Las escrituras de este proceso despiertan al seguidor sin esperar a la siguiente lectura
+@suscribir
+def avisar_seguidor(entidad, accion, id, datos):
+    seguidor.despertar()
+
+
+def _since(value):
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('since debe ser un número de secuencia')
+    if since < 0:
+        raise ValueError('since debe ser un número de secuencia')
+    return since
+
+
+def _perdidos(since, purgado):
+    return jsonify({'error': f'Los cambios anteriores a {purgado + 1} ya no se conservan; '
+                             'vuelve a descargar los datos completos',
+                    'since': since}), 410
+
+
+# GET: Cambios posteriores a ?since= (sin since, solo la secuencia actual para empezar)
+# El cliente guarda "seq" de la respuesta y lo envía como since en la siguiente petición
+@cambios_bp.route('/changes', methods=['GET'])
+def get_changes():
+    try:
+        since = _since(request.args['since']) if 'since' in request.args else None
+        limit = int(request.args.get('limit', 500))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if limit < 1 or limit > CAMBIOS_LIMIT_MAX:
+        return jsonify({'error': f'limit debe estar entre 1 y {CAMBIOS_LIMIT_MAX}'}), 400
+
+    connection = None
+    try:
+        connection = get_db_connection()
+        if connection and connection.is_connected():
+            actual, purgado = secuencia(connection)
+            if since is None:
+                return jsonify({'changes': [], 'seq': actual, 'more': False}), 200
+            if since < purgado:
+                return _perdidos(since, purgado)
+
+            # Una fila extra para saber si hay más
+            cambios = leer_cambios(connection, since, limit + 1)
+            more = len(cambios) > limit
+            cambios = cambios[:limit]
+            seq = cambios[-1]['seq'] if cambios else max(since, 0)
+            return jsonify({'changes': cambios, 'seq': seq, 'more': more}), 200
+        return sin_conexion()
+
+    except Exception as e:
+        return jsonify({'error': f'Error al leer los cambios: {e}'}), 500
+
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+
+
+# GET: Stream SSE de cambios; reanuda desde Last-Event-ID o ?since=, o empieza en el actual
+@cambios_bp.route('/changes/stream', methods=['GET'])
+def stream_changes():
+    try:
+        inicio = request.headers.get('Last-Event-ID') or request.args.get('since')
+        since = _since(inicio) if inicio is not None else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    dumps = current_app.json.dumps
+    cola = difusor.suscribir(dumps)
+    if cola is None:
+        return jsonify({'error': 'Demasiados streams abiertos, inténtalo más tarde'}), 503
+
+    # Sin stream_with_context: el generador no retiene la conexión de la petición;
+    # cada lectura pide una conexión al pool y la devuelve antes de enviar nada
+    def ponerse_al_dia(enviado):
+        """Envía los cambios posteriores a 'enviado' leídos de la tabla; devuelve la última secuencia."""
+        while True:
+            connection = get_db_connection()
+            if not connection or not connection.is_connected():
+                raise RuntimeError('No hay conexión con la base de datos')
+            try:
+                actual, purgado = secuencia(connection)
+                perdidos = enviado is not None and enviado < purgado
+                if enviado is None or perdidos:
+                    cambios = None
+                else:
+                    cambios = leer_cambios(connection, enviado, CAMBIOS_LIMIT_MAX)
+            finally:
+                connection.close()
+            if cambios is None:
+                if perdidos:
+                    # El cliente debe volver a descargar todo; se sigue desde la secuencia actual
+                    yield f"event: reset\ndata: {dumps({'seq': actual})}\n\n"
+                return actual
+            if cambios:
+                yield ''.join(_evento_sse(dumps, cambio) for cambio in cambios)
+                enviado = cambios[-1]['seq']
+            if len(cambios) < CAMBIOS_LIMIT_MAX:
+                return enviado
+
+    def generate():
+        try:
+            yield f"retry: {int(CAMBIOS_POLL * 3000)}\n\n"
+            enviado = yield from ponerse_al_dia(since)
+            while True:
+                try:
+                    lote = cola.get(timeout=CAMBIOS_HEARTBEAT)
+                except queue.Empty:
+                    if not difusor.activa(cola):
+                        return
+                    ultimo = difusor.ultimo
+                    if ultimo is not None and ultimo > enviado:
+                        # Cambios que el difusor ya había pasado al arrancar: no llegarán en ningún lote
+                        enviado = yield from ponerse_al_dia(enviado)
+                    yield ": ping\n\n"
+                    continue
+                if lote[0][0] > enviado + 1:
+                    # Hueco entre lo leído de la tabla y lo que reparte el difusor
+                    enviado = yield from ponerse_al_dia(enviado)
+                    continue
+                texto = ''.join(evento for seq, evento in lote if seq > enviado)
+                enviado = max(enviado, lote[-1][0])
+                if texto:
+                    yield texto
+        finally:
+            difusor.cancelar(cola)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Que nginx no acumule los eventos
+    return response
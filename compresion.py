@@ -0,0 +1,95 @@
+#compresion.py
+# Compresión gzip/brotli de las respuestas grandes según Accept-Encoding.
+import functools
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Sin el paquete brotli solo se ofrece gzip
+    brotli = None
+
+from flask import request
+
+import configuracion
+
+COMPRESS_MIN_SIZE = configuracion.get('COMPRESS_MIN_SIZE', 1024, int)  # Bytes a partir de los que se comprime
+COMPRESS_LEVEL = configuracion.get('COMPRESS_LEVEL', 6, int)           # Nivel de gzip (1-9)
+BROTLI_QUALITY = configuracion.get('BROTLI_QUALITY', 4, int)           # Calidad de brotli (0-11)
+
+COMPRESSIBLE = {'application/json', 'application/x-ndjson', 'text/plain', 'text/csv', 'text/html'}
+
+
+def elegir_codificacion():
+    """Codificación que acepta el cliente: br, gzip o None."""
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def comprimir(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+
+
+def comprimir_stream(chunks, encoding):
+    """Comprime al vuelo un cuerpo que se transmite por trozos (str o bytes).
+
+    Cada trozo se vacía del compresor al recibirlo, así el cliente recibe datos mientras
+    se genera el resto y la memoria no depende del tamaño total.
+    """
+    if encoding == 'br':
+        compresor = brotli.Compressor(quality=BROTLI_QUALITY)
+        procesar, vaciar, terminar = compresor.process, compresor.flush, compresor.finish
+    else:
+        compresor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)  # wbits 31: formato gzip
+        procesar = compresor.compress
+        vaciar = functools.partial(compresor.flush, zlib.Z_SYNC_FLUSH)
+        terminar = compresor.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = procesar(chunk) + vaciar()
+            if data:
+                yield data
+        yield terminar()
+    finally:
+        # Si el cliente corta la descarga, cerrar también el generador de origen
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def _comprimible(response):
+    return (response.status_code == 200
+            and not response.direct_passthrough   # send_file: las fotos ya van comprimidas
+            and not response.is_streamed
+            and 'Content-Encoding' not in response.headers
+            and response.mimetype in COMPRESSIBLE)
+
+
+def _after_request(response):
+    if not _comprimible(response):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = elegir_codificacion()
+    if encoding is None:
+        return response
+    response.set_data(comprimir(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # La versión comprimida es otra representación: el ETag pasa a ser débil
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.after_request(_after_request)
@@ -1,16 +1,699 @@
 #coonexion.py
+# Pool de conexiones al primario y, si se configuran DB_REPLICAS, a las réplicas de lectura:
+# los GET van a una réplica sana que ya tenga la última escritura que vio el cliente (leer lo
+# escrito: cada escritura responde con su secuencia de cambios en X-Last-Write y el cliente la
+# devuelve en sus lecturas, en esa cabecera o en la cookie db_primary).
+# Un disyuntor corta el acceso al primario tras varios fallos seguidos y las peticiones
+# esperan y consultan solo dentro de su plazo (ver admision).
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+
 import mysql.connector
 from mysql.connector import Error
+from flask import g, has_app_context, has_request_context, jsonify, request
+
+import configuracion
+import metricas
+from admision import restante
+
+DB_CONFIG = {
+    'host': configuracion.get('DB_HOST', 'localhost'),
+    'database': configuracion.get('DB_NAME', 'empleados'),
+    'user': configuracion.get('DB_USER', 'root'),
+    'password': configuracion.get('DB_PASSWORD', '')
+}
+
+# Parámetros del pool de conexiones
+POOL_SIZE = configuracion.get('DB_POOL_SIZE', 10, int)              # Conexiones máximas abiertas
+POOL_TIMEOUT = configuracion.get('DB_POOL_TIMEOUT', 5.0, float)     # Segundos de espera para obtener una conexión
+POOL_IDLE_CHECK = configuracion.get('DB_POOL_IDLE_CHECK', 30.0, float)  # Validar conexiones ociosas más de N segundos
+POOL_RECYCLE = configuracion.get('DB_POOL_RECYCLE', 3600, int)      # Reemplazar conexiones con más de N segundos de vida
+
+# Réplicas de lectura: host[:puerto] separados por comas (misma base de datos, usuario y contraseña)
+DB_REPLICAS = [h.strip() for h in configuracion.get('DB_REPLICAS', '').split(',') if h.strip()]
+REPLICA_POLICY = configuracion.get('DB_REPLICA_POLICY', 'round_robin')   # round_robin o least_latency
+REPLICA_CHECK = configuracion.get('DB_REPLICA_CHECK', 5.0, float)        # Segundos entre comprobaciones de salud
+REPLICA_EJECT = configuracion.get('DB_REPLICA_EJECT', 30.0, float)       # Segundos fuera tras un fallo
+REPLICA_MAX_LAG = configuracion.get('DB_REPLICA_MAX_LAG', 0, int)        # Retraso máximo en segundos (0 = no comprobar)
+READ_YOUR_WRITES = configuracion.get('DB_READ_YOUR_WRITES', 5, int)     # Segundos que la cookie recuerda la última escritura
+RYW_COOKIE = 'db_primary'
+RYW_HEADER = 'X-Last-Write'
+# Secuencia de cambios que ya contiene una base de datos: se confirma en la misma transacción
+# que los datos, así que una réplica que la tiene ya ha aplicado esas escrituras
+SECUENCIA_QUERY = "SELECT seq FROM cambios_secuencia"
+
+# Disyuntor del primario: fallos seguidos que lo abren (0 = desactivado) y segundos hasta la siguiente prueba
+BREAKER_FALLOS = configuracion.get('DB_BREAKER_FAILURES', 5, int)
+BREAKER_ESPERA = configuracion.get('DB_BREAKER_RESET', 10.0, float)
+# Errores de consulta que indican que la base de datos no responde (no los de datos o sintaxis):
+# no se puede conectar, conexión perdida y consulta cortada por max_execution_time
+ERRORES_BD = {2003, 2006, 2013, 2055, 3024}
+
+
+def _abrir_conexion():
+    return _conectar(DB_CONFIG)
+
+
+def _abrir_replica(host):
+    host, _, port = host.partition(':')
+    config = dict(DB_CONFIG, host=host)
+    if port:
+        config['port'] = int(port)
+    return lambda: _conectar(config)
+
+
+def _conectar(config):
+    raw = mysql.connector.connect(**config)
+    # max_execution_time de la sesión (0 = el del servidor, sin límite); solo las conexiones
+    # MySQL lo tienen, ver _limitar_consultas
+    raw._max_execution_time = 0
+    return raw
+
+
+def _limitar_consultas(raw, segundos):
+    # MySQL corta los SELECT que duren más que lo que le queda a la petición; en segundo
+    # plano (segundos None) no hay límite. Se redondea a segundos para no repetir el SET.
+    actual = getattr(raw, '_max_execution_time', None)
+    if actual is None:
+        return
+    limite = max(1, math.ceil(segundos)) * 1000 if segundos is not None else 0
+    if limite != actual:
+        cursor = raw.cursor()
+        cursor.execute(f"SET SESSION max_execution_time = {int(limite)}")
+        cursor.close()
+        raw._max_execution_time = limite
+
+
+class Circuito:
+    """Disyuntor del primario.
+
+    Tras BREAKER_FALLOS fallos seguidos (al conectar, al esperar el pool o en consultas de
+    ERRORES_BD) se abre: get_db_connection devuelve None al momento en lugar de esperar a
+    una base de datos que no responde. Cada BREAKER_ESPERA segundos deja pasar una petición
+    de prueba y la primera consulta correcta lo vuelve a cerrar.
+    """
+
+    def __init__(self, fallos=BREAKER_FALLOS, espera=BREAKER_ESPERA):
+        self.umbral = fallos
+        self.espera = espera
+        self.fallos = 0
+        self.abierto = False
+        self.hasta = 0.0
+        self.aperturas = 0
+        self.motivo = None
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        if not self.abierto:
+            return True
+        with self._lock:
+            ahora = time.monotonic()
+            if not self.abierto or ahora >= self.hasta:
+                # Petición de prueba; las demás siguen rechazadas hasta la próxima
+                self.hasta = ahora + self.espera
+                return True
+            return False
+
+    def exito(self):
+        if self.fallos or self.abierto:
+            with self._lock:
+                if self.abierto:
+                    print("✅ Base de datos disponible de nuevo: disyuntor cerrado")
+                self.fallos = 0
+                self.abierto = False
+                self.motivo = None
+
+    def fallo(self, motivo):
+        if not self.umbral:
+            return
+        with self._lock:
+            self.fallos += 1
+            self.motivo = str(motivo)
+            if self.abierto or self.fallos >= self.umbral:
+                if not self.abierto:
+                    self.aperturas += 1
+                    print(f"⚠️  Disyuntor de la base de datos abierto tras {self.fallos} fallos: {motivo}")
+                self.abierto = True
+                self.hasta = time.monotonic() + self.espera
+
+    def retry_after(self):
+        if not self.abierto:
+            return 1
+        return max(1, math.ceil(self.hasta - time.monotonic()))
+
+    def stats(self):
+        return {'open': self.abierto, 'failures': self.fallos, 'opens': self.aperturas,
+                'retry_after': self.retry_after(), 'reason': self.motivo}
+
+
+circuito = Circuito()
+
+
+class _Cursor(metricas.TimedCursor):
+    """Cursor instrumentado que además informa al disyuntor del resultado de cada consulta."""
+
+    def __init__(self, cursor, circuito):
+        super().__init__(cursor)
+        self._circuito = circuito
+
+    def execute(self, *args, **kwargs):
+        try:
+            result = super().execute(*args, **kwargs)
+        except Error as e:
+            if self._circuito is not None and e.errno in ERRORES_BD:
+                self._circuito.fallo(e)
+            raise
+        if self._circuito is not None:
+            self._circuito.exito()
+        return result
+
+
+class PooledConnection:
+    """Envoltura de una conexión del pool: close() la devuelve en lugar de cerrarla."""
+
+    def __init__(self, pool, raw, bound=False, circuito=None, replica=None, secuencia=0):
+        self._pool = pool
+        self._raw = raw
+        self._bound = bound  # Ligada al contexto de la app: se devuelve en el teardown
+        self._released = False
+        self._circuito = circuito  # Solo las del primario; las réplicas tienen su propia expulsión
+        self.replica = replica
+        # Cambios que seguro contienen sus lecturas: anotada al obtenerla, antes de consultar
+        self.secuencia = secuencia
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def raw(self):
+        # La conexión real, donde repositorio guarda sus sentencias preparadas
+        return self._raw
+
+    def is_connected(self):
+        return not self._released and self._raw.is_connected()
+
+    def cursor(self, *args, **kwargs):
+        # Cursor instrumentado: mide execute/fetch por consulta y avisa al disyuntor
+        return _Cursor(self._raw.cursor(*args, **kwargs), self._circuito)
+
+    def close(self):
+        # Las conexiones del contexto de la app se devuelven al terminar la petición
+        if not self._bound:
+            self.release()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._pool.put(self._raw)
+
+
+class ConnectionPool:
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 idle_check=POOL_IDLE_CHECK, recycle=POOL_RECYCLE, factory=_abrir_conexion):
+        self.size = size
+        self.timeout = timeout
+        self.idle_check = idle_check
+        self.recycle = recycle
+        self._factory = factory
+        self._idle = deque()      # (conexion, creada, devuelta)
+        self._created = {}        # id(conexion) -> momento de creación
+        self._opening = 0         # Conexiones reservadas que se están abriendo
+        self._lock = threading.Condition()
+        self._waiters = 0
+        self._stats = {'checkouts': 0, 'timeouts': 0, 'recycled': 0, 'wait_time': 0.0, 'max_wait': 0.0}
+
+    def _nueva(self):
+        raw = self._factory()
+        self._created[id(raw)] = time.monotonic()
+        return raw
+
+    @staticmethod
+    def _cerrar(raw):
+        try:
+            raw.close()
+        except Error:
+            pass
+
+    def _valida(self, raw, creada, devuelta):
+        ahora = time.monotonic()
+        if ahora - creada > self.recycle:
+            return False
+        if ahora - devuelta > self.idle_check:
+            try:
+                raw.ping(reconnect=False)
+            except Error:
+                return False
+        return True
+
+    def prewarm(self, count=None):
+        count = self.size if count is None else min(count, self.size)
+        with self._lock:
+            while len(self._created) + self._opening < count:
+                raw = self._nueva()
+                self._idle.append((raw, self._created[id(raw)], time.monotonic()))
+            self._lock.notify_all()
+
+    def get(self, timeout=None):
+        inicio = time.monotonic()
+        limite = inicio + (self.timeout if timeout is None else min(self.timeout, timeout))
+        while True:
+            raw = None
+            with self._lock:
+                while True:
+                    if self._idle:
+                        # Sigue contada en _created: el hueco queda reservado mientras se valida
+                        raw, creada, devuelta = self._idle.pop()
+                        break
+                    if len(self._created) + self._opening < self.size:
+                        # Reservar el hueco y abrir la conexión fuera del lock
+                        self._opening += 1
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._stats['timeouts'] += 1
+                        raise Error(msg='Tiempo de espera agotado al obtener una conexión del pool')
+                    self._waiters += 1
+                    try:
+                        self._lock.wait(restante)
+                    finally:
+                        self._waiters -= 1
+            if raw is None:
+                return self._abrir(inicio)
+            # El ping va fuera del lock: un socket lento o medio muerto no frena a los demás
+            if self._valida(raw, creada, devuelta):
+                with self._lock:
+                    return self._checkout(raw, inicio)
+            with self._lock:
+                self._stats['recycled'] += 1
+                self._created.pop(id(raw), None)
+                self._lock.notify()
+            self._cerrar(raw)
+
+    def _abrir(self, inicio):
+        try:
+            raw = self._factory()
+        except Error:
+            with self._lock:
+                self._opening -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._opening -= 1
+            self._created[id(raw)] = time.monotonic()
+            return self._checkout(raw, inicio)
+
+    def _checkout(self, raw, inicio):
+        espera = time.monotonic() - inicio
+        self._stats['checkouts'] += 1
+        self._stats['wait_time'] += espera
+        self._stats['max_wait'] = max(self._stats['max_wait'], espera)
+        return raw
+
+    def put(self, raw):
+        with self._lock:
+            propia = id(raw) in self._created
+        if not propia:
+            # Entregada antes de close_all(): el pool ya no la cuenta, pero su socket sigue abierto
+            self._cerrar(raw)
+            return
+        # La limpieza habla con el servidor: fuera del lock
+        try:
+            valida = raw.is_connected()
+            if valida:
+                # No dejar resultados pendientes ni transacciones abiertas a la siguiente petición
+                if raw.unread_result:
+                    raw.consume_results()
+                if raw.in_transaction:
+                    raw.rollback()
+        except Error:
+            valida = False
+        with self._lock:
+            # close_all() pudo vaciar el pool mientras tanto
+            if valida and id(raw) in self._created:
+                self._idle.append((raw, self._created[id(raw)], time.monotonic()))
+                raw = None
+            else:
+                self._created.pop(id(raw), None)
+            self._lock.notify()
+        if raw is not None:
+            self._cerrar(raw)
+
+    def close_all(self):
+        with self._lock:
+            idle = [raw for raw, _, _ in self._idle]
+            self._idle.clear()
+            self._created.clear()
+            self._lock.notify_all()
+        for raw in idle:
+            self._cerrar(raw)
+
+    def stats(self):
+        with self._lock:
+            total = len(self._created) + self._opening
+            checkouts = self._stats['checkouts']
+            return {
+                'size': self.size,
+                'open': total,
+                'idle': len(self._idle),
+                'in_use': total - len(self._idle),
+                'waiters': self._waiters,
+                'checkouts': checkouts,
+                'timeouts': self._stats['timeouts'],
+                'recycled': self._stats['recycled'],
+                'avg_wait_ms': round(self._stats['wait_time'] / checkouts * 1000, 3) if checkouts else 0.0,
+                'max_wait_ms': round(self._stats['max_wait'] * 1000, 3),
+            }
+
+
+class Replica:
+    """Pool de una réplica y su estado de salud."""
+
+    def __init__(self, nombre, factory):
+        self.nombre = nombre
+        self.pool = ConnectionPool(factory=factory)
+        self.expulsada_hasta = 0.0
+        self.latencia = None     # Media móvil de la consulta de las comprobaciones, en segundos
+        self.retraso = None      # Seconds_Behind_Source de la última comprobación
+        self.secuencia = None    # Secuencia de cambios aplicada en la última comprobación
+        self.expulsiones = 0
+        self.motivo = None
+
+    def sana(self, ahora):
+        return ahora >= self.expulsada_hasta
+
+    def expulsar(self, motivo):
+        # Fuera de la rotación hasta que pase REPLICA_EJECT y una comprobación la readmita
+        if self.sana(time.monotonic()):
+            self.expulsiones += 1
+            print(f"⚠️  Réplica {self.nombre} expulsada: {motivo}")
+        self.expulsada_hasta = time.monotonic() + REPLICA_EJECT
+        self.motivo = str(motivo)
+
+    def comprobar(self):
+        inicio = time.perf_counter()
+        try:
+            raw = self.pool.get()
+        except Error as e:
+            self.expulsar(e)
+            return
+        try:
+            cursor = raw.cursor()
+            cursor.execute(SECUENCIA_QUERY)
+            secuencia = cursor.fetchall()[0][0]
+            latencia = time.perf_counter() - inicio
+            self.latencia = latencia if self.latencia is None else 0.8 * self.latencia + 0.2 * latencia
+            if REPLICA_MAX_LAG:
+                self.retraso = _retraso(raw)
+                if self.retraso is None or self.retraso > REPLICA_MAX_LAG:
+                    self.expulsar(f'retraso de replicación {self.retraso}')
+                    return
+            self.secuencia = secuencia
+        except Error as e:
+            self.expulsar(e)
+            return
+        finally:
+            self.pool.put(raw)
+        # Una réplica expulsada vuelve sola a la rotación al terminar REPLICA_EJECT
+        if self.sana(time.monotonic()):
+            self.motivo = None
+
+    def stats(self):
+        return dict(self.pool.stats(), healthy=self.sana(time.monotonic()),
+                    latency_ms=round(self.latencia * 1000, 3) if self.latencia is not None else None,
+                    lag=self.retraso, seq=self.secuencia, ejections=self.expulsiones, reason=self.motivo)
+
+
+def _retraso(raw):
+    # None si la réplica no replica (el hilo SQL está parado) o no se puede saber
+    cursor = raw.cursor(dictionary=True)
+    try:
+        cursor.execute("SHOW REPLICA STATUS")
+    except Error:
+        cursor.execute("SHOW SLAVE STATUS")  # MySQL anterior a 8.0.22
+    row = cursor.fetchone()
+    cursor.fetchall()
+    if not row:
+        return None
+    return row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+
+
+class Replicas:
+    """Elige réplica (round robin o menor latencia) y comprueba su salud en segundo plano."""
+
+    def __init__(self, factories):
+        self.lista = [Replica(nombre, factory) for nombre, factory in factories.items()]
+        self._turno = itertools.count()
+        threading.Thread(target=self._vigilar, daemon=True, name='replicas').start()
+
+    def elegir(self, minima=0):
+        # Solo las réplicas que ya aplicaron la secuencia minima (la última escritura del cliente)
+        ahora = time.monotonic()
+        sanas = [replica for replica in self.lista if replica.sana(ahora)
+                 and (not minima or (replica.secuencia or 0) >= minima)]
+        if not sanas:
+            return None
+        if REPLICA_POLICY == 'least_latency':
+            return min(sanas, key=lambda replica: replica.latencia or 0.0)
+        return sanas[next(self._turno) % len(sanas)]
+
+    def _vigilar(self):
+        while True:
+            for replica in self.lista:
+                replica.comprobar()
+            time.sleep(REPLICA_CHECK)
+
+    def close_all(self):
+        for replica in self.lista:
+            replica.pool.close_all()
+
+    def stats(self):
+        return {replica.nombre: replica.stats() for replica in self.lista}
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_factory = _abrir_conexion
+_replicas = None
+_replicas_pid = None
+_replica_factories = {host: _abrir_replica(host) for host in DB_REPLICAS}
+
+
+def get_pool():
+    global _pool, _pool_pid
+    # Tras un fork cada proceso crea su propio pool; los sockets heredados no se comparten
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool(factory=_factory)
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def get_replicas():
+    """Réplicas de este proceso, o None si no hay ninguna configurada."""
+    global _replicas, _replicas_pid
+    if not _replica_factories:
+        return None
+    if _replicas is None or _replicas_pid != os.getpid():
+        with _pool_lock:
+            if _replicas is None or _replicas_pid != os.getpid():
+                _replicas = Replicas(_replica_factories)
+                _replicas_pid = os.getpid()
+    return _replicas
+
+
+def set_replica_factories(factories):
+    """Cambia las réplicas: {nombre: factory} (p. ej. copias de solo lectura del SQLite de benchmarks/)."""
+    global _replica_factories, _replicas
+    if _replicas is not None and _replicas_pid == os.getpid():
+        _replicas.close_all()
+    _replicas = None
+    _replica_factories = dict(factories)
+
+
+def set_connection_factory(factory):
+    """Cambia cómo se abren las conexiones (p. ej. el SQLite de benchmarks/) y reinicia el pool."""
+    global _factory
+    close_pool()
+    _factory = factory
+
+
+def init_pool(prewarm=True):
+    pool = get_pool()
+    if prewarm:
+        pool.prewarm()
+    return pool
+
+
+def close_pool():
+    global _pool, _replicas
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close_all()
+    _pool = None
+    if _replicas is not None and _replicas_pid == os.getpid():
+        _replicas.close_all()
+    _replicas = None
+
+
+def get_pool_stats():
+    return get_pool().stats()
+
+
+def get_circuit_stats():
+    return circuito.stats()
+
+
+def get_replica_stats():
+    replicas = get_replicas()
+    return replicas.stats() if replicas else {}
+
+
+_secuencia_conocida = 0  # Última secuencia de cambios confirmada que ha visto este proceso
+
+
+def anotar_secuencia(seq):
+    """El primario ya contiene el cambio seq (escrituras propias y las que lee cambios.Seguidor)."""
+    global _secuencia_conocida
+    if seq > _secuencia_conocida:
+        _secuencia_conocida = seq
+
+
+def anotar_escritura(seq):
+    # La escritura de esta petición, para X-Last-Write y para invalidar las cachés con su secuencia
+    if has_app_context():
+        g._ultima_escritura = seq
+
+
+def ultima_escritura():
+    """Secuencia de la escritura hecha en esta petición, o None."""
+    return g.get('_ultima_escritura') if has_app_context() else None
+
+
+def escritura_del_cliente():
+    """Última escritura que el cliente ya vio confirmada (X-Last-Write o cookie db_primary), o 0."""
+    if not has_request_context():
+        return 0
+    minima = 0
+    for valor in (request.headers.get(RYW_HEADER), request.cookies.get(RYW_COOKIE)):
+        try:
+            minima = max(minima, int(valor))
+        except (TypeError, ValueError):
+            pass
+    return minima
+
+
+def secuencia_leida():
+    """Cambios que seguro contienen las lecturas de la conexión de esta petición (0 si no se sabe)."""
+    connection = g.get('_db_connection') if has_app_context() else None
+    return connection.secuencia if connection is not None else 0
+
+
+def lectura_de_replica():
+    """La réplica de la que lee esta petición, o None si usa el primario."""
+    connection = g.get('_db_connection') if has_app_context() else None
+    return connection.replica if connection is not None else None
+
+
+def _leer_de_replica():
+    # Solo las lecturas de una petición; las escrituras, los trabajos en segundo plano y las
+    # peticiones con X-Consistency: strong usan el primario
+    return (has_request_context()
+            and request.method in ('GET', 'HEAD')
+            and request.headers.get('X-Consistency') != 'strong')
+
+
+def _conexion_replica():
+    replicas = get_replicas()
+    # Sin una réplica que ya tenga la última escritura del cliente, se lee del primario
+    replica = replicas.elegir(escritura_del_cliente()) if replicas else None
+    if replica is None:
+        return None, None, None
+    try:
+        return replica, replica.pool, replica.pool.get()
+    except Error as e:
+        # Se sigue en el primario y la réplica sale de la rotación
+        replica.expulsar(e)
+        return None, None, None
+
 
 def get_db_connection():
+    # Dentro de una petición se reutiliza la misma conexión hasta el teardown
+    if has_app_context() and '_db_connection' in g:
+        return g._db_connection
+    # Plazo de la petición: acota la espera del pool y la duración de las consultas
+    segundos = restante() if has_request_context() else None
+    if segundos is not None and segundos <= 0:
+        return None
+    inicio = time.perf_counter()
+    primario = None
+    # Se anota antes de obtener la conexión: lo que se lea después contiene al menos esa secuencia
+    secuencia = _secuencia_conocida
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            database='empleados',
-            user='root',
-            password=''
-        )
-        return connection
+        replica, pool, raw = _conexion_replica() if _leer_de_replica() else (None, None, None)
+        if raw is None:
+            # Con el disyuntor abierto no se espera a una base de datos que no responde
+            if not circuito.permitir():
+                return None
+            primario = circuito
+            replica = None
+            pool = get_pool()
+            raw = pool.get(timeout=segundos)
     except Error as e:
         print(f"Error al conectar con la base de datos: {e}")
+        if primario is not None:
+            circuito.fallo(e)
         return None
+    finally:
+        metricas.observe_connect(time.perf_counter() - inicio)
+    try:
+        _limitar_consultas(raw, segundos)
+    except Error as e:
+        print(f"Error al preparar la conexión: {e}")
+        if primario is not None:
+            circuito.fallo(e)
+        pool.put(raw)
+        return None
+    if replica is not None:
+        secuencia = replica.secuencia or 0
+    if has_app_context():
+        g._db_connection = PooledConnection(pool, raw, bound=True, circuito=primario,
+                                            replica=replica, secuencia=secuencia)
+        return g._db_connection
+    return PooledConnection(pool, raw, circuito=primario, replica=replica, secuencia=secuencia)
+
+
+def sin_conexion():
+    """503 cuando no hay conexión: base de datos caída, pool agotado, disyuntor abierto o plazo vencido."""
+    response = jsonify({'error': 'Base de datos no disponible, inténtalo de nuevo'})
+    response.headers['Retry-After'] = str(circuito.retry_after())
+    return response, 503
+
+
+def release_db_connection(exception=None):
+    connection = g.pop('_db_connection', None)
+    if connection is not None:
+        connection.release()
+
+
+def _marcar_escritura(response):
+    # Leer lo escrito: la respuesta de una escritura lleva su secuencia de cambios en X-Last-Write
+    # (visible también para los clientes de otros orígenes, que no envían la cookie SameSite) y,
+    # durante READ_YOUR_WRITES segundos, en la cookie db_primary. Con ella las lecturas solo van
+    # a una réplica que ya la haya aplicado y no usan entradas de caché anteriores.
+    seq = ultima_escritura()
+    if seq is not None and response.status_code < 400:
+        anotar_secuencia(seq)
+        response.headers[RYW_HEADER] = str(seq)
+        if _replica_factories and READ_YOUR_WRITES:
+            response.set_cookie(RYW_COOKIE, str(seq), max_age=READ_YOUR_WRITES, httponly=True, samesite='Lax')
+    return response
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db_connection)
+    app.after_request(_marcar_escritura)
@@ -0,0 +1,21 @@
+#configuracion.py
+# Configuración de la API: primero las variables de entorno y, si no existen,
+# la sección [api] del archivo indicado en API_CONFIG (por defecto config.ini).
+import configparser
+import os
+
+CONFIG_FILE = os.environ.get('API_CONFIG', 'config.ini')
+
+_parser = configparser.ConfigParser()
+_parser.read(CONFIG_FILE, encoding='utf-8')  # Si el archivo no existe se usan solo el entorno y los valores por defecto
+
+
+def get(name, default=None, cast=str):
+    value = os.environ.get(name)
+    if value is None:
+        value = _parser.get('api', name, fallback=None)
+    if value is None:
+        return default
+    if cast is bool:
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return cast(value)
@@ -1,20 +1,60 @@
 from flask import Blueprint, jsonify, request
-from conexion import get_db_connection
+from conexion import get_db_connection, sin_conexion
+from cache import ResponseCache, cached_response
+from eventos import emitir, suscribir
+from cambios import registrar_cambios, seguidor
+from seguridad import verificar_token
+from versiones import if_match_version, sin_cambios
+import repositorio
+from trabajos import SinReintentos, aceptado, encolar, tarea
+from empleado import get_users_de
 
 # Crear el Blueprint
 departamento_bp = Blueprint('departamento', __name__)
+departamento_bp.before_request(verificar_token)
+
+# Caché de lecturas, una por worker; se invalida con cada escritura de cualquiera de ellos
+departamentos_cache = ResponseCache('departamentos')
+
+BORRADO_LOTE = 1000  # Empleados borrados por transacción en el borrado en cascada
+
+
+# Los conteos cambian con cada alta, baja o cambio de departamento de un empleado
+@suscribir
+def _invalidar_conteos(entidad, accion, id, datos):
+    if entidad == 'empleado':
+        departamentos_cache.discard('all_counts')
+
+
+# Las escrituras de los demás workers llegan por la tabla cambios (ver cambios.Seguidor)
+def _invalidar_cambio(seq, entidad, accion, id, datos):
+    if entidad == 'departamento':
+        departamentos_cache.clear(seq)
+    elif entidad == 'empleado':
+        departamentos_cache.discard('all_counts', seq)
+
+
+seguidor.seguir(_invalidar_cambio, departamentos_cache.clear)
+
 
 # Ruta GET para obtener todos los departamentos
+# Con ?with_counts=true cada uno lleva su número de empleados (una sola consulta agrupada)
 @departamento_bp.route('/departamentos', methods=['GET'])
 def get_departamentos():
+    con_empleados = request.args.get('with_counts') == 'true'
+    key = 'all_counts' if con_empleados else 'all'
+    entry = departamentos_cache.get(key)
+    if entry:
+        return cached_response(entry)
+
+    generation = departamentos_cache.generation
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            query = "SELECT * FROM departamento"
-            cursor.execute(query)
-            departamentos = cursor.fetchall()
-            return jsonify(departamentos), 200
+            departamentos = repositorio.listar_departamentos(connection, con_empleados)
+            return cached_response(departamentos_cache.set_json(key, departamentos, generation))
+        return sin_conexion()
 
     except Exception as e:
         return jsonify({'error': f'Error al conectar o realizar la consulta: {e}'}), 500
@@ -26,24 +66,35 @@ def get_departamentos():
 # Ruta GET para obtener un supervisor específico por id
 @departamento_bp.route('/departamentos/<int:idDepartamento>', methods=['GET'])
 def get_supervisor(idDepartamento):
+    entry = departamentos_cache.get(idDepartamento)
+    if entry:
+        return cached_response(entry)
+
+    generation = departamentos_cache.generation
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            query = "SELECT * FROM departamento WHERE idDepartamento = %s"
-            cursor.execute(query, (idDepartamento,))
-            supervisor = cursor.fetchone()
+            supervisor = repositorio.leer_departamento(connection, idDepartamento)
 
             if supervisor:
-                return jsonify(supervisor), 200
+                return cached_response(departamentos_cache.set(idDepartamento, supervisor, generation,
+                                                               etag=str(supervisor['version'])))
             else:
                 return jsonify({'error': 'Supervisor no encontrado'}), 404
+        return sin_conexion()
     except Exception as e:
         return jsonify({'error': f'Error al obtener los datos: {e}'}), 500
     finally:
         if connection and connection.is_connected():
             connection.close()
 
+# Ruta GET para obtener los empleados de un departamento, por páginas (?limit=N&after=<token>)
+# Admite los filtros, el orden y los campos de GET /empleados
+@departamento_bp.route('/departamentos/<int:idDepartamento>/empleados', methods=['GET'])
+def get_empleados_departamento(idDepartamento):
+    return get_users_de('departamento', idDepartamento, f'El departamento con id {idDepartamento} no existe')
+
 # Ruta POST para agregar un nuevo departamento
 @departamento_bp.route('/departamentos', methods=['POST'])
 def add_departamento():
@@ -54,18 +105,19 @@ def add_departamento():
     if not all(field in data and data[field] for field in required_fields):
         return jsonify({'error': 'Faltan datos obligatorios'}), 400
 
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor()
-            query = """
-                INSERT INTO departamento (nombre) 
-                VALUES (%s)
-            """
-            cursor.execute(query, (data['nombre'],))
+            id = repositorio.insertar_departamento(connection, data['nombre'])
+            cambio = ('departamento', 'create', id, {'nombre': data['nombre']})
+            registrar_cambios(connection, [cambio])
             connection.commit()
+            departamentos_cache.clear()
+            emitir(*cambio)
 
             return jsonify({'message': 'Departamento creado con éxito'}), 201
+        return sin_conexion()
 
     except Exception as e:
         return jsonify({'error': f'Error al insertar el departamento: {e}'}), 500
@@ -84,22 +136,26 @@ def update_departamento(idDepartamento):
     if not all(field in data and data[field] for field in required_fields):
         return jsonify({'error': 'Faltan datos obligatorios'}), 400
 
+    try:
+        version = if_match_version()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor()
-            check_query = "SELECT * FROM departamento WHERE idDepartamento = %s"
-            cursor.execute(check_query, (idDepartamento,))
-            departamento = cursor.fetchone()
-
-            if not departamento:
-                return jsonify({'error': f'El departamento con id {idDepartamento} no existe'}), 404
-
-            update_query = "UPDATE departamento SET nombre = %s WHERE idDepartamento = %s"
-            cursor.execute(update_query, (data['nombre'], idDepartamento))
+            if not repositorio.actualizar_departamento(connection, idDepartamento, data['nombre'], version):
+                return sin_cambios(connection, 'departamento', idDepartamento, version,
+                                   f'El departamento con id {idDepartamento} no existe')
+            cambio = ('departamento', 'update', idDepartamento, {'nombre': data['nombre']})
+            registrar_cambios(connection, [cambio])
             connection.commit()
+            departamentos_cache.clear()
+            emitir(*cambio)
 
             return jsonify({'message': f'Departamento con id {idDepartamento} actualizado con éxito'}), 200
+        return sin_conexion()
 
     except Exception as e:
         return jsonify({'error': f'Error al actualizar el departamento: {e}'}), 500
@@ -110,24 +166,30 @@ def update_departamento(idDepartamento):
 
 
 # Ruta DELETE para eliminar un departamento por id
+# Con ?cascade=true también borra sus empleados, en segundo plano: responde 202 con el id del trabajo
 @departamento_bp.route('/departamentos/<int:idDepartamento>', methods=['DELETE'])
 def delete_departamento(idDepartamento):
+    try:
+        version = if_match_version()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if request.args.get('cascade') == 'true':
+        return encolar_borrado(idDepartamento, version)
+
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor()
-            check_query = "SELECT * FROM departamento WHERE idDepartamento = %s"
-            cursor.execute(check_query, (idDepartamento,))
-            departamento = cursor.fetchone()
-
-            if not departamento:
-                return jsonify({'error': f'El departamento con id {idDepartamento} no existe'}), 404
-
-            delete_query = "DELETE FROM departamento WHERE idDepartamento = %s"
-            cursor.execute(delete_query, (idDepartamento,))
+            if not repositorio.borrar_departamento(connection, idDepartamento, version):
+                return sin_cambios(connection, 'departamento', idDepartamento, version,
+                                   f'El departamento con id {idDepartamento} no existe')
+            registrar_cambios(connection, [('departamento', 'delete', idDepartamento, None)])
             connection.commit()
+            departamentos_cache.clear()
+            emitir('departamento', 'delete', idDepartamento)
 
             return jsonify({'message': f'Departamento con id {idDepartamento} eliminado con éxito'}), 200
+        return sin_conexion()
 
     except Exception as e:
         return jsonify({'error': f'Error al eliminar el departamento: {e}'}), 500
@@ -135,3 +197,79 @@ def delete_departamento(idDepartamento):
     finally:
         if connection and connection.is_connected():
             connection.close()
+
+
+def encolar_borrado(idDepartamento, version):
+    # Comprobar existencia y versión ahora para responder 404 o 412 al momento; el trabajo
+    # recibe la versión y la vuelve a comprobar antes de borrar
+    connection = None
+    try:
+        connection = get_db_connection()
+        if connection and connection.is_connected():
+            actual = repositorio.version_de(connection, 'departamento', idDepartamento)
+            if actual is None:
+                return jsonify({'error': f'El departamento con id {idDepartamento} no existe'}), 404
+            if version is not None and actual != version:
+                return sin_cambios(connection, 'departamento', idDepartamento, version, None)
+            return aceptado(encolar('borrar_departamento', {'idDepartamento': idDepartamento, 'version': version},
+                                    clave=str(idDepartamento)))
+        return sin_conexion()
+
+    except Exception as e:
+        return jsonify({'error': f'Error al eliminar el departamento: {e}'}), 500
+
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+
+
+def _comprobar_version(connection, idDepartamento, version):
+    # Con If-Match el borrado se cancela si el departamento se modificó mientras esperaba
+    if version is None:
+        return
+    actual = repositorio.version_de(connection, 'departamento', idDepartamento)
+    if actual is not None and actual != version:
+        raise SinReintentos(f'El departamento cambió desde que se pidió el borrado '
+                            f'(versión {actual}, se esperaba {version})')
+
+
+# Borrado en cascada: los empleados por lotes (un commit y sus eventos por lote) y después
+# el departamento. Se puede repetir sin efectos duplicados, así que admite reintentos.
+# Con la versión de If-Match se comprueba antes de cada lote y en el DELETE del departamento.
+@tarea('borrar_departamento', concurrencia=1, intentos=3)
+def trabajo_borrar_departamento(trabajo):
+    idDepartamento = trabajo.payload['idDepartamento']
+    version = trabajo.payload.get('version')
+    connection = get_db_connection()
+    if not connection or not connection.is_connected():
+        raise RuntimeError('No hay conexión con la base de datos')
+    try:
+        total = repositorio.contar_empleados_departamento(connection, idDepartamento)
+        borrados = 0
+        while True:
+            _comprobar_version(connection, idDepartamento, version)
+            ids = repositorio.ids_empleados_departamento(connection, idDepartamento, BORRADO_LOTE)
+            if not ids:
+                break
+            repositorio.borrar_empleados(connection, ids)
+            cambios = [('empleado', 'delete', id, None) for id in ids]
+            registrar_cambios(connection, cambios)
+            connection.commit()
+            for cambio in cambios:
+                emitir(*cambio)
+            borrados += len(ids)
+            trabajo.progreso(borrados, max(total, borrados))
+
+        departamento = repositorio.borrar_departamento(connection, idDepartamento, version) > 0
+        if departamento:
+            registrar_cambios(connection, [('departamento', 'delete', idDepartamento, None)])
+        else:
+            # Ninguna fila: ya estaba borrado o, con If-Match, cambió tras el último lote
+            _comprobar_version(connection, idDepartamento, version)
+        connection.commit()
+        departamentos_cache.clear()
+        if departamento:
+            emitir('departamento', 'delete', idDepartamento)
+        return {'empleados': borrados, 'departamento': departamento}
+    finally:
+        connection.close()
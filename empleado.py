@@ -1,14 +1,22 @@
 from flask import Blueprint, jsonify, request
-from conexion import get_db_connection
+from conexion import get_db_connection, sin_conexion
+from admision import sin_plazo
+from imagenes import guardar_foto, agregar_variantes, columnas_variantes
+from eventos import emitir
+from cambios import registrar_cambios
+from seguridad import verificar_token
+from serializacion import RowEncoder
+from versiones import condicion_version, if_match_version, sin_cambios
+import repositorio
 import os
-from werkzeug.utils import secure_filename
-from flask import send_from_directory
+import json
+import base64
+import datetime
+import math
+from flask import current_app, Response, stream_with_context
 
 empleado_bp = Blueprint('empleado', __name__)
-
-@empleado_bp.route('/uploads/<filename>')
-def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+empleado_bp.before_request(verificar_token)
 
 # Definir el directorio donde se guardarán las fotos
 UPLOAD_FOLDER = 'uploads'
@@ -22,35 +30,412 @@ if not os.path.exists(UPLOAD_FOLDER):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Campos que se pueden pedir con ?fields= y su expresión SQL (en el orden de la respuesta)
+EMPLEADO_CAMPOS = {
+    'idEmpleados': 'e.idEmpleados',
+    'nombre': 'e.nombre',
+    'apellido': 'e.apellido',
+    'fecha_nac': 'e.fecha_nac',
+    'ciudad': 'e.ciudad',
+    'direccion': 'e.direccion',
+    'telefono': 'e.telefono',
+    'departamento': 'd.nombre',
+    'supervisor': "CONCAT(s.nombre, ' ', s.apellidos)",
+    'salario': 'e.salario',
+    'foto': 'e.foto',
+    'version': 'e.version',
+}
+# Campos por los que se puede ordenar con ?sort= (prefijo '-' para descendente)
+EMPLEADO_ORDEN = {'idEmpleados', 'nombre', 'apellido', 'fecha_nac', 'ciudad', 'salario'}
+
+# Campos que aceptan PUT y PATCH y su columna; PUT envía los ids como departamento y supervisor
+EMPLEADO_ACTUALIZABLES = {
+    'nombre': 'nombre', 'apellido': 'apellido', 'fecha_nac': 'fecha_nac', 'ciudad': 'ciudad',
+    'direccion': 'direccion', 'telefono': 'telefono', 'salario': 'salario',
+    'idDepartamento': 'idDepartamento', 'departamento': 'idDepartamento',
+    'idSupervisor': 'idSupervisor', 'supervisor': 'idSupervisor',
+}
+EMPLEADO_PUT = ['nombre', 'apellido', 'fecha_nac', 'ciudad', 'direccion', 'telefono',
+                'departamento', 'supervisor', 'salario']
+
+PAGE_SIZE_MAX = 1000   # Máximo de empleados por página
+STREAM_BATCH = 500     # Filas leídas del cursor por lote al transmitir
+BATCH_IDS_MAX = 10000  # Máximo de ids en una lectura por lotes
+BATCH_CHUNK = 1000     # Ids por cada consulta IN (...)
+# Relaciones que ?include= devuelve como objeto completo: tabla, columna de la clave y columnas
+BATCH_INCLUDE = {
+    'departamento': ('departamento', 'idDepartamento', repositorio.DEPARTAMENTO_COLUMNAS),
+    'supervisor': ('supervisor', 'idSupervisor', repositorio.SUPERVISOR_COLUMNAS),
+}
+
+
+def _lista(args, name, cast=str):
+    values = [v.strip() for v in args.get(name, '').split(',') if v.strip()]
+    try:
+        return [cast(v) for v in values]
+    except ValueError:
+        raise ValueError(f'Valor no válido en {name}')
+
+
+class UsersQuery:
+    """Filtros, orden y proyección de GET /empleados traducidos a SQL parametrizado."""
+
+    def __init__(self, args):
+        self.fields = _lista(args, 'fields') or list(EMPLEADO_CAMPOS)
+        unknown = [f for f in self.fields if f not in EMPLEADO_CAMPOS]
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+
+        self.where = []
+        self.params = []
+        ciudades = _lista(args, 'ciudad')
+        if ciudades:
+            self._in('e.ciudad', ciudades)
+        departamentos = _lista(args, 'idDepartamento', int)
+        if departamentos:
+            self._in('e.idDepartamento', departamentos)
+        supervisores = _lista(args, 'idSupervisor', int)
+        if supervisores:
+            self._in('e.idSupervisor', supervisores)
+        for name, op in (('salario_min', '>='), ('salario_max', '<=')):
+            if args.get(name):
+                try:
+                    self.params.append(float(args[name]))
+                except ValueError:
+                    raise ValueError(f'Valor no válido en {name}')
+                self.where.append(f'e.salario {op} %s')
+
+        # El id siempre cierra el orden para que la paginación por clave sea estable
+        self.order = []
+        for item in _lista(args, 'sort'):
+            desc = item.startswith('-')
+            name = item.lstrip('-+')
+            if name not in EMPLEADO_ORDEN:
+                raise ValueError(f'No se puede ordenar por {name}')
+            self.order.append((name, desc))
+        if not any(name == 'idEmpleados' for name, _ in self.order):
+            self.order.append(('idEmpleados', False))
+
+    def _in(self, column, values):
+        self.where.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+        self.params.extend(values)
+
+    def sql(self, after=None, limit=None, keys=False):
+        columns = [f'{EMPLEADO_CAMPOS[f]} AS {f}' for f in self.fields]
+        if keys:
+            # Valores de las columnas de orden para construir el token de la página siguiente
+            columns += [f'e.{name} AS _k{i}' for i, (name, _) in enumerate(self.order)]
+        query = f"SELECT {', '.join(columns)} FROM tb_empleados e"
+        # Solo se hacen los JOIN que la proyección necesita
+        if 'departamento' in self.fields:
+            query += ' LEFT JOIN departamento d ON e.idDepartamento = d.idDepartamento'
+        if 'supervisor' in self.fields:
+            query += ' LEFT JOIN supervisor s ON e.idSupervisor = s.idSupervisor'
+
+        where = list(self.where)
+        params = list(self.params)
+        if after is not None:
+            if len(after) != len(self.order):
+                raise ValueError('El token de paginación no corresponde al orden pedido')
+            # (k0, k1, ...) después de los valores de la última fila, respetando cada dirección.
+            # MySQL (y SQLite) ordenan NULL antes que cualquier valor: en orden ascendente detrás
+            # de NULL va todo lo que no lo es; en descendente NULL es lo último y los NULL van
+            # detrás de cualquier valor. Comparar con NULL nunca es cierto: va con IS NULL
+            alternatives = []
+            for i, (name, desc) in enumerate(self.order):
+                value = after[i]
+                if value is None and desc:
+                    continue
+                parts = []
+                for (prev, _), prev_value in zip(self.order[:i], after):
+                    if prev_value is None:
+                        parts.append(f'e.{prev} IS NULL')
+                    else:
+                        parts.append(f'e.{prev} = %s')
+                        params.append(prev_value)
+                if value is None:
+                    parts.append(f'e.{name} IS NOT NULL')
+                elif desc:
+                    parts.append(f'(e.{name} < %s OR e.{name} IS NULL)')
+                    params.append(value)
+                else:
+                    parts.append(f'e.{name} > %s')
+                    params.append(value)
+                alternatives.append('(' + ' AND '.join(parts) + ')')
+            where.append('(' + ' OR '.join(alternatives) + ')')
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+
+        query += ' ORDER BY ' + ', '.join(f"e.{name}{' DESC' if desc else ''}" for name, desc in self.order)
+        if limit is not None:
+            query += ' LIMIT %s'
+            params.append(limit)
+        return query, tuple(params)
+
+    def encoder(self):
+        # Las columnas del SELECT llevan el nombre de cada campo pedido, en el mismo orden
+        return RowEncoder(self.fields)
+
+    def variantes(self, rows):
+        # Columnas calculadas: las rutas de la miniatura y la vista previa de cada foto
+        if 'foto' not in self.fields:
+            return None
+        i = self.fields.index('foto')
+        return columnas_variantes([row[i] for row in rows])
+
+
+# Tokens de paginación: los valores de orden de la última fila de la página, codificados
+def encode_page_token(values):
+    values = [v if isinstance(v, (int, float, str)) or v is None else str(v) for v in values]
+    raw = json.dumps(values[0] if len(values) == 1 else values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_page_token(token):
+    if token.isdigit():
+        return [int(token)]
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Token de paginación no válido')
+    return values if isinstance(values, list) else [values]
+
 # GET: Obtener empleados registrados
+# Filtros: ?ciudad=, ?idDepartamento=, ?idSupervisor= (listas separadas por comas), ?salario_min=, ?salario_max=
+# Orden y proyección: ?sort=-salario,nombre y ?fields=nombre,apellido,salario
+# ?limit=N&after=<token> devuelve una página; ?stream=json|ndjson transmite todas las filas
+# ?ids=1,2,3 devuelve esos empleados en ese orden (con ?include=departamento,supervisor)
 @empleado_bp.route('/empleados', methods=['GET'])
 def get_users():
+    if 'ids' in request.args:
+        try:
+            ids, fields, include = _parametros_lote(_lista(request.args, 'ids'), _lista(request.args, 'fields'),
+                                                    _lista(request.args, 'include'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return get_users_batch(ids, fields, include)
+
+    try:
+        consulta = UsersQuery(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    stream = request.args.get('stream')
+    if stream:
+        if stream not in ('json', 'ndjson'):
+            return jsonify({'error': 'El parámetro stream debe ser json o ndjson'}), 400
+        return stream_users(consulta, stream)
+    if 'limit' in request.args or 'after' in request.args:
+        return get_users_page(consulta)
+
+    connection = None
+    try:
+        connection = get_db_connection()
+        if connection and connection.is_connected():
+            # Filas en tupla codificadas directamente en JSON, con las claves precalculadas
+            cursor = connection.cursor()
+            cursor.execute(*consulta.sql())
+            rows = cursor.fetchall()
+            # Con las rutas de la miniatura y la vista previa de cada foto, y el
+            # salto de línea final que también añade jsonify
+            body = consulta.encoder().json(rows, consulta.variantes(rows)) + '\n'
+            return current_app.response_class(body, mimetype='application/json'), 200
+        return sin_conexion()
+
+    except Exception as e:
+        return jsonify({'error': f'Error al conectar o realizar la consulta: {e}'}), 500
+
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+
+
+def get_users_page(consulta):
+    try:
+        limit = int(request.args.get('limit', 100))
+        after = decode_page_token(request.args['after']) if request.args.get('after') else None
+        # Se pide una fila extra para saber si hay más páginas
+        query, params = consulta.sql(after=after, limit=limit + 1, keys=True)
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros de paginación no válidos: {e}'}), 400
+    if limit < 1 or limit > PAGE_SIZE_MAX:
+        return jsonify({'error': f'limit debe estar entre 1 y {PAGE_SIZE_MAX}'}), 400
+
+    connection = None
+    try:
+        connection = get_db_connection()
+        if connection and connection.is_connected():
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+            next_token = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                # Las columnas de orden van al final de cada fila
+                next_token = encode_page_token(list(rows[-1][len(consulta.fields):]))
+            users = consulta.encoder().json(rows, consulta.variantes(rows))
+
+            body = f'{{"data":{users},"next":{current_app.json.dumps(next_token)}}}\n'
+            return current_app.response_class(body, mimetype='application/json'), 200
+        return sin_conexion()
+
+    except Exception as e:
+        return jsonify({'error': f'Error al conectar o realizar la consulta: {e}'}), 500
+
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+
+
+# Empleados de un departamento o de un supervisor: los mismos filtros, orden y campos que
+# GET /empleados con la clave ajena fijada (la resuelve su índice), siempre por páginas
+def get_users_de(tabla, id, no_existe):
+    args = request.args.to_dict()
+    args[repositorio.CLAVES[tabla]] = str(id)
+    try:
+        consulta = UsersQuery(args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    connection = None
+    try:
+        connection = get_db_connection()
+        if connection is None:
+            return sin_conexion()
+        # Sin empleados se devuelve una página vacía; si el departamento o supervisor no existe, 404
+        if repositorio.version_de(connection, tabla, id) is None:
+            return jsonify({'error': no_existe}), 404
+    except Exception as e:
+        return jsonify({'error': f'Error al conectar o realizar la consulta: {e}'}), 500
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+    # Dentro de la petición la conexión es la misma: la página se lee sin pedir otra al pool
+    return get_users_page(consulta)
+
+
+def stream_users(consulta, fmt):
+    sin_plazo()  # La respuesta dura lo que tarde el cliente en descargarla
+    try:
+        connection = get_db_connection()
+        if connection is None:
+            return sin_conexion()
+        # Cursor sin buffer: las filas se leen del servidor a medida que se envían
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(*consulta.sql())
+    except Exception as e:
+        return jsonify({'error': f'Error al conectar o realizar la consulta: {e}'}), 500
+
+    encoder = consulta.encoder()
+
+    def generate():
+        try:
+            first = True
+            if fmt == 'json':
+                yield '['
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH)
+                if not rows:
+                    break
+                variantes = consulta.variantes(rows)
+                if fmt == 'ndjson':
+                    yield encoder.ndjson(rows, variantes)
+                else:
+                    # Un lote codificado de una vez, sin los corchetes de la lista
+                    chunk = encoder.json(rows, variantes)[1:-1]
+                    yield chunk if first else ',' + chunk
+                    first = False
+            if fmt == 'json':
+                yield ']'
+        finally:
+            # Si el cliente corta la descarga, descartar las filas pendientes antes de cerrar
+            if connection.unread_result:
+                connection.consume_results()
+            cursor.close()
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+# Lecturas por lotes de ids: GET /empleados?ids=1,2,3 y POST /empleados/batch
+def _parametros_lote(ids, fields, include):
+    try:
+        ids = [int(v) for v in ids]
+    except (TypeError, ValueError):
+        raise ValueError('Los ids deben ser números')
+    if not ids:
+        raise ValueError('Falta la lista de ids')
+    if len(ids) > BATCH_IDS_MAX:
+        raise ValueError(f'Como máximo {BATCH_IDS_MAX} ids por petición')
+    fields = list(fields) or list(EMPLEADO_CAMPOS)
+    unknown = [f for f in fields if f not in EMPLEADO_CAMPOS]
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+    unknown = [i for i in include if i not in BATCH_INCLUDE]
+    if unknown:
+        raise ValueError(f"No se puede incluir: {', '.join(unknown)}")
+    return ids, fields, list(dict.fromkeys(include))
+
+
+def _select_in(cursor, query, values):
+    """Ejecuta query con un IN (...) por cada lote de BATCH_CHUNK valores y devuelve todas las filas."""
+    rows = []
+    for i in range(0, len(values), BATCH_CHUNK):
+        lote = values[i:i + BATCH_CHUNK]
+        cursor.execute(query.format(', '.join(['%s'] * len(lote))), lote)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def get_users_batch(ids, fields, include):
+    # Los campos que se expanden no necesitan su JOIN: el objeto completo se lee aparte
+    columnas = [f for f in fields if f not in include]
+    columns = [f'{EMPLEADO_CAMPOS[f]} AS {f}' for f in columnas]
+    # Columnas auxiliares al final de la fila; el RowEncoder las descarta
+    columns += ['e.idEmpleados', 'e.idDepartamento', 'e.idSupervisor']
+    query = f"SELECT {', '.join(columns)} FROM tb_empleados e"
+    if 'departamento' in columnas:
+        query += ' LEFT JOIN departamento d ON e.idDepartamento = d.idDepartamento'
+    if 'supervisor' in columnas:
+        query += ' LEFT JOIN supervisor s ON e.idSupervisor = s.idSupervisor'
+    query += ' WHERE e.idEmpleados IN ({})'
+
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            query = """
-                SELECT 
-                    e.idEmpleados,
-                    e.nombre,
-                    e.apellido,
-                    e.fecha_nac,
-                    e.ciudad,
-                    e.direccion,
-                    e.telefono,
-                    d.nombre AS departamento,
-                    CONCAT(s.nombre, ' ', s.apellidos) AS supervisor,
-                    e.salario,
-                    e.foto
-                FROM tb_empleados e
-                LEFT JOIN departamento d ON e.idDepartamento = d.idDepartamento
-                LEFT JOIN supervisor s ON e.idSupervisor = s.idSupervisor;
-            """
-            cursor.execute(query)
-            users = cursor.fetchall()
-
-            # No es necesario cambiar nada en la foto, solo mostrar la URL
-            return jsonify(users), 200
+            cursor = connection.cursor()
+            rows = _select_in(cursor, query, list(dict.fromkeys(ids)))
+            n = len(columnas)
+            empleados = {}
+            for row, item in zip(rows, RowEncoder(columnas).dicts(rows)):
+                empleados[row[n]] = (item, row[n + 1], row[n + 2])
+
+            # Una consulta por tabla incluida, con los ids distintos de todo el lote
+            for nombre in include:
+                tabla, columna, columnas_tabla = BATCH_INCLUDE[nombre]
+                posicion = 1 if nombre == 'departamento' else 2
+                claves = list({fila[posicion] for fila in empleados.values()} - {None})
+                objetos = {}
+                if claves:
+                    filas = _select_in(cursor, f"SELECT {', '.join(columnas_tabla)} FROM {tabla} WHERE {columna} IN ({{}})",
+                                       claves)
+                    for item in RowEncoder(columnas_tabla).dicts(filas):
+                        objetos[item[columna]] = item
+                for fila in empleados.values():
+                    fila[0][nombre] = objetos.get(fila[posicion])
+
+            if 'foto' in columnas:
+                for item, _, _ in empleados.values():
+                    agregar_variantes(item)
+
+            # En el orden pedido; los ids inexistentes quedan marcados en su posición
+            data = [empleados[id][0] if id in empleados else {'idEmpleados': id, 'error': 'Empleado no encontrado'}
+                    for id in ids]
+            missing = list(dict.fromkeys(id for id in ids if id not in empleados))
+            return jsonify({'data': data, 'missing': missing}), 200
+        return sin_conexion()
 
     except Exception as e:
         return jsonify({'error': f'Error al conectar o realizar la consulta: {e}'}), 500
@@ -60,68 +445,86 @@ def get_users():
             connection.close()
 
 
+# POST: Lectura por lotes para listas de ids demasiado largas para la URL
+# Cuerpo: {"ids": [1, 2, 3], "fields": [...], "include": ["departamento", "supervisor"]}
+@empleado_bp.route('/empleados/batch', methods=['POST'])
+def post_users_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('ids'), list):
+        return jsonify({'error': 'El cuerpo debe ser un objeto JSON con la lista ids'}), 400
+    # fields e include admiten una lista o una cadena separada por comas, como en la URL
+    fields, include = ([v.strip() for v in valor.split(',') if v.strip()] if isinstance(valor, str) else valor
+                       for valor in (data.get('fields') or [], data.get('include') or []))
+    try:
+        ids, fields, include = _parametros_lote(data['ids'], fields, include)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return get_users_batch(ids, fields, include)
+
+
+# Columnas de tb_empleados escritas por los manejadores, para avisar a los suscriptores de eventos
+def empleado_datos(data, id_departamento, id_supervisor, foto):
+    return {
+        'nombre': data['nombre'], 'apellido': data['apellido'], 'fecha_nac': data['fecha_nac'],
+        'ciudad': data['ciudad'], 'direccion': data['direccion'], 'telefono': data['telefono'],
+        'idDepartamento': id_departamento, 'idSupervisor': id_supervisor,
+        'salario': data['salario'], 'foto': foto,
+    }
+
+
 @empleado_bp.route('/empleados', methods=['POST'])
 def add_user():
     data = request.form
     foto = request.files.get('foto')
+    foto_path = None
     if foto and allowed_file(foto.filename):
-        filename = secure_filename(foto.filename)
-        foto_path = os.path.join(UPLOAD_FOLDER, filename)
-        foto.save(foto_path)
+        # Se guarda bajo el hash del contenido; las miniaturas se generan en segundo plano
+        foto_path = guardar_foto(foto)
 
+    connection = None
     try:
         connection = get_db_connection()
-        cursor = connection.cursor()
-        query = """
-            INSERT INTO tb_empleados (nombre, apellido, fecha_nac, ciudad, direccion, telefono, idDepartamento, idSupervisor, salario, foto)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        cursor.execute(query, (
+        if connection is None:
+            return sin_conexion()
+        id = repositorio.insertar_empleado(connection, (
             data['nombre'], data['apellido'], data['fecha_nac'], data['ciudad'], 
             data['direccion'], data['telefono'], data['idDepartamento'], 
             data['idSupervisor'], data['salario'], foto_path
         ))
+        cambio = ('empleado', 'create', id,
+                  empleado_datos(data, data['idDepartamento'], data['idSupervisor'], foto_path))
+        registrar_cambios(connection, [cambio])
         connection.commit()
+        emitir(*cambio)
         return jsonify({'message': 'Empleado agregado exitosamente.'}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        connection.close()
+        if connection and connection.is_connected():
+            connection.close()
 
         # GET: Obtener un empleado por ID
 @empleado_bp.route('/empleados/<int:idEmpleados>', methods=['GET'])
 def get_user_by_id(idEmpleados):
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-
-            # Consulta SQL para buscar un empleado por su ID
-            query = """
-                SELECT 
-                    e.idEmpleados,
-                    e.nombre,
-                    e.apellido,
-                    e.fecha_nac,
-                    e.ciudad,
-                    e.direccion,
-                    e.telefono,
-                    d.nombre AS departamento,
-                    CONCAT(s.nombre, ' ', s.apellidos) AS supervisor,
-                    e.salario,
-                    e.foto
-                FROM tb_empleados e
-                LEFT JOIN departamento d ON e.idDepartamento = d.idDepartamento
-                LEFT JOIN supervisor s ON e.idSupervisor = s.idSupervisor
-                WHERE e.idEmpleados = %s
-            """
-            cursor.execute(query, (idEmpleados,))
-            empleado = cursor.fetchone()
+            # Empleado con su departamento y supervisor (sentencia preparada)
+            empleado, relacionadas = repositorio.leer_empleado(connection, idEmpleados)
 
             if empleado:
-                return jsonify(empleado), 200
+                agregar_variantes(empleado)
+                # El ETag cubre todo lo que cambia la respuesta: la versión de la fila (la que
+                # cuenta en If-Match), las del departamento y el supervisor, cuyos nombres se
+                # incluyen, y si ya existen las variantes de la foto
+                variantes = int(empleado['foto_thumb'] != empleado['foto'])
+                response = jsonify(empleado)
+                response.set_etag('-'.join(str(v or 0) for v in (empleado['version'], *relacionadas, variantes)))
+                return response.make_conditional(request)
             else:
                 return jsonify({'error': f'Empleado con ID {idEmpleados} no encontrado'}), 404
+        return sin_conexion()
 
     except Exception as e:
         return jsonify({'error': f'Error al obtener el empleado: {e}'}), 500
@@ -131,28 +534,28 @@ def get_user_by_id(idEmpleados):
             connection.close()
 
 
-# DELETE: Eliminar un empleado
+# DELETE: Eliminar un empleado (con If-Match solo si no cambió desde que se leyó)
 @empleado_bp.route('/empleados/<int:idEmpleados>', methods=['DELETE'])
 def delete_user(idEmpleados):
+    try:
+        version = if_match_version()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor()
-
-            # Verificar si el empleado existe
-            check_query = "SELECT * FROM tb_empleados WHERE idEmpleados = %s"
-            cursor.execute(check_query, (idEmpleados,))
-            empleado = cursor.fetchone()
-
-            if not empleado:
-                return jsonify({'error': f'El empleado con id {idEmpleados} no existe'}), 404
-
-            # Eliminar el empleado
-            delete_query = "DELETE FROM tb_empleados WHERE idEmpleados = %s"
-            cursor.execute(delete_query, (idEmpleados,))
+            # Sin consulta previa: las filas afectadas indican si el empleado existía
+            if not repositorio.borrar_empleado(connection, idEmpleados, version):
+                return sin_cambios(connection, 'tb_empleados', idEmpleados, version,
+                                   f'El empleado con id {idEmpleados} no existe')
+            registrar_cambios(connection, [('empleado', 'delete', idEmpleados, None)])
             connection.commit()
+            emitir('empleado', 'delete', idEmpleados)
 
             return jsonify({'message': f'Empleado con id {idEmpleados} eliminado con éxito'}), 200
+        return sin_conexion()
 
     except Exception as e:
         return jsonify({'error': f'Error al eliminar el empleado: {e}'}), 500
@@ -161,53 +564,121 @@ def delete_user(idEmpleados):
         if connection and connection.is_connected():
             connection.close()
 
-@empleado_bp.route('/empleados/<int:idEmpleados>', methods=['PUT'])
-def update_user(idEmpleados):
+
+# Datos de la petición: JSON o formulario (multipart si se envía una foto)
+def datos_peticion():
+    return request.get_json(silent=True) or request.form
+
+
+# Valores aceptados en PUT y PATCH: ninguno vacío ni nulo, y del tipo de su columna
+def _es_texto(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool) and str(value).strip() != ''
+
+
+def _es_entero(value):
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit())
+
+
+def _es_numero(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return False
     try:
-        data = request.json
-        foto = request.files.get('foto')  # Obtener nueva imagen del formulario
-
-        if foto and allowed_file(foto.filename):
-            # Guardar nueva imagen
-            filename = secure_filename(foto.filename)
-            foto_path = os.path.join(UPLOAD_FOLDER, filename)
-            foto.save(foto_path)
-            foto_sql = foto_path  # Ruta de la nueva imagen
-        else:
-            # Mantener la foto actual si no se proporciona una nueva
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            query = "SELECT foto FROM tb_empleados WHERE idEmpleados = %s"
-            cursor.execute(query, (idEmpleados,))
-            empleado = cursor.fetchone()
+        return math.isfinite(float(value))
+    except ValueError:
+        return False
 
-            if empleado:
-                foto_sql = empleado['foto']  # Mantener foto actual
-            else:
-                return jsonify({'error': 'Empleado no encontrado'}), 404
 
-        # Actualizar la información del empleado en la base de datos
-        connection = get_db_connection()
-        cursor = connection.cursor()
+def _es_fecha(value):
+    try:
+        datetime.date.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        return False
 
-        query = """
-            UPDATE tb_empleados
-            SET nombre = %s, apellido = %s, fecha_nac = %s, ciudad = %s, 
-                direccion = %s, telefono = %s, idDepartamento = %s, 
-                idSupervisor = %s, salario = %s, foto = %s
-            WHERE idEmpleados = %s
-        """
-        cursor.execute(query, (
-            data['nombre'], data['apellido'], data['fecha_nac'], data['ciudad'], 
-            data['direccion'], data['telefono'], data['departamento'], 
-            data['supervisor'], data['salario'], foto_sql, idEmpleados
-        ))
-        connection.commit()
 
-        return jsonify({'message': 'Empleado actualizado exitosamente.'}), 200
+EMPLEADO_TIPOS = {'fecha_nac': _es_fecha, 'salario': _es_numero, 'idDepartamento': _es_entero,
+                  'departamento': _es_entero, 'idSupervisor': _es_entero, 'supervisor': _es_entero}
+
 
+def valores_no_validos(data, campos, tipos=None):
+    """Campos de data con un valor vacío o que no es del tipo esperado (texto por defecto)."""
+    tipos = tipos or {}
+    return [campo for campo in campos if not tipos.get(campo, _es_texto)(data[campo])]
+
+
+def actualizar_empleado(idEmpleados, cambios, foto):
+    """UPDATE solo de las columnas recibidas, en una sentencia y con una sola conexión."""
+    try:
+        version = if_match_version()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if foto and allowed_file(foto.filename):
+        cambios['foto'] = guardar_foto(foto)
+    if not cambios:
+        return jsonify({'error': 'No hay campos para actualizar'}), 400
+
+    connection = None
+    try:
+        connection = get_db_connection()
+        if connection is None:
+            return sin_conexion()
+        cursor = connection.cursor()
+        # Las columnas salen de EMPLEADO_ACTUALIZABLES; los valores van como parámetros
+        columnas = ', '.join(f'{columna} = %s' for columna in cambios)
+        query, params = condicion_version(
+            f"UPDATE tb_empleados SET {columnas}, version = version + 1 WHERE idEmpleados = %s",
+            tuple(cambios.values()) + (idEmpleados,), version)
+        cursor.execute(query, params)
+        if cursor.rowcount == 0:
+            return sin_cambios(connection, 'tb_empleados', idEmpleados, version, 'Empleado no encontrado')
+
+        # La fila completa, en la misma transacción, para los suscriptores y el nuevo ETag
+        empleado = repositorio.leer_fila_empleado(connection, idEmpleados)
+        registrar_cambios(connection, [('empleado', 'update', idEmpleados, empleado)])
+        connection.commit()
     except Exception as e:
         return jsonify({'error': f'Error al actualizar empleado: {e}'}), 500
     finally:
         if connection and connection.is_connected():
             connection.close()
+
+    nueva = empleado.pop('version')
+    emitir('empleado', 'update', idEmpleados, empleado)
+    response = jsonify({'message': 'Empleado actualizado exitosamente.', 'version': nueva})
+    response.set_etag(str(nueva))
+    return response, 200
+
+
+# PUT: Reemplazar los datos de un empleado (la foto solo si se envía una nueva)
+@empleado_bp.route('/empleados/<int:idEmpleados>', methods=['PUT'])
+def update_user(idEmpleados):
+    data = datos_peticion()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'El cuerpo debe ser un objeto JSON'}), 400
+    faltan = [campo for campo in EMPLEADO_PUT if campo not in data]
+    if faltan:
+        return jsonify({'error': f"Faltan datos obligatorios: {', '.join(faltan)}"}), 400
+    no_validos = valores_no_validos(data, EMPLEADO_PUT, EMPLEADO_TIPOS)
+    if no_validos:
+        return jsonify({'error': f"Valores vacíos o no válidos: {', '.join(no_validos)}"}), 400
+    cambios = {EMPLEADO_ACTUALIZABLES[campo]: data[campo] for campo in EMPLEADO_PUT}
+    return actualizar_empleado(idEmpleados, cambios, request.files.get('foto'))
+
+
+# PATCH: Actualizar solo los campos enviados
+@empleado_bp.route('/empleados/<int:idEmpleados>', methods=['PATCH'])
+def patch_user(idEmpleados):
+    data = datos_peticion()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'El cuerpo debe ser un objeto JSON'}), 400
+    desconocidos = [campo for campo in data if campo not in EMPLEADO_ACTUALIZABLES]
+    if desconocidos:
+        return jsonify({'error': f"Campos desconocidos: {', '.join(desconocidos)}"}), 400
+    no_validos = valores_no_validos(data, data, EMPLEADO_TIPOS)
+    if no_validos:
+        return jsonify({'error': f"Valores vacíos o no válidos: {', '.join(no_validos)}"}), 400
+    cambios = {EMPLEADO_ACTUALIZABLES[campo]: data[campo] for campo in data}
+    return actualizar_empleado(idEmpleados, cambios, request.files.get('foto'))
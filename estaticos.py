@@ -0,0 +1,115 @@
+#estaticos.py
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Blueprint, abort, current_app, jsonify, request, send_file
+from werkzeug.security import safe_join
+
+import configuracion
+from imagenes import UPLOAD_FOLDER, contenido_hash
+
+estaticos_bp = Blueprint('estaticos', __name__)
+
+HOT_CACHE_BYTES = configuracion.get('STATIC_HOT_CACHE_BYTES', 32 * 1024 * 1024, int)  # 0 desactiva la caché
+HOT_FILE_MAX = configuracion.get('STATIC_HOT_FILE_MAX', 1024 * 1024, int)  # Tamaño máximo de un archivo en caché
+HOT_MIN_HITS = 2            # Peticiones antes de guardar un archivo en memoria
+IMMUTABLE_MAX_AGE = 31536000  # Un año para los nombres basados en el contenido
+
+
+class HotFileCache:
+    """Caché LRU en memoria de los archivos más pedidos, limitada en bytes."""
+
+    def __init__(self, budget=HOT_CACHE_BYTES, file_max=HOT_FILE_MAX):
+        self.budget = budget
+        self.file_max = file_max
+        self.used = 0
+        self._files = OrderedDict()  # ruta -> (datos, mtime)
+        self._hits = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, mtime):
+        with self._lock:
+            cached = self._files.get(path)
+            if cached and cached[1] == mtime:
+                self._files.move_to_end(path)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+            self._hits[path] = self._hits.get(path, 0) + 1
+            return None
+
+    def maybe_store(self, path, mtime, size):
+        if self.budget <= 0 or size > self.file_max or size > self.budget:
+            return None
+        with self._lock:
+            if self._hits.get(path, 0) < HOT_MIN_HITS:
+                return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        with self._lock:
+            old = self._files.pop(path, None)
+            if old:
+                self.used -= len(old[0])
+            self._files[path] = (data, mtime)
+            self.used += len(data)
+            self._hits.pop(path, None)
+            while self.used > self.budget:
+                _, (evicted, _) = self._files.popitem(last=False)
+                self.used -= len(evicted)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {'files': len(self._files), 'bytes': self.used, 'budget': self.budget,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+hot_cache = HotFileCache()
+
+
+# Ruta para servir las imágenes con ETag, Last-Modified, rangos y caché del navegador
+@estaticos_bp.route('/uploads/<filename>')
+def serve_upload(filename):
+    path = safe_join(os.path.abspath(UPLOAD_FOLDER), filename)
+    if path is None:
+        abort(404)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        abort(404)
+
+    # Los nombres basados en el hash nunca cambian de contenido: el propio nombre sirve de ETag
+    digest = contenido_hash(filename)
+    etag = os.path.splitext(filename)[0] if digest else f'{stat.st_mtime_ns}-{stat.st_size}'
+
+    data = hot_cache.get(path, stat.st_mtime_ns)
+    if data is None:
+        data = hot_cache.maybe_store(path, stat.st_mtime_ns, stat.st_size)
+
+    if data is not None:
+        # Desde memoria, con el tamaño explícito para que los rangos y la respuesta 304
+        # funcionen igual que desde disco
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = current_app.response_class(data, mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = int(stat.st_mtime)
+        response = response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    else:
+        # Sin caché se entrega el archivo con wsgi.file_wrapper (sendfile) o X-Sendfile
+        response = send_file(path, conditional=True, etag=etag)
+
+    if digest:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+# Uso de la caché de archivos en memoria
+@estaticos_bp.route('/uploads-cache/stats')
+def hot_cache_stats():
+    return jsonify(hot_cache.stats()), 200
@@ -0,0 +1,21 @@
+#eventos.py
+# Aviso de escrituras a los componentes en memoria (índice de búsqueda, etc.)
+# Los manejadores llaman a emitir() después de confirmar la transacción.
+
+_suscriptores = []
+
+
+def suscribir(fn):
+    """Registra fn(entidad, accion, id, datos); se puede usar como decorador."""
+    _suscriptores.append(fn)
+    return fn
+
+
+def emitir(entidad, accion, id, datos=None):
+    # entidad: 'empleado' | 'departamento' | 'supervisor'; accion: 'create' | 'update' | 'delete'
+    for fn in list(_suscriptores):
+        try:
+            fn(entidad, accion, id, datos)
+        except Exception as e:
+            # Un suscriptor con errores no debe hacer fallar la escritura ya confirmada
+            print(f"Error al procesar el evento {entidad}.{accion} ({id}): {e}")
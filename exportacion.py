@@ -0,0 +1,186 @@
+#exportacion.py
+# Exportación completa de empleados en CSV, NDJSON o Parquet. Las filas se leen de un
+# cursor sin buffer por lotes y cada lote se codifica y se envía antes de leer el siguiente,
+# así la memoria no depende del número de filas. Acepta los mismos filtros que GET /empleados.
+import csv
+import datetime
+import io
+from decimal import Decimal
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Sin pyarrow no se ofrece Parquet
+    pyarrow = None
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+import configuracion
+from compresion import comprimir_stream, elegir_codificacion
+from admision import sin_plazo
+from conexion import get_db_connection, sin_conexion
+from empleado import UsersQuery
+from seguridad import verificar_token
+
+exportacion_bp = Blueprint('exportacion', __name__)
+exportacion_bp.before_request(verificar_token)
+
+EXPORT_BATCH = configuracion.get('EXPORT_BATCH', 5000, int)              # Filas por lote en CSV y NDJSON
+EXPORT_ROW_GROUP = configuracion.get('EXPORT_ROW_GROUP', 20000, int)     # Filas por row group en Parquet
+
+FORMATOS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def _lotes(cursor, size):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def exportar_csv(consulta, cursor):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(consulta.fields)
+    for rows in _lotes(cursor, EXPORT_BATCH):
+        # csv convierte cada valor con str(): fechas ISO, Decimal exacto y NULL como vacío
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # Solo la cabecera, si no hubo filas
+
+
+def exportar_ndjson(consulta, cursor):
+    encoder = consulta.encoder()
+    for rows in _lotes(cursor, EXPORT_BATCH):
+        yield encoder.ndjson(rows)
+
+
+# Tipo de cada campo en Parquet (los demás son texto) y cómo convertir el valor leído
+def _fecha(value):
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value))
+
+
+def _numero(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+PARQUET_TIPOS = {
+    'idEmpleados': ('int64', None),
+    'fecha_nac': ('date32', _fecha),
+    'salario': ('float64', _numero),
+    'version': ('int64', None),
+}
+
+
+class _Salida:
+    """Archivo de solo escritura para ParquetWriter: acumula lo escrito hasta que se envía."""
+
+    def __init__(self):
+        self._trozos = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, data):
+        self._trozos.append(bytes(data))
+        self._posicion += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._posicion
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self):
+        data = b''.join(self._trozos)
+        self._trozos = []
+        return data
+
+
+def exportar_parquet(consulta, cursor):
+    tipos = [PARQUET_TIPOS.get(campo, ('string', None)) for campo in consulta.fields]
+    schema = pyarrow.schema([(campo, getattr(pyarrow, tipo)()) for campo, (tipo, _) in zip(consulta.fields, tipos)])
+    salida = _Salida()
+    writer = pyarrow.parquet.ParquetWriter(salida, schema, compression='snappy')
+    try:
+        # Un row group por lote: las columnas se construyen una vez y se escriben juntas
+        for rows in _lotes(cursor, EXPORT_ROW_GROUP):
+            columnas = []
+            for i, (tipo, convertir) in enumerate(tipos):
+                valores = [row[i] for row in rows]
+                if convertir is not None:
+                    valores = [convertir(v) if v is not None else None for v in valores]
+                elif tipo == 'string':
+                    valores = [str(v) if v is not None else None for v in valores]
+                columnas.append(pyarrow.array(valores, type=schema.field(i).type))
+            writer.write_table(pyarrow.Table.from_arrays(columnas, schema=schema), row_group_size=len(rows))
+            yield salida.vaciar()
+    finally:
+        writer.close()
+    yield salida.vaciar()  # Pie del archivo con los metadatos de los row groups
+
+
+EXPORTADORES = {'csv': exportar_csv, 'ndjson': exportar_ndjson, 'parquet': exportar_parquet}
+
+
+# GET: Exportar todos los empleados que cumplan los filtros (?format=csv|ndjson|parquet)
+# Filtros, orden y campos como en GET /empleados; CSV y NDJSON se comprimen al vuelo con
+# gzip (o brotli) si el cliente lo acepta. Parquet ya va comprimido por columnas.
+@exportacion_bp.route('/empleados/export', methods=['GET'])
+def export_users():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATOS:
+        return jsonify({'error': 'Formato no soportado, usa csv, ndjson o parquet'}), 400
+    if fmt == 'parquet' and pyarrow is None:
+        return jsonify({'error': 'Parquet no está disponible: falta el paquete pyarrow'}), 501
+    try:
+        consulta = UsersQuery(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    sin_plazo()  # La descarga dura lo que tarde el cliente en recibirla
+    try:
+        connection = get_db_connection()
+        if connection is None:
+            return sin_conexion()
+        # Cursor sin buffer: las filas se leen del servidor a medida que se envían
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(*consulta.sql())
+    except Exception as e:
+        return jsonify({'error': f'Error al conectar o realizar la consulta: {e}'}), 500
+
+    def generate():
+        try:
+            yield from EXPORTADORES[fmt](consulta, cursor)
+        finally:
+            # Si el cliente corta la descarga, descartar las filas pendientes antes de cerrar
+            if connection.unread_result:
+                connection.consume_results()
+            cursor.close()
+
+    mimetype, extension = FORMATOS[fmt]
+    body = stream_with_context(generate())
+    encoding = elegir_codificacion() if fmt != 'parquet' else None
+    if encoding is not None:
+        body = comprimir_stream(body, encoding)
+    response = Response(body, mimetype=mimetype)
+    if fmt != 'parquet':
+        response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Disposition'] = f'attachment; filename=empleados.{extension}'
+    return response
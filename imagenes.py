@@ -0,0 +1,182 @@
+#imagenes.py
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+try:
+    from PIL import Image
+except ImportError:  # Sin Pillow se guardan las fotos pero no se generan variantes
+    Image = None
+
+import configuracion
+from trabajos import encolar, tarea
+
+UPLOAD_FOLDER = 'uploads'
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+IMAGE_WORKERS = configuracion.get('IMAGE_WORKERS', 2, int)  # Trabajos de variantes a la vez
+VARIANTES_RECHECK = 5.0  # Segundos antes de volver a buscar en disco las variantes que faltaban
+
+# Variantes generadas para cada foto: nombre -> lado máximo en píxeles
+VARIANTES = {
+    'thumb': 128,
+    'preview': 512,
+}
+
+_HASH_NAME = re.compile(r'^([0-9a-f]{64})\.(\w+)$')
+_HASH_FILE = re.compile(r'^([0-9a-f]{64})(?:_[a-z]+)?\.\w+$')
+_variantes = {}     # hash -> {'thumb': ruta, 'preview': ruta}
+_revisadas = {}     # hash -> última vez que se buscaron sus variantes en disco sin encontrarlas
+_lock = threading.Lock()
+
+if not os.path.exists(UPLOAD_FOLDER):
+    os.makedirs(UPLOAD_FOLDER)
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def _extension(filename):
+    ext = filename.rsplit('.', 1)[1].lower()
+    return 'jpg' if ext == 'jpeg' else ext
+
+
+def _variant_path(digest, ext, nombre):
+    # Las GIF se reducen a PNG; el resto conserva su formato
+    variant_ext = 'png' if ext == 'gif' else ext
+    return os.path.join(UPLOAD_FOLDER, f'{digest}_{nombre}.{variant_ext}')
+
+
+def guardar_foto(foto):
+    """Guarda la foto bajo el hash de su contenido y encola sus variantes.
+
+    Devuelve la ruta que se almacena en la columna foto. Si ya existe una foto
+    con el mismo contenido se reutiliza sin volver a escribirla.
+    """
+    ext = _extension(foto.filename)
+    sha = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in iter(lambda: foto.stream.read(64 * 1024), b''):
+                sha.update(chunk)
+                tmp.write(chunk)
+        digest = sha.hexdigest()
+        path = os.path.join(UPLOAD_FOLDER, f'{digest}.{ext}')
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    programar_variantes(digest, ext)
+    return path
+
+
+def programar_variantes(digest, ext):
+    # Un trabajo por foto: la clave evita encolarla dos veces aunque la suban varios workers
+    if Image is None:
+        return
+    with _lock:
+        if digest in _variantes:
+            return
+    encolar('variantes', {'digest': digest, 'ext': ext}, clave=digest)
+
+
+@tarea('variantes', concurrencia=IMAGE_WORKERS, intentos=3)
+def trabajo_variantes(trabajo):
+    return _generar_variantes(trabajo.payload['digest'], trabajo.payload['ext'])
+
+
+def _generar_variantes(digest, ext):
+    original = os.path.join(UPLOAD_FOLDER, f'{digest}.{ext}')
+    rutas = {}
+    try:
+        with Image.open(original) as img:
+            img.load()
+            for nombre, lado in VARIANTES.items():
+                path = _variant_path(digest, ext, nombre)
+                if not os.path.exists(path):
+                    copia = img.copy()
+                    copia.thumbnail((lado, lado))
+                    if path.endswith('.jpg') and copia.mode not in ('RGB', 'L'):
+                        copia = copia.convert('RGB')
+                    tmp_path = path + '.part'
+                    copia.save(tmp_path, format='JPEG' if path.endswith('.jpg') else 'PNG', optimize=True)
+                    os.replace(tmp_path, path)
+                rutas[nombre] = path
+    finally:
+        with _lock:
+            if len(rutas) == len(VARIANTES):
+                _variantes[digest] = rutas
+    return rutas
+
+
+def cargar_variantes():
+    """Registra las variantes ya generadas y encola las que falten."""
+    for filename in os.listdir(UPLOAD_FOLDER):
+        match = _HASH_NAME.match(filename)
+        if not match:
+            continue
+        digest, ext = match.groups()
+        rutas = {nombre: _variant_path(digest, ext, nombre) for nombre in VARIANTES}
+        if all(os.path.exists(path) for path in rutas.values()):
+            with _lock:
+                _variantes[digest] = rutas
+        else:
+            programar_variantes(digest, ext)
+
+
+def variantes_de(foto_path):
+    if not foto_path:
+        return {}
+    match = _HASH_NAME.match(os.path.basename(foto_path))
+    if not match:
+        return {}
+    digest, ext = match.groups()
+    with _lock:
+        rutas = _variantes.get(digest)
+        if rutas is not None or Image is None:
+            return rutas or {}
+        # Las variantes pueden haberse generado en otro worker: mirar en disco de vez en cuando
+        ahora = time.monotonic()
+        if ahora - _revisadas.get(digest, -VARIANTES_RECHECK) < VARIANTES_RECHECK:
+            return {}
+        _revisadas[digest] = ahora
+    rutas = {nombre: _variant_path(digest, ext, nombre) for nombre in VARIANTES}
+    if not all(os.path.exists(path) for path in rutas.values()):
+        return {}
+    with _lock:
+        _variantes[digest] = rutas
+        _revisadas.pop(digest, None)
+    return rutas
+
+
+def contenido_hash(filename):
+    # Hash del contenido si el archivo (original o variante) usa un nombre basado en él
+    match = _HASH_FILE.match(filename)
+    return match.group(1) if match else None
+
+
+_VARIANTE_CAMPOS = [(nombre, f'foto_{nombre}') for nombre in VARIANTES]
+
+
+def agregar_variantes(row):
+    # Añade foto_thumb y foto_preview a una fila; si aún no existen se usa la original
+    foto = row.get('foto')
+    rutas = variantes_de(foto)
+    for nombre, campo in _VARIANTE_CAMPOS:
+        row[campo] = rutas.get(nombre, foto)
+    return row
+
+
+def columnas_variantes(fotos):
+    """foto_thumb y foto_preview de una columna de fotos: {campo: un valor por foto}."""
+    rutas = {foto: variantes_de(foto) for foto in set(fotos)}
+    return {campo: [rutas[foto].get(nombre, foto) for foto in fotos] for nombre, campo in _VARIANTE_CAMPOS}
@@ -0,0 +1,208 @@
+from flask import Blueprint, jsonify, request
+from conexion import get_db_connection, sin_conexion
+from admision import sin_plazo
+from eventos import emitir
+from cambios import registrar_cambios
+from seguridad import verificar_token
+from trabajos import TRABAJOS_DIR, aceptado, encolar, tarea
+import configuracion
+import repositorio
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+importacion_bp = Blueprint('importacion', __name__)
+importacion_bp.before_request(verificar_token)
+
+BULK_CHUNK = 1000      # Filas por executemany/commit
+BULK_CHUNK_MAX = 10000
+MAX_ERRORS = 1000      # Errores detallados como máximo en el reporte
+BULK_JOBS = configuracion.get('BULK_JOBS', 1, int)  # Importaciones en segundo plano a la vez
+
+OBLIGATORIOS = ['nombre', 'apellido', 'fecha_nac', 'ciudad', 'direccion', 'telefono',
+                'idDepartamento', 'idSupervisor', 'salario']
+
+COLUMNAS = ['nombre', 'apellido', 'fecha_nac', 'ciudad', 'direccion', 'telefono',
+            'idDepartamento', 'idSupervisor', 'salario', 'foto']
+
+# Leer filas del cuerpo de la petición (o del archivo guardado) sin cargarlo entero en memoria
+# (en NDJSON se devuelve la línea sin decodificar para reportar errores por fila)
+def leer_filas(fmt, stream):
+    stream = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield row
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield line
+
+
+# Validar una fila y convertirla en la tupla para el INSERT
+def validar_fila(row, departamentos, supervisores):
+    faltantes = [campo for campo in OBLIGATORIOS if row.get(campo) in (None, '')]
+    if faltantes:
+        raise ValueError(f"Faltan datos obligatorios: {', '.join(faltantes)}")
+
+    datetime.strptime(str(row['fecha_nac']), '%Y-%m-%d')
+    id_departamento = int(row['idDepartamento'])
+    id_supervisor = int(row['idSupervisor'])
+    salario = float(row['salario'])
+
+    if id_departamento not in departamentos:
+        raise ValueError(f'El departamento con id {id_departamento} no existe')
+    if id_supervisor not in supervisores:
+        raise ValueError(f'El supervisor con id {id_supervisor} no existe')
+
+    return (row['nombre'], row['apellido'], row['fecha_nac'], row['ciudad'], row['direccion'],
+            row['telefono'], id_departamento, id_supervisor, salario, row.get('foto') or None)
+
+
+def insertar_lote(connection, lote, reporte):
+    try:
+        primero = repositorio.insertar_empleados(connection, [valores for _, valores in lote])
+        # Un INSERT de varias filas asigna ids consecutivos a partir del primero
+        cambios = [('empleado', 'create', primero + offset, dict(zip(COLUMNAS, valores)))
+                   for offset, (_, valores) in enumerate(lote)]
+        registrar_cambios(connection, cambios)
+        connection.commit()
+        reporte['inserted'] += len(lote)
+        for cambio in cambios:
+            emitir(*cambio)
+    except Exception:
+        # Repetir fila a fila para saber cuáles fallaron
+        connection.rollback()
+        creados = []
+        for numero, valores in lote:
+            try:
+                creados.append((repositorio.insertar_empleado(connection, valores), valores))
+                reporte['inserted'] += 1
+            except Exception as e:
+                registrar_error(reporte, numero, str(e))
+        cambios = [('empleado', 'create', id, dict(zip(COLUMNAS, valores))) for id, valores in creados]
+        registrar_cambios(connection, cambios)
+        connection.commit()
+        for cambio in cambios:
+            emitir(*cambio)
+
+
+def registrar_error(reporte, numero, mensaje):
+    reporte['failed'] += 1
+    if len(reporte['errors']) < MAX_ERRORS:
+        reporte['errors'].append({'row': numero, 'error': mensaje})
+
+
+def importar(connection, fmt, stream, chunk, progreso=None):
+    """Valida e inserta por lotes las filas de stream; devuelve el reporte de la importación."""
+    # Precargar los ids válidos para validar las claves foráneas sin consultar por fila
+    departamentos = repositorio.ids_departamentos(connection)
+    supervisores = repositorio.ids_supervisores(connection)
+
+    reporte = {'inserted': 0, 'failed': 0, 'errors': []}
+    inicio = time.monotonic()
+    lote = []
+    numero = 0
+    for numero, row in enumerate(leer_filas(fmt, stream), start=1):
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+            lote.append((numero, validar_fila(row, departamentos, supervisores)))
+        except (ValueError, TypeError, AttributeError) as e:
+            registrar_error(reporte, numero, str(e))
+            continue
+        if len(lote) >= chunk:
+            insertar_lote(connection, lote, reporte)
+            lote = []
+            if progreso:
+                progreso(numero)
+    if lote:
+        insertar_lote(connection, lote, reporte)
+    if progreso:
+        progreso(numero, numero)
+
+    duracion = time.monotonic() - inicio
+    reporte['rows'] = numero
+    reporte['seconds'] = round(duracion, 3)
+    reporte['rows_per_second'] = round(numero / duracion, 1) if duracion else None
+    return reporte
+
+
+# Importación en segundo plano: el cuerpo se guarda en un archivo y lo procesa un trabajo.
+# Sin reintentos: repetir una importación a medias duplicaría las filas ya insertadas.
+@tarea('importacion', concurrencia=BULK_JOBS, intentos=1)
+def trabajo_importacion(trabajo):
+    ruta = trabajo.payload['ruta']
+    connection = None
+    try:
+        connection = get_db_connection()
+        if not connection or not connection.is_connected():
+            raise RuntimeError('No hay conexión con la base de datos')
+        try:
+            with open(ruta, 'rb') as stream:
+                return importar(connection, trabajo.payload['format'], stream, trabajo.payload['chunk'],
+                                progreso=trabajo.progreso)
+        finally:
+            connection.close()
+    finally:
+        os.remove(ruta)
+
+
+def guardar_cuerpo(fmt):
+    # Copiar el cuerpo a TRABAJOS_DIR por bloques, sin cargarlo entero en memoria
+    os.makedirs(TRABAJOS_DIR, exist_ok=True)
+    fd, ruta = tempfile.mkstemp(dir=TRABAJOS_DIR, prefix='importacion_', suffix=f'.{fmt}')
+    try:
+        with os.fdopen(fd, 'wb') as destino:
+            shutil.copyfileobj(request.stream, destino, 64 * 1024)
+    except BaseException:
+        os.remove(ruta)
+        raise
+    return ruta
+
+
+# POST: Importar empleados en bloque desde CSV o NDJSON
+# Con ?async=true responde 202 con el id de un trabajo (ver GET /jobs/<id>)
+@importacion_bp.route('/empleados/bulk', methods=['POST'])
+def bulk_import():
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Formato no soportado, usa csv o ndjson'}), 400
+
+    try:
+        chunk = int(request.args.get('chunk', BULK_CHUNK))
+    except ValueError:
+        return jsonify({'error': 'chunk debe ser un número'}), 400
+    if chunk < 1 or chunk > BULK_CHUNK_MAX:
+        return jsonify({'error': f'chunk debe estar entre 1 y {BULK_CHUNK_MAX}'}), 400
+
+    if request.args.get('async') == 'true':
+        try:
+            ruta = guardar_cuerpo(fmt)
+            return aceptado(encolar('importacion', {'ruta': ruta, 'format': fmt, 'chunk': chunk}))
+        except Exception as e:
+            return jsonify({'error': f'Error al encolar la importación: {e}'}), 500
+
+    sin_plazo()  # Una importación grande tarda lo que tarde en llegar el cuerpo
+    connection = None
+    try:
+        connection = get_db_connection()
+        if connection and connection.is_connected():
+            reporte = importar(connection, fmt, request.stream, chunk)
+            status = 201 if reporte['failed'] == 0 else 200
+            return jsonify(reporte), status
+        return sin_conexion()
+
+    except Exception as e:
+        return jsonify({'error': f'Error al importar los empleados: {e}'}), 500
+
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
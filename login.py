@@ -1,11 +1,22 @@
 from flask import Blueprint, jsonify, request
-from conexion import get_db_connection
+from conexion import get_db_connection, sin_conexion
+from concurrent.futures import TimeoutError as HashTimeout
+from seguridad import (Overloaded, TOKEN_TTL, check_password, create_token, make_password,
+                       ip_limiter, user_limiter)
+import repositorio
 
 login_bp = Blueprint('login', __name__)
 
+
+def too_many_attempts(retry_after):
+    response = jsonify({'error': 'Demasiados intentos, inténtalo más tarde'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+
 @login_bp.route('/login', methods=['POST'])
 def login():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
 
     username = data.get('user')
     password = data.get('pass')
@@ -13,21 +24,45 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Faltan datos, asegúrate de enviar tanto el usuario como la contraseña'}), 400
 
+    # Cortar los intentos masivos antes de llegar a MySQL
+    ip = request.remote_addr
+    retry_after = max(ip_limiter.retry_after(ip), user_limiter.retry_after(username))
+    if retry_after:
+        return too_many_attempts(retry_after)
+    ip_limiter.hit(ip)
+
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            query = "SELECT idlogin, user, pass FROM login WHERE user = %s"
-            cursor.execute(query, (username,))
-            user_record = cursor.fetchone()
+            user_record = repositorio.leer_login(connection, username)
 
             if user_record:
-                if user_record['pass'] == password:
-                    return jsonify({'message': 'Login exitoso', 'idlogin': user_record['idlogin']}), 200
+                valid, needs_rehash = check_password(password, user_record['pass'])
+                if valid:
+                    user_limiter.reset(username)
+                    if needs_rehash:
+                        # Guardar con hash las contraseñas en texto plano o con un factor de trabajo antiguo
+                        repositorio.cambiar_pass(connection, user_record['idlogin'], make_password(password))
+                        connection.commit()
+                    return jsonify({
+                        'message': 'Login exitoso',
+                        'idlogin': user_record['idlogin'],
+                        'token': create_token(user_record['idlogin'], user_record['user']),
+                        'expires_in': TOKEN_TTL,
+                    }), 200
                 else:
+                    user_limiter.hit(username)
                     return jsonify({'error': 'Contraseña incorrecta'}), 401
             else:
+                user_limiter.hit(username)
                 return jsonify({'error': 'Usuario no encontrado'}), 404
+        return sin_conexion()
+
+    except (Overloaded, HashTimeout):
+        response = jsonify({'error': 'Servidor ocupado, inténtalo de nuevo'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
 
     except Exception as e:
         return jsonify({'error': f'Error al conectar o realizar la consulta: {e}'}), 500
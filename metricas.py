@@ -0,0 +1,230 @@
+#metricas.py
+# Latencia por ruta, tiempo de base de datos por consulta y exposición en /metrics
+# con el formato de texto de Prometheus.
+import logging
+import re
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+
+import configuracion
+
+SLOW_QUERY_MS = configuracion.get('SLOW_QUERY_MS', 0.0, float)  # 0 desactiva el registro de consultas lentas
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_log = logging.getLogger('slow_query')
+
+_metrics = []
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)', re.IGNORECASE)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # labels -> [contadores por bucket..., suma, total]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, labels, value):
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, data in sorted(self._values.items()):
+                cumulative = 0
+                for i, bound in enumerate(self.buckets):
+                    cumulative += data[i]
+                    lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), labels + (bound,))} {cumulative}')
+                lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), labels + ("+Inf",))} {data[-1]}')
+                lines.append(f'{self.name}_sum{_labels(self.labels, labels)} {data[-2]:.6f}')
+                lines.append(f'{self.name}_count{_labels(self.labels, labels)} {data[-1]}')
+        return lines
+
+
+class Gauges:
+    """Valores calculados al generar /metrics (pool, cachés)."""
+
+    def __init__(self, name, help, labels, collect):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect  # función que devuelve {(etiquetas...): valor}
+        _metrics.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{_labels(self.labels, labels)} {value}')
+        return lines
+
+
+HTTP_LATENCY = Histogram('http_request_duration_seconds', 'Latencia de las peticiones por ruta', ('method', 'endpoint', 'status'))
+HTTP_REQUESTS = Counter('http_requests_total', 'Peticiones atendidas por ruta y estado', ('method', 'endpoint', 'status'))
+DB_CONNECT = Histogram('db_connection_wait_seconds', 'Tiempo para obtener una conexión del pool')
+DB_QUERY = Histogram('db_query_duration_seconds', 'Tiempo de base de datos por consulta y fase', ('query', 'phase'))
+DB_ERRORS = Counter('db_query_errors_total', 'Consultas que fallaron', ('query',))
+JSON_SERIALIZE = Histogram('json_serialize_seconds', 'Tiempo de serialización JSON de las respuestas', ('endpoint',))
+
+
+def fingerprint(sql):
+    # Una etiqueta por forma de consulta: sin saltos de línea y con las listas IN colapsadas
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def _add_request_time(key, seconds):
+    if has_request_context():
+        timings = g.setdefault('_timings', {})
+        timings[key] = timings.get(key, 0.0) + seconds
+
+
+def observe_connect(seconds):
+    DB_CONNECT.observe((), seconds)
+    _add_request_time('db_connect', seconds)
+
+
+class TimedCursor:
+    """Cursor que mide execute y fetch y atribuye el tiempo a la consulta ejecutada."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._query = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _timed(self, phase, fn, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            DB_ERRORS.inc((self._query or '?',))
+            raise
+        finally:
+            elapsed = time.perf_counter() - inicio
+            DB_QUERY.observe((self._query or '?', phase), elapsed)
+            _add_request_time(f'db_{phase}', elapsed)
+            if phase == 'execute' and SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+                slow_log.warning('%.1f ms: %s -- params=%r', elapsed * 1000, self._sql, self._params)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._query = fingerprint(operation)
+        self._sql, self._params = operation, params
+        return self._timed('execute', self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._query = fingerprint(operation)
+        self._sql, self._params = operation, f'<{len(seq_params)} filas>'
+        return self._timed('execute', self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def fetchone(self):
+        return self._timed('fetch', self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed('fetch', self._cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed('fetch', self._cursor.fetchall)
+
+
+def _before_request():
+    g._request_start = time.perf_counter()
+
+
+def _after_request(response):
+    inicio = g.pop('_request_start', None)
+    if inicio is None:
+        return response
+    elapsed = time.perf_counter() - inicio
+    endpoint = request.endpoint or 'not_found'
+    labels = (request.method, endpoint, str(response.status_code))
+    HTTP_LATENCY.observe(labels, elapsed)
+    HTTP_REQUESTS.inc(labels)
+
+    # Desglose para el navegador o el cliente: Server-Timing: db_execute;dur=1.2, ...
+    timings = g.get('_timings', {})
+    parts = [f'{key};dur={value * 1000:.2f}' for key, value in timings.items()]
+    parts.append(f'total;dur={elapsed * 1000:.2f}')
+    response.headers['Server-Timing'] = ', '.join(parts)
+    return response
+
+
+def medir_json(fn):
+    """Envuelve fn para que su tiempo cuente como serialización JSON de la petición."""
+    def wrapper(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - inicio
+            if has_request_context():
+                JSON_SERIALIZE.observe((request.endpoint or 'none',), elapsed)
+            _add_request_time('json', elapsed)
+    return wrapper
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.json.dumps = medir_json(app.json.dumps)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,6 @@
+-- Índices para los filtros y el orden de GET /empleados
+-- (InnoDB añade la clave primaria a cada índice secundario, lo que cubre el desempate por idEmpleados)
+CREATE INDEX idx_empleados_departamento ON tb_empleados (idDepartamento);
+CREATE INDEX idx_empleados_supervisor ON tb_empleados (idSupervisor);
+CREATE INDEX idx_empleados_ciudad ON tb_empleados (ciudad);
+CREATE INDEX idx_empleados_salario ON tb_empleados (salario);
@@ -0,0 +1,2 @@
+-- Espacio para los hashes pbkdf2_sha256$iteraciones$sal$hash de seguridad.py
+ALTER TABLE login MODIFY pass VARCHAR(255) NOT NULL;
@@ -0,0 +1,6 @@
+-- Versión de cada fila para la concurrencia optimista (If-Match / ETag).
+-- Cada UPDATE la incrementa, así que también garantiza que el número de filas afectadas
+-- sea 1 aunque los valores enviados no cambien nada.
+ALTER TABLE tb_empleados ADD COLUMN version INT UNSIGNED NOT NULL DEFAULT 1;
+ALTER TABLE supervisor ADD COLUMN version INT UNSIGNED NOT NULL DEFAULT 1;
+ALTER TABLE departamento ADD COLUMN version INT UNSIGNED NOT NULL DEFAULT 1;
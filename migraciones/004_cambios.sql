@@ -0,0 +1,17 @@
+-- Registro de cambios para GET /changes y /changes/stream (ver cambios.py).
+-- La secuencia sale de un contador de una sola fila que cada escritura incrementa justo
+-- antes del commit: el bloqueo de la fila hace que las secuencias se confirmen en orden.
+CREATE TABLE cambios (
+    seq BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+    entidad VARCHAR(20) NOT NULL,
+    accion VARCHAR(10) NOT NULL,
+    id INT NOT NULL,
+    datos JSON NULL,
+    creado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE cambios_secuencia (
+    id TINYINT UNSIGNED NOT NULL PRIMARY KEY,
+    seq BIGINT UNSIGNED NOT NULL,
+    purgado BIGINT UNSIGNED NOT NULL
+);
+INSERT INTO cambios_secuencia (id, seq, purgado) VALUES (1, 0, 0);
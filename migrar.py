@@ -0,0 +1,51 @@
+#migrar.py
+# Aplica en orden los scripts de 'migraciones/' que aún no se han ejecutado.
+# Uso: python migrar.py
+import os
+from conexion import get_db_connection
+
+MIGRATIONS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migraciones')
+
+
+def pendientes(aplicadas):
+    for filename in sorted(os.listdir(MIGRATIONS_FOLDER)):
+        if filename.endswith('.sql') and filename not in aplicadas:
+            yield filename
+
+
+def sentencias(path):
+    with open(path, encoding='utf-8') as f:
+        lines = [line for line in f if not line.strip().startswith('--')]
+    for statement in ''.join(lines).split(';'):
+        if statement.strip():
+            yield statement
+
+
+def migrar():
+    connection = get_db_connection()
+    if not connection or not connection.is_connected():
+        print("❌ Error al conectar con la base de datos.")
+        return
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                nombre VARCHAR(255) PRIMARY KEY,
+                aplicada TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT nombre FROM schema_migrations")
+        aplicadas = {row[0] for row in cursor.fetchall()}
+
+        for filename in pendientes(aplicadas):
+            for statement in sentencias(os.path.join(MIGRATIONS_FOLDER, filename)):
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (nombre) VALUES (%s)", (filename,))
+            connection.commit()
+            print(f"✅ Migración aplicada: {filename}")
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    migrar()
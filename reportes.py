@@ -0,0 +1,343 @@
+from flask import Blueprint, jsonify
+from werkzeug.http import parse_date
+from conexion import get_db_connection
+from cambios import secuencia, seguidor
+from seguridad import verificar_token
+import datetime
+import heapq
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+import repositorio
+
+reportes_bp = Blueprint('reportes', __name__)
+reportes_bp.before_request(verificar_token)
+
+FETCH_BATCH = 5000
+
+# Rangos de edad: (etiqueta, edad mínima); la edad es la que se cumple en el año en curso
+RANGOS_EDAD = [('<25', 0), ('25-34', 25), ('35-44', 35), ('45-54', 45), ('55+', 55)]
+EDAD_DESCONOCIDA = 'desconocida'
+
+
+def _entero(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _salario(value):
+    try:
+        return Decimal(str(value)) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+def _anio(fecha):
+    # fecha_nac llega como date desde MySQL, como 'AAAA-MM-DD' desde los formularios o, en la
+    # tabla cambios, como la fecha HTTP con la que se serializa en JSON
+    if isinstance(fecha, datetime.date):
+        return fecha.year
+    if isinstance(fecha, str):
+        if fecha[:4].isdigit():
+            return int(fecha[:4])
+        fecha = parse_date(fecha)
+        return fecha.year if fecha else None
+    return None
+
+
+def registro(datos):
+    """Lo que los reportes necesitan de un empleado: (departamento, supervisor, salario, año, ciudad)."""
+    return (_entero(datos.get('idDepartamento')), _entero(datos.get('idSupervisor')),
+            _salario(datos.get('salario')), _anio(datos.get('fecha_nac')), datos.get('ciudad'))
+
+
+class Grupo:
+    """Totales de un departamento o supervisor, actualizables fila a fila."""
+
+    __slots__ = ('empleados', 'suma', 'salarios', 'con_salario', '_minimos', '_maximos', 'anios', 'ciudades')
+
+    def __init__(self):
+        self.empleados = 0
+        self.suma = Decimal(0)
+        # Mínimo y máximo que sobreviven a las bajas: cuántos empleados tienen cada salario y
+        # dos montículos; los salarios que ya nadie tiene se descartan al llegar a la cima
+        self.salarios = {}    # Salario -> empleados
+        self.con_salario = 0
+        self._minimos = []
+        self._maximos = []    # Salarios con el signo cambiado
+        self.anios = {}      # Año de nacimiento -> empleados
+        self.ciudades = {}
+
+    def add(self, salario, anio, ciudad):
+        self.empleados += 1
+        if salario is not None:
+            self.suma += salario
+            self.con_salario += 1
+            count = self.salarios.get(salario, 0)
+            self.salarios[salario] = count + 1
+            if not count:
+                heapq.heappush(self._minimos, salario)
+                heapq.heappush(self._maximos, -salario)
+        self.anios[anio] = self.anios.get(anio, 0) + 1
+        self.ciudades[ciudad] = self.ciudades.get(ciudad, 0) + 1
+
+    def remove(self, salario, anio, ciudad):
+        self.empleados -= 1
+        if salario is not None and salario in self.salarios:
+            self.suma -= salario
+            self.con_salario -= 1
+            _restar(self.salarios, salario)
+            if len(self._minimos) > 2 * len(self.salarios) + 64:
+                # Demasiados salarios descartados pendientes: rehacer los montículos
+                self._minimos = list(self.salarios)
+                heapq.heapify(self._minimos)
+                self._maximos = [-value for value in self.salarios]
+                heapq.heapify(self._maximos)
+        _restar(self.anios, anio)
+        _restar(self.ciudades, ciudad)
+
+    def _extremo(self, monticulo, signo):
+        while monticulo and signo * monticulo[0] not in self.salarios:
+            heapq.heappop(monticulo)
+        return signo * monticulo[0] if monticulo else None
+
+    def minimo(self):
+        return self._extremo(self._minimos, 1)
+
+    def maximo(self):
+        return self._extremo(self._maximos, -1)
+
+    def resumen(self, anio_actual):
+        edades = {etiqueta: 0 for etiqueta, _ in RANGOS_EDAD}
+        for anio, count in self.anios.items():
+            # Sin fecha o con una fecha futura (edad negativa) no hay rango que aplicar
+            edad = anio_actual - anio if anio is not None else -1
+            etiqueta = next((e for e, minima in reversed(RANGOS_EDAD) if edad >= minima), EDAD_DESCONOCIDA)
+            edades[etiqueta] = edades.get(etiqueta, 0) + count
+        con_salario = self.con_salario
+        return {
+            'empleados': self.empleados,
+            'salario': {
+                'total': float(self.suma),
+                'promedio': round(float(self.suma) / con_salario, 2) if con_salario else None,
+                'min': float(self.minimo()) if con_salario else None,
+                'max': float(self.maximo()) if con_salario else None,
+            },
+            'edades': edades,
+            'ciudades': {ciudad or 'desconocida': count for ciudad, count in self.ciudades.items()},
+        }
+
+
+def _restar(counter, key):
+    count = counter.get(key, 0) - 1
+    if count > 0:
+        counter[key] = count
+    else:
+        counter.pop(key, None)
+
+
+class Agregados:
+    """Totales por departamento, por supervisor y de toda la empresa."""
+
+    def __init__(self):
+        self.ready = False
+        self.seq = 0                # Último cambio (tabla cambios) aplicado
+        self._empleados = {}        # id -> registro, para restar el valor anterior
+        self.departamentos = {}     # id -> Grupo
+        self.supervisores = {}
+        self.total = Grupo()
+        self.nombres = {'departamento': {}, 'supervisor': {}}
+        self._lock = threading.Lock()
+
+    def _grupos(self, reg):
+        id_departamento, id_supervisor = reg[0], reg[1]
+        yield self.total
+        yield self.departamentos.setdefault(id_departamento, Grupo())
+        yield self.supervisores.setdefault(id_supervisor, Grupo())
+
+    def add(self, id, reg):
+        with self._lock:
+            self._remove(id)
+            self._empleados[id] = reg
+            for grupo in self._grupos(reg):
+                grupo.add(*reg[2:])
+
+    def remove(self, id):
+        with self._lock:
+            self._remove(id)
+
+    def _remove(self, id):
+        reg = self._empleados.pop(id, None)
+        if reg is None:
+            return
+        for grupo in self._grupos(reg):
+            grupo.remove(*reg[2:])
+        # Los grupos que se quedan sin empleados desaparecen del reporte
+        for grupos, key in ((self.departamentos, reg[0]), (self.supervisores, reg[1])):
+            if grupos[key].empleados == 0:
+                del grupos[key]
+
+    def resumen(self, tipo, id=None):
+        anio_actual = datetime.date.today().year
+        campo = 'idDepartamento' if tipo == 'departamento' else 'idSupervisor'
+        grupos = self.departamentos if tipo == 'departamento' else self.supervisores
+        nombres = self.nombres[tipo]
+        with self._lock:
+            if id is not None:
+                grupo = grupos.get(id)
+                if grupo is None:
+                    return None
+                items = [(id, grupo)]
+            else:
+                items = sorted(grupos.items(), key=lambda item: (item[0] is None, item[0] or 0))
+            return [dict({campo: key, tipo: nombres.get(key)}, **grupo.resumen(anio_actual))
+                    for key, grupo in items]
+
+    def resumen_total(self):
+        with self._lock:
+            return self.total.resumen(datetime.date.today().year)
+
+
+agregados = Agregados()
+_rebuild_lock = threading.Lock()
+_eventos_lock = threading.Lock()
+_pendientes = None  # Cambios recibidos durante una reconstrucción, para aplicarlos después
+
+
+def construir_reportes():
+    """Recalcula todos los totales desde la base de datos y sustituye los actuales.
+
+    Devuelve False si ya había una reconstrucción en curso o no hubo conexión.
+    """
+    global agregados, _pendientes
+    if not _rebuild_lock.acquire(blocking=False):
+        return False
+    try:
+        connection = get_db_connection()
+        if not connection or not connection.is_connected():
+            print("❌ No se pudieron construir los reportes.")
+            return False
+        with _eventos_lock:
+            _pendientes = []
+        nuevo = Agregados()
+        try:
+            # La secuencia antes que los datos: los cambios posteriores se aplican después
+            nuevo.seq = secuencia(connection)[0]
+            nuevo.nombres['departamento'] = repositorio.nombres_departamentos(connection)
+            nuevo.nombres['supervisor'] = repositorio.nombres_supervisores(connection)
+            for rows in repositorio.recorrer_empleados_reportes(connection, FETCH_BATCH):
+                for id, id_departamento, id_supervisor, salario, fecha_nac, ciudad in rows:
+                    nuevo.add(id, registro({'idDepartamento': id_departamento, 'idSupervisor': id_supervisor,
+                                            'salario': salario, 'fecha_nac': fecha_nac, 'ciudad': ciudad}))
+        except Exception:
+            with _eventos_lock:
+                _pendientes = None
+            raise
+        finally:
+            connection.close()
+
+        with _eventos_lock:
+            # Las escrituras confirmadas mientras se leía pueden no estar en la lectura
+            for cambio in _pendientes:
+                _aplicar(nuevo, *cambio)
+            _pendientes = None
+            nuevo.ready = True
+            agregados = nuevo
+        seguidor.desde(nuevo.seq)
+        print(f"📊 Reportes construidos: {len(nuevo._empleados)} empleados, "
+              f"{len(nuevo.departamentos)} departamentos, {len(nuevo.supervisores)} supervisores.")
+        return True
+    finally:
+        _rebuild_lock.release()
+
+
+def _aplicar(destino, seq, entidad, accion, id, datos):
+    if seq <= destino.seq:
+        return
+    destino.seq = seq
+    if entidad == 'empleado':
+        if accion == 'delete':
+            destino.remove(id)
+        elif datos is not None:
+            destino.add(id, registro(datos))
+    elif entidad in ('departamento', 'supervisor'):
+        nombres = destino.nombres[entidad]
+        if accion == 'delete':
+            nombres.pop(id, None)
+        elif datos is not None:
+            nombres[id] = datos['nombre'] if entidad == 'departamento' else f"{datos['nombre']} {datos['apellidos']}"
+
+
+# Mantener los totales al día con las escrituras de todos los workers (tabla cambios)
+def actualizar_reportes(seq, entidad, accion, id, datos):
+    with _eventos_lock:
+        _aplicar(agregados, seq, entidad, accion, id, datos)
+        if _pendientes is not None:
+            _pendientes.append((seq, entidad, accion, id, datos))
+
+
+seguidor.seguir(actualizar_reportes, construir_reportes)
+
+
+def _disponible():
+    return agregados.ready
+
+
+def no_disponible():
+    return jsonify({'error': 'Los reportes aún no están disponibles'}), 503
+
+
+# GET: Totales de toda la empresa
+@reportes_bp.route('/reportes/resumen', methods=['GET'])
+def reporte_resumen():
+    if not _disponible():
+        return no_disponible()
+    return jsonify(agregados.resumen_total()), 200
+
+
+# GET: Plantilla, salarios, edades y ciudades por departamento o por supervisor
+@reportes_bp.route('/reportes/departamentos', methods=['GET'])
+def reporte_departamentos():
+    if not _disponible():
+        return no_disponible()
+    return jsonify(agregados.resumen('departamento')), 200
+
+
+@reportes_bp.route('/reportes/departamentos/<int:idDepartamento>', methods=['GET'])
+def reporte_departamento(idDepartamento):
+    if not _disponible():
+        return no_disponible()
+    data = agregados.resumen('departamento', idDepartamento)
+    if data is None:
+        return jsonify({'error': 'Departamento sin empleados o inexistente'}), 404
+    return jsonify(data[0]), 200
+
+
+@reportes_bp.route('/reportes/supervisores', methods=['GET'])
+def reporte_supervisores():
+    if not _disponible():
+        return no_disponible()
+    return jsonify(agregados.resumen('supervisor')), 200
+
+
+@reportes_bp.route('/reportes/supervisores/<int:idSupervisor>', methods=['GET'])
+def reporte_supervisor(idSupervisor):
+    if not _disponible():
+        return no_disponible()
+    data = agregados.resumen('supervisor', idSupervisor)
+    if data is None:
+        return jsonify({'error': 'Supervisor sin empleados o inexistente'}), 404
+    return jsonify(data[0]), 200
+
+
+# POST: Recalcular los reportes desde la base de datos
+@reportes_bp.route('/reportes/reconstruir', methods=['POST'])
+def reporte_reconstruir():
+    inicio = time.perf_counter()
+    if not construir_reportes():
+        return jsonify({'error': 'Ya hay una reconstrucción en curso o no hay conexión'}), 409
+    return jsonify({'message': 'Reportes reconstruidos',
+                    'seconds': round(time.perf_counter() - inicio, 3)}), 200
@@ -0,0 +1,343 @@
+#repositorio.py
+# Acceso a datos compartido por los blueprints: las consultas fijas más usadas, con sus
+# columnas explícitas. Con el backend de MySQL cada consulta es una sentencia preparada en el
+# servidor, una por conexión: se prepara la primera vez que esa conexión la ejecuta y después
+# solo viajan los parámetros, por el mismo cursor. Las consultas que cambian con cada petición
+# (filtros de GET /empleados, PATCH con columnas variables, listas IN) siguen en texto.
+import contextlib
+
+import configuracion
+from serializacion import RowEncoder
+
+DB_PREPARED = configuracion.get('DB_PREPARED', True, bool)  # Sentencias preparadas en el servidor
+
+DEPARTAMENTO_COLUMNAS = ('idDepartamento', 'nombre', 'version')
+SUPERVISOR_COLUMNAS = ('idSupervisor', 'nombre', 'apellidos', 'estado', 'foto', 'version')
+# Empleado con su departamento y supervisor, como lo devuelve GET /empleados/<id>
+# (EMPLEADO_QUERY añade al final las versiones de esas dos filas)
+EMPLEADO_COLUMNAS = ('idEmpleados', 'nombre', 'apellido', 'fecha_nac', 'ciudad', 'direccion', 'telefono',
+                     'departamento', 'supervisor', 'salario', 'foto', 'version')
+# Fila de tb_empleados tal como la escriben los manejadores (las claves de los eventos), más la versión
+EMPLEADO_FILA_COLUMNAS = ('nombre', 'apellido', 'fecha_nac', 'ciudad', 'direccion', 'telefono',
+                          'idDepartamento', 'idSupervisor', 'salario', 'foto', 'version')
+# Columnas que leen al arrancar el índice de búsqueda y los reportes
+BUSQUEDA_EMPLEADO_COLUMNAS = ('idEmpleados', 'nombre', 'apellido', 'ciudad', 'telefono')
+BUSQUEDA_SUPERVISOR_COLUMNAS = ('idSupervisor', 'nombre', 'apellidos')
+REPORTES_EMPLEADO_COLUMNAS = ('idEmpleados', 'idDepartamento', 'idSupervisor', 'salario', 'fecha_nac', 'ciudad')
+# Clave primaria de cada tabla con columna version
+CLAVES = {'departamento': 'idDepartamento', 'supervisor': 'idSupervisor', 'tb_empleados': 'idEmpleados'}
+
+
+def _con_empleados(tabla, columnas):
+    # Todas las filas con su número de empleados: un solo COUNT agrupado por la clave ajena
+    # (lo resuelve su índice) en lugar de una subconsulta por fila
+    clave = CLAVES[tabla]
+    return f"""
+    SELECT {', '.join('t.' + c for c in columnas)}, COALESCE(c.empleados, 0) AS empleados
+    FROM {tabla} t
+    LEFT JOIN (SELECT {clave}, COUNT(*) AS empleados FROM tb_empleados GROUP BY {clave}) c
+        ON c.{clave} = t.{clave}
+    ORDER BY t.{clave}
+"""
+
+
+EMPLEADOS_QUERY = """
+    SELECT
+        e.idEmpleados,
+        e.nombre,
+        e.apellido,
+        e.fecha_nac,
+        e.ciudad,
+        e.direccion,
+        e.telefono,
+        d.nombre AS departamento,
+        CONCAT(s.nombre, ' ', s.apellidos) AS supervisor,
+        e.salario,
+        e.foto,
+        e.version,
+        d.version AS version_departamento,
+        s.version AS version_supervisor
+    FROM tb_empleados e
+    LEFT JOIN departamento d ON e.idDepartamento = d.idDepartamento
+    LEFT JOIN supervisor s ON e.idSupervisor = s.idSupervisor
+"""
+EMPLEADO_QUERY = EMPLEADOS_QUERY + " WHERE e.idEmpleados = %s"
+EMPLEADO_FILA_QUERY = f"SELECT {', '.join(EMPLEADO_FILA_COLUMNAS)} FROM tb_empleados WHERE idEmpleados = %s"
+EMPLEADO_INSERT = """
+    INSERT INTO tb_empleados (nombre, apellido, fecha_nac, ciudad, direccion, telefono, idDepartamento, idSupervisor, salario, foto)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+EMPLEADO_DELETE = "DELETE FROM tb_empleados WHERE idEmpleados = %s"
+EMPLEADOS_BUSQUEDA_QUERY = f"SELECT {', '.join(BUSQUEDA_EMPLEADO_COLUMNAS)} FROM tb_empleados"
+EMPLEADOS_REPORTES_QUERY = f"SELECT {', '.join(REPORTES_EMPLEADO_COLUMNAS)} FROM tb_empleados"
+
+DEPARTAMENTOS_QUERY = f"SELECT {', '.join(DEPARTAMENTO_COLUMNAS)} FROM departamento"
+DEPARTAMENTO_QUERY = DEPARTAMENTOS_QUERY + " WHERE idDepartamento = %s"
+DEPARTAMENTO_INSERT = "INSERT INTO departamento (nombre) VALUES (%s)"
+# La versión siempre cambia, así que una fila existente siempre cuenta como afectada
+DEPARTAMENTO_UPDATE = "UPDATE departamento SET nombre = %s, version = version + 1 WHERE idDepartamento = %s"
+DEPARTAMENTO_DELETE = "DELETE FROM departamento WHERE idDepartamento = %s"
+DEPARTAMENTO_EMPLEADOS_COUNT = "SELECT COUNT(*) FROM tb_empleados WHERE idDepartamento = %s"
+DEPARTAMENTO_EMPLEADOS_IDS = "SELECT idEmpleados FROM tb_empleados WHERE idDepartamento = %s LIMIT %s"
+DEPARTAMENTOS_IDS_QUERY = "SELECT idDepartamento FROM departamento"
+DEPARTAMENTOS_NOMBRES_QUERY = "SELECT idDepartamento, nombre FROM departamento"
+
+SUPERVISORES_QUERY = f"SELECT {', '.join(SUPERVISOR_COLUMNAS)} FROM supervisor"
+SUPERVISOR_QUERY = SUPERVISORES_QUERY + " WHERE idSupervisor = %s"
+SUPERVISOR_INSERT = "INSERT INTO supervisor (nombre, apellidos, estado, foto) VALUES (%s, %s, %s, %s)"
+SUPERVISOR_DELETE = "DELETE FROM supervisor WHERE idSupervisor = %s"
+SUPERVISORES_IDS_QUERY = "SELECT idSupervisor FROM supervisor"
+SUPERVISORES_NOMBRES_QUERY = "SELECT idSupervisor, CONCAT(nombre, ' ', apellidos) FROM supervisor"
+SUPERVISORES_BUSQUEDA_QUERY = f"SELECT {', '.join(BUSQUEDA_SUPERVISOR_COLUMNAS)} FROM supervisor"
+
+DEPARTAMENTOS_EMPLEADOS_QUERY = _con_empleados('departamento', DEPARTAMENTO_COLUMNAS)
+SUPERVISORES_EMPLEADOS_QUERY = _con_empleados('supervisor', SUPERVISOR_COLUMNAS)
+
+LOGIN_QUERY = "SELECT idlogin, user, pass FROM login WHERE user = %s"
+LOGIN_UPDATE_PASS = "UPDATE login SET pass = %s WHERE idlogin = %s"
+
+
+class BackendPreparado:
+    """MySQL: un cursor preparado por consulta y conexión, guardado en la propia conexión.
+
+    El conjunto de consultas es fijo, así que cada conexión prepara como mucho unas
+    decenas de sentencias; se liberan en el servidor al cerrarse la conexión.
+    """
+
+    def _cursores(self, raw):
+        cursores = getattr(raw, '_repositorio_cursores', None)
+        if cursores is None:
+            cursores = raw._repositorio_cursores = {}
+        return cursores
+
+    @contextlib.contextmanager
+    def sentencia(self, connection, sql):
+        # Los cursores se guardan en la conexión real, que sobrevive a la envoltura del pool
+        cursores = self._cursores(connection.raw)
+        cursor = cursores.get(sql)
+        if cursor is None:
+            cursor = cursores[sql] = connection.cursor(prepared=True)
+        try:
+            yield cursor
+        except Exception:
+            # Tras un error no se sabe en qué estado quedó la sentencia: se prepara de nuevo
+            cursores.pop(sql, None)
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            raise
+
+
+class BackendTexto:
+    """Cursor normal por consulta: el SQL viaja como texto (p. ej. el SQLite de benchmarks/,
+    que ya guarda compiladas las sentencias que se repiten)."""
+
+    @contextlib.contextmanager
+    def sentencia(self, connection, sql):
+        cursor = connection.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+
+_backend = BackendPreparado() if DB_PREPARED else BackendTexto()
+
+
+def set_backend(backend):
+    """Cambia cómo se ejecutan las consultas (p. ej. BackendTexto para el SQLite de benchmarks/)."""
+    global _backend
+    _backend = backend
+
+
+def _consultar(connection, sql, params=()):
+    with _backend.sentencia(connection, sql) as cursor:
+        cursor.execute(sql, tuple(params))
+        return cursor.fetchall()
+
+
+def _escribir(connection, sql, params, version=None):
+    """Ejecuta una escritura y devuelve (filas afectadas, último id insertado).
+
+    Con version (If-Match) la fila solo se toca si conserva esa versión.
+    """
+    if version is not None:
+        sql, params = sql + " AND version = %s", tuple(params) + (version,)
+    with _backend.sentencia(connection, sql) as cursor:
+        cursor.execute(sql, tuple(params))
+        return cursor.rowcount, cursor.lastrowid
+
+
+def _fila(connection, sql, columnas, id):
+    rows = _consultar(connection, sql, (id,))
+    return dict(zip(columnas, rows[0])) if rows else None
+
+
+def version_de(connection, tabla, id):
+    """Versión actual de la fila, o None si no existe."""
+    rows = _consultar(connection, f"SELECT version FROM {tabla} WHERE {CLAVES[tabla]} = %s", (id,))
+    return rows[0][0] if rows else None
+
+
+# Empleados
+
+def leer_empleado(connection, id):
+    """(empleado, (versión del departamento, versión del supervisor)), o (None, None).
+
+    Los nombres del departamento y del supervisor van en la respuesta: sus versiones
+    forman parte de su ETag.
+    """
+    rows = _consultar(connection, EMPLEADO_QUERY, (id,))
+    if not rows:
+        return None, None
+    return dict(zip(EMPLEADO_COLUMNAS, rows[0])), tuple(rows[0][len(EMPLEADO_COLUMNAS):])
+
+
+def leer_fila_empleado(connection, id):
+    return _fila(connection, EMPLEADO_FILA_QUERY, EMPLEADO_FILA_COLUMNAS, id)
+
+
+def insertar_empleado(connection, valores):
+    """valores en el orden de EMPLEADO_INSERT; devuelve el id creado."""
+    return _escribir(connection, EMPLEADO_INSERT, valores)[1]
+
+
+def insertar_empleados(connection, filas):
+    """Inserta varias filas (en el orden de EMPLEADO_INSERT) y devuelve el id de la primera.
+
+    Los ids son consecutivos: executemany las envía como un único INSERT de varias filas,
+    algo que solo hace el cursor de texto (el preparado ejecuta una sentencia por fila).
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(EMPLEADO_INSERT, filas)
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+
+
+def borrar_empleado(connection, id, version=None):
+    return _escribir(connection, EMPLEADO_DELETE, (id,), version)[0]
+
+
+def borrar_empleados(connection, ids):
+    # La lista IN cambia de longitud en cada lote: va como texto
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"DELETE FROM tb_empleados WHERE idEmpleados IN ({', '.join(['%s'] * len(ids))})", ids)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def empleados_busqueda(connection):
+    """Todos los empleados con los campos del índice de búsqueda."""
+    return [dict(zip(BUSQUEDA_EMPLEADO_COLUMNAS, row)) for row in _consultar(connection, EMPLEADOS_BUSQUEDA_QUERY)]
+
+
+def recorrer_empleados_reportes(connection, lote):
+    """Todos los empleados con las columnas de REPORTES_EMPLEADO_COLUMNAS, de lote en lote
+    de filas, sin cargar la tabla entera en memoria."""
+    with _backend.sentencia(connection, EMPLEADOS_REPORTES_QUERY) as cursor:
+        cursor.execute(EMPLEADOS_REPORTES_QUERY, ())
+        while True:
+            rows = cursor.fetchmany(lote)
+            if not rows:
+                return
+            yield rows
+
+
+# Departamentos
+
+def listar_departamentos(connection, con_empleados=False):
+    """Todos los departamentos, ya en JSON (las filas no pasan por diccionarios).
+
+    Con con_empleados cada departamento lleva también su número de empleados.
+    """
+    if con_empleados:
+        return RowEncoder(DEPARTAMENTO_COLUMNAS + ('empleados',)).json(
+            _consultar(connection, DEPARTAMENTOS_EMPLEADOS_QUERY))
+    return RowEncoder(DEPARTAMENTO_COLUMNAS).json(_consultar(connection, DEPARTAMENTOS_QUERY))
+
+
+def ids_departamentos(connection):
+    return {row[0] for row in _consultar(connection, DEPARTAMENTOS_IDS_QUERY)}
+
+
+def nombres_departamentos(connection):
+    """{idDepartamento: nombre} de todos los departamentos."""
+    return dict(_consultar(connection, DEPARTAMENTOS_NOMBRES_QUERY))
+
+
+def leer_departamento(connection, id):
+    return _fila(connection, DEPARTAMENTO_QUERY, DEPARTAMENTO_COLUMNAS, id)
+
+
+def insertar_departamento(connection, nombre):
+    return _escribir(connection, DEPARTAMENTO_INSERT, (nombre,))[1]
+
+
+def actualizar_departamento(connection, id, nombre, version=None):
+    return _escribir(connection, DEPARTAMENTO_UPDATE, (nombre, id), version)[0]
+
+
+def borrar_departamento(connection, id, version=None):
+    return _escribir(connection, DEPARTAMENTO_DELETE, (id,), version)[0]
+
+
+def contar_empleados_departamento(connection, id):
+    return _consultar(connection, DEPARTAMENTO_EMPLEADOS_COUNT, (id,))[0][0]
+
+
+def ids_empleados_departamento(connection, id, limite):
+    return [row[0] for row in _consultar(connection, DEPARTAMENTO_EMPLEADOS_IDS, (id, limite))]
+
+
+# Supervisores
+
+def listar_supervisores(connection, con_empleados=False):
+    """Todos los supervisores, ya en JSON (las filas no pasan por diccionarios).
+
+    Con con_empleados cada supervisor lleva también su número de empleados a cargo.
+    """
+    if con_empleados:
+        return RowEncoder(SUPERVISOR_COLUMNAS + ('empleados',)).json(
+            _consultar(connection, SUPERVISORES_EMPLEADOS_QUERY))
+    return RowEncoder(SUPERVISOR_COLUMNAS).json(_consultar(connection, SUPERVISORES_QUERY))
+
+
+def ids_supervisores(connection):
+    return {row[0] for row in _consultar(connection, SUPERVISORES_IDS_QUERY)}
+
+
+def nombres_supervisores(connection):
+    """{idSupervisor: "nombre apellidos"} de todos los supervisores."""
+    return dict(_consultar(connection, SUPERVISORES_NOMBRES_QUERY))
+
+
+def supervisores_busqueda(connection):
+    """Todos los supervisores con los campos del índice de búsqueda."""
+    return [dict(zip(BUSQUEDA_SUPERVISOR_COLUMNAS, row)) for row in _consultar(connection, SUPERVISORES_BUSQUEDA_QUERY)]
+
+
+def leer_supervisor(connection, id):
+    return _fila(connection, SUPERVISOR_QUERY, SUPERVISOR_COLUMNAS, id)
+
+
+def insertar_supervisor(connection, nombre, apellidos, estado, foto):
+    return _escribir(connection, SUPERVISOR_INSERT, (nombre, apellidos, estado, foto))[1]
+
+
+def borrar_supervisor(connection, id, version=None):
+    return _escribir(connection, SUPERVISOR_DELETE, (id,), version)[0]
+
+
+# Login
+
+def leer_login(connection, user):
+    return _fila(connection, LOGIN_QUERY, ('idlogin', 'user', 'pass'), user)
+
+
+def cambiar_pass(connection, idlogin, password_hash):
+    return _escribir(connection, LOGIN_UPDATE_PASS, (password_hash, idlogin))[0]
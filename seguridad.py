@@ -0,0 +1,193 @@
+#seguridad.py
+# Contraseñas con hash y sal, tokens firmados sin estado y límite de intentos de login.
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+import configuracion
+
+HASH_ALGORITHM = 'pbkdf2_sha256'
+HASH_ITERATIONS = configuracion.get('PASSWORD_ITERATIONS', 260000, int)  # Factor de trabajo del hash
+HASH_WORKERS = configuracion.get('HASH_WORKERS', 4, int)      # Hilos dedicados a calcular hashes
+HASH_QUEUE_MAX = configuracion.get('HASH_QUEUE_MAX', 64, int)  # Hashes pendientes antes de rechazar
+HASH_TIMEOUT = configuracion.get('HASH_TIMEOUT', 10.0, float)
+
+TOKEN_TTL = configuracion.get('TOKEN_TTL', 3600, int)         # Segundos de validez de un token
+AUTH_REQUIRED = configuracion.get('AUTH_REQUIRED', False, bool)  # Exigir token en los blueprints protegidos
+
+# Límites de intentos: (intentos, ventana en segundos)
+LOGIN_LIMIT_USER = (configuracion.get('LOGIN_LIMIT_USER', 5, int), 300)
+LOGIN_LIMIT_IP = (configuracion.get('LOGIN_LIMIT_IP', 30, int), 60)
+
+SECRET_KEY = configuracion.get('SECRET_KEY')
+if not SECRET_KEY:
+    # Sin SECRET_KEY los tokens dejan de valer al reiniciar (con el lanzador de producción
+    # la clave se genera en el master antes del fork y la comparten los workers)
+    print("⚠️  SECRET_KEY no configurada: se usará una clave temporal.")
+    SECRET_KEY = secrets.token_hex(32)
+
+_serializer = URLSafeTimedSerializer(SECRET_KEY, salt='login')
+
+
+class Overloaded(Exception):
+    """La cola de cálculo de hashes está llena."""
+
+
+# --- Hash de contraseñas ---
+
+class HashPool:
+    """Pool acotado de hilos para los hashes, para no ocupar los hilos de las peticiones."""
+
+    def __init__(self, workers=HASH_WORKERS, queue_max=HASH_QUEUE_MAX):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_max)
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise Overloaded()
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result(timeout=HASH_TIMEOUT)
+
+
+_hash_pool = None
+_hash_pool_pid = None
+_hash_pool_lock = threading.Lock()
+
+
+def get_hash_pool():
+    global _hash_pool, _hash_pool_pid
+    with _hash_pool_lock:
+        if _hash_pool is None or _hash_pool_pid != os.getpid():
+            _hash_pool = HashPool()
+            _hash_pool_pid = os.getpid()
+        return _hash_pool
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _hash_password(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+
+def _make_password(password, iterations=HASH_ITERATIONS):
+    salt = secrets.token_bytes(16)
+    return f'{HASH_ALGORITHM}${iterations}${_b64(salt)}${_b64(_hash_password(password, salt, iterations))}'
+
+
+def _check_password(password, stored):
+    """Devuelve (válida, necesita_rehash)."""
+    parts = stored.split('$') if stored else []
+    if len(parts) != 4 or parts[0] != HASH_ALGORITHM:
+        # Contraseña antigua en texto plano: se acepta una vez y se guarda con hash
+        return hmac.compare_digest(str(stored or '').encode(), password.encode()), True
+    iterations = int(parts[1])
+    digest = _hash_password(password, _unb64(parts[2]), iterations)
+    return hmac.compare_digest(digest, _unb64(parts[3])), iterations < HASH_ITERATIONS
+
+
+def make_password(password):
+    return get_hash_pool().run(_make_password, password)
+
+
+def check_password(password, stored):
+    return get_hash_pool().run(_check_password, password, stored)
+
+
+# --- Tokens ---
+
+def create_token(idlogin, user):
+    return _serializer.dumps({'idlogin': idlogin, 'user': user})
+
+
+def verify_token(token):
+    """Devuelve los datos del token o None si no es válido o expiró."""
+    try:
+        return _serializer.loads(token, max_age=TOKEN_TTL)
+    except (BadSignature, SignatureExpired):
+        return None
+
+
+def verificar_token():
+    # before_request de los blueprints protegidos; no consulta la base de datos
+    if not AUTH_REQUIRED or request.method == 'OPTIONS':
+        return None
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return jsonify({'error': 'Falta el token de acceso'}), 401
+    datos = verify_token(header[len('Bearer '):].strip())
+    if datos is None:
+        return jsonify({'error': 'Token no válido o expirado'}), 401
+    g.usuario = datos
+    return None
+
+
+# --- Límite de intentos ---
+
+class RateLimiter:
+    """Ventana deslizante en memoria de intentos por clave."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _prune(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def retry_after(self, key):
+        """Segundos hasta el próximo intento permitido (0 si se permite)."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0
+            self._prune(hits, now)
+            if len(hits) < self.limit:
+                return 0
+            return max(1, int(hits[0] + self.window - now) + 1)
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.setdefault(key, deque())
+            self._prune(hits, now)
+            hits.append(now)
+            if now - self._last_sweep > self.window:
+                self._sweep(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _sweep(self, now):
+        # Olvidar las claves sin intentos recientes para que la memoria no crezca
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+        self._last_sweep = now
+
+
+# Intentos fallidos por usuario y todos los intentos por IP
+user_limiter = RateLimiter(*LOGIN_LIMIT_USER)
+ip_limiter = RateLimiter(*LOGIN_LIMIT_IP)
@@ -0,0 +1,166 @@
+#serializacion.py
+# Serialización JSON rápida: proveedor de Flask sobre orjson (si está instalado) y
+# codificación de filas en tupla a JSON con las claves precalculadas por consulta.
+import datetime
+import decimal
+import operator
+from itertools import chain, repeat
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # Sin orjson se usa el proveedor por defecto de Flask
+    orjson = None
+
+import configuracion
+from metricas import medir_json
+
+JSON_PROVIDER = configuracion.get('JSON_PROVIDER', 'orjson')  # orjson o default
+
+# Tipos de MySQL que JSON no admite: mismo formato que el proveedor por defecto de Flask
+CONVERSIONES = (
+    (datetime.date, http_date),   # También datetime, que hereda de date
+    (decimal.Decimal, str),
+)
+_CLAVE = operator.itemgetter(0)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Proveedor de JSON de Flask sobre orjson, con la misma salida que el de por defecto."""
+
+    ensure_ascii = False  # orjson escribe UTF-8 sin escapar
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def _conversion(value):
+    for tipo, fn in CONVERSIONES:
+        if isinstance(value, tipo):
+            return fn
+    return None
+
+
+_BOOLEANOS = {True: 'true', False: 'false'}
+
+
+def _columna_json(valores, ascii, dumps):
+    """Los valores de una columna, cada uno ya en JSON.
+
+    Si todos (salvo NULL) son del mismo tipo la columna entera pasa por una sola función,
+    casi siempre en C: texto, enteros, Decimal, o las fechas ya formateadas una vez por
+    fecha distinta. Con tipos mezclados o desconocidos, el serializador de la app.
+    """
+    tipos = set(map(type, valores))
+    tipos.discard(type(None))
+    if not tipos:
+        return ['null'] * len(valores)
+    tipo = tipos.pop() if len(tipos) == 1 else None
+    if tipo is str:
+        fn = encode_basestring_ascii if ascii else encode_basestring
+    elif tipo is bool:
+        fn = _BOOLEANOS.__getitem__
+    elif tipo in (int, float):
+        fn = tipo.__repr__
+    elif tipo is decimal.Decimal:
+        fn = '"%s"'.__mod__  # Como str(), que solo produce dígitos, signo, punto y exponente
+    elif tipo is not None and issubclass(tipo, datetime.date):
+        texto = encode_basestring_ascii if ascii else encode_basestring
+        fn = {value: texto(http_date(value)) for value in set(valores) if value is not None}.__getitem__
+    else:
+        return list(map(dumps, valores))
+    if None in valores:
+        return ['null' if value is None else fn(value) for value in valores]
+    return list(map(fn, valores))
+
+
+class RowEncoder:
+    """Codifica filas en tupla directamente en JSON, o en diccionarios para quien los necesite.
+
+    Las claves se fijan una vez por consulta y su texto ('"nombre":') se precalcula; cada
+    columna se codifica entera con la función de su tipo y las filas se montan intercalando
+    esos fragmentos, sin crear un diccionario por fila ni pasar por el hook genérico del
+    serializador en cada valor. Las columnas de la fila que sobran al final (p. ej. las
+    claves de paginación) se descartan.
+    """
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self._conversiones = None
+
+    @medir_json
+    def json(self, rows, extra=None):
+        """Lista JSON de las filas; extra: {clave: un valor por fila} con columnas calculadas."""
+        if not rows:
+            return '[]'
+        return '[' + self._objetos(rows, extra, '},{') + '}]'
+
+    @medir_json
+    def ndjson(self, rows, extra=None):
+        """Un objeto JSON por línea."""
+        if not rows:
+            return ''
+        return self._objetos(rows, extra, '}\n{') + '}\n'
+
+    def _objetos(self, rows, extra, separador):
+        # Sin la llave de cierre del último objeto
+        provider = current_app.json
+        ascii = getattr(provider, 'ensure_ascii', True)
+        columnas = list(zip(self.keys, zip(*rows)))
+        if extra:
+            columnas.extend(extra.items())
+        if provider.sort_keys:
+            columnas.sort(key=_CLAVE)
+        partes = []
+        for i, (key, valores) in enumerate(columnas):
+            fragmento = (separador if i == 0 else ',') + encode_basestring(key) + ':'
+            partes.append(repeat(fragmento, len(valores)))
+            partes.append(_columna_json(valores, ascii, provider.dumps))
+        # Cada fila empieza con el separador: al principio solo se conserva su '{'
+        return ''.join(chain.from_iterable(zip(*partes)))[len(separador) - 1:]
+
+    def _detectar(self, rows):
+        conversiones = []
+        for i, key in enumerate(self.keys):
+            value = next((row[i] for row in rows if row[i] is not None), None)
+            fn = _conversion(value) if value is not None else None
+            if fn is not None:
+                conversiones.append((key, fn))
+        self._conversiones = conversiones
+
+    def dicts(self, rows):
+        if not rows:
+            return []
+        if self._conversiones is None:
+            self._detectar(rows)
+        keys = self.keys
+        if not self._conversiones:
+            return [dict(zip(keys, row)) for row in rows]
+        conversiones = self._conversiones
+        result = []
+        for row in rows:
+            item = dict(zip(keys, row))
+            for key, fn in conversiones:
+                value = item[key]
+                if value is not None:
+                    item[key] = fn(value)
+            result.append(item)
+        return result
+
+
+def init_app(app):
+    # Antes de metricas.init_app, que envuelve app.json.dumps para medirlo
+    if JSON_PROVIDER == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,80 @@
+#servidor.py
+# Lanzador de producción con gunicorn: varios workers creados con fork a partir de la app
+# ya cargada (preload), un pool de conexiones por worker y reciclado tras N peticiones.
+#
+#   API_MODE=production python APIRUN.py     (o: python servidor.py)
+#   gunicorn -c servidor.py APIRUN:app
+#
+# Recarga sin cortes: kill -HUP <pid del master> arranca workers nuevos y detiene los
+# viejos cuando terminan sus peticiones. Para cargar código nuevo con preload usar USR2.
+#
+# Los datos en memoria (índice de búsqueda, reportes) se cargan una vez en el master y cada
+# worker, también los que sustituyen a uno reciclado mucho después, los hereda con la
+# secuencia de la tabla cambios en la que se leyeron: al arrancar se pone al día desde ella
+# y después aplica las escrituras de todos los workers (ver cambios.Seguidor). Las cachés de
+# respuestas son de cada worker y se invalidan igual, con las escrituras de cualquiera.
+import multiprocessing
+
+import configuracion
+
+bind = configuracion.get('API_BIND', '0.0.0.0:5000')
+workers = configuracion.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1, int)
+threads = configuracion.get('WEB_THREADS', 4, int)
+preload_app = True
+max_requests = configuracion.get('WEB_MAX_REQUESTS', 1000, int)              # Reciclar cada worker tras N peticiones
+max_requests_jitter = configuracion.get('WEB_MAX_REQUESTS_JITTER', 100, int)  # Evitar que todos se reinicien a la vez
+timeout = configuracion.get('WEB_TIMEOUT', 30, int)
+graceful_timeout = configuracion.get('WEB_GRACEFUL_TIMEOUT', 30, int)
+keepalive = configuracion.get('WEB_KEEPALIVE', 5, int)
+accesslog = configuracion.get('WEB_ACCESSLOG', '-')
+
+
+def when_ready(server):
+    # En el master, antes de crear los workers: los datos en memoria se comparten tras el fork.
+    # El master no sigue la tabla cambios; cada worker se pone al día por su cuenta
+    import APIRUN
+    import conexion
+    APIRUN.preparar()
+    conexion.close_pool()  # No heredar conexiones abiertas del master
+
+
+def post_fork(server, worker):
+    # Cada worker abre y precalienta su propio pool de conexiones
+    import cambios
+    import conexion
+    import trabajos
+    try:
+        conexion.init_pool()
+    except Exception as e:
+        server.log.warning(f"Error al precalentar el pool de conexiones: {e}")
+    trabajos.iniciar()  # Cada worker ejecuta su parte de la cola de trabajos
+    # Se pone al día desde la secuencia heredada del master (o reconstruye si ya se purgó)
+    # y sigue aplicando las escrituras de todos los workers a los datos en memoria y cachés
+    cambios.seguidor.iniciar()
+
+
+def run():
+    from gunicorn.app.base import BaseApplication
+
+    hooks = {'when_ready': when_ready, 'post_fork': post_fork}
+    settings = {
+        'bind': bind, 'workers': workers, 'threads': threads, 'preload_app': preload_app,
+        'max_requests': max_requests, 'max_requests_jitter': max_requests_jitter,
+        'timeout': timeout, 'graceful_timeout': graceful_timeout, 'keepalive': keepalive,
+        'accesslog': accesslog,
+    }
+
+    class Servidor(BaseApplication):
+        def load_config(self):
+            for key, value in {**settings, **hooks}.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from APIRUN import app
+            return app
+
+    Servidor().run()
+
+
+if __name__ == '__main__':
+    run()
@@ -1,7 +1,13 @@
 from flask import Blueprint, jsonify, request
-from conexion import get_db_connection
-from werkzeug.utils import secure_filename
-import os
+from conexion import get_db_connection, sin_conexion
+from cache import ResponseCache, cached_response
+from imagenes import guardar_foto
+from eventos import emitir, suscribir
+from cambios import registrar_cambios, seguidor
+from seguridad import verificar_token
+from versiones import condicion_version, if_match_version, sin_cambios
+import repositorio
+from empleado import get_users_de, valores_no_validos
 
 # Configurar la carpeta donde se guardarán las fotos
 UPLOAD_FOLDER = 'uploads/'  
@@ -11,20 +17,52 @@ def allowed_file(filename):
 
 
 supervisor_bp = Blueprint('supervisor', __name__)
+supervisor_bp.before_request(verificar_token)
+
+# Caché de lecturas, una por worker; se invalida con cada escritura de cualquiera de ellos
+supervisores_cache = ResponseCache('supervisores')
+
+# Campos que se pueden cambiar con PUT (todos obligatorios) y PATCH
+SUPERVISOR_CAMPOS = ['nombre', 'apellidos', 'estado']
+
+
+# Los conteos cambian con cada alta, baja o cambio de supervisor de un empleado
+@suscribir
+def _invalidar_conteos(entidad, accion, id, datos):
+    if entidad == 'empleado':
+        supervisores_cache.discard('all_counts')
+
+
+# Las escrituras de los demás workers llegan por la tabla cambios (ver cambios.Seguidor)
+def _invalidar_cambio(seq, entidad, accion, id, datos):
+    if entidad == 'supervisor':
+        supervisores_cache.clear(seq)
+    elif entidad == 'empleado':
+        supervisores_cache.discard('all_counts', seq)
+
+
+seguidor.seguir(_invalidar_cambio, supervisores_cache.clear)
 
 #CRUD
 
 # Ruta GET para obtener todos los supervisores
+# Con ?with_counts=true cada uno lleva su número de empleados a cargo (una sola consulta agrupada)
 @supervisor_bp.route('/supervisores', methods=['GET'])
 def get_supervisores():
+    con_empleados = request.args.get('with_counts') == 'true'
+    key = 'all_counts' if con_empleados else 'all'
+    entry = supervisores_cache.get(key)
+    if entry:
+        return cached_response(entry)
+
+    generation = supervisores_cache.generation
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            query = "SELECT * FROM supervisor"  # Aquí estamos apuntando a la tabla `supervisor`
-            cursor.execute(query)
-            supervisores = cursor.fetchall()
-            return jsonify(supervisores), 200
+            supervisores = repositorio.listar_supervisores(connection, con_empleados)
+            return cached_response(supervisores_cache.set_json(key, supervisores, generation))
+        return sin_conexion()
 
     except Exception as e:
         return jsonify({'error': f'Error al conectar o realizar la consulta: {e}'}), 500
@@ -37,18 +75,24 @@ def get_supervisores():
 # Ruta GET para obtener un supervisor específico por id
 @supervisor_bp.route('/supervisores/<int:idSupervisor>', methods=['GET'])
 def get_supervisor(idSupervisor):
+    entry = supervisores_cache.get(idSupervisor)
+    if entry:
+        return cached_response(entry)
+
+    generation = supervisores_cache.generation
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            query = "SELECT * FROM supervisor WHERE idSupervisor = %s"
-            cursor.execute(query, (idSupervisor,))
-            supervisor = cursor.fetchone()
+            supervisor = repositorio.leer_supervisor(connection, idSupervisor)
 
             if supervisor:
-                return jsonify(supervisor), 200
+                # ETag = versión de la fila, la que se envía en If-Match al modificarlo
+                return cached_response(supervisores_cache.set(idSupervisor, supervisor, generation,
+                                                              etag=str(supervisor['version'])))
             else:
                 return jsonify({'error': 'Supervisor no encontrado'}), 404
+        return sin_conexion()
     except Exception as e:
         return jsonify({'error': f'Error al obtener los datos: {e}'}), 500
     finally:
@@ -56,6 +100,13 @@ def get_supervisor(idSupervisor):
             connection.close()
 
 
+# Ruta GET para obtener los empleados a cargo de un supervisor, por páginas (?limit=N&after=<token>)
+# Admite los filtros, el orden y los campos de GET /empleados
+@supervisor_bp.route('/supervisores/<int:idSupervisor>/empleados', methods=['GET'])
+def get_empleados_supervisor(idSupervisor):
+    return get_users_de('supervisor', idSupervisor, f'El supervisor con id {idSupervisor} no existe')
+
+
 # Ruta POST para agregar un nuevo supervisor
 @supervisor_bp.route('/supervisores', methods=['POST'])
 def add_supervisor():
@@ -71,19 +122,19 @@ def add_supervisor():
         return jsonify({'error': 'Faltan datos obligatorios'}), 400
 
     if foto and allowed_file(foto.filename):
-        filename = secure_filename(foto.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        foto.save(filepath)
+        filepath = guardar_foto(foto)
+        connection = None
         try:
             connection = get_db_connection()
-            cursor = connection.cursor()
-
-            query = """
-                INSERT INTO supervisor (nombre, apellidos, estado, foto) 
-                VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(query, (nombre, apellidos, estado, filepath))
+            if connection is None:
+                return sin_conexion()
+            id = repositorio.insertar_supervisor(connection, nombre, apellidos, estado, filepath)
+            cambio = ('supervisor', 'create', id,
+                      {'nombre': nombre, 'apellidos': apellidos, 'estado': estado, 'foto': filepath})
+            registrar_cambios(connection, [cambio])
             connection.commit()
+            supervisores_cache.clear()
+            emitir(*cambio)
 
             return jsonify({'message': 'Supervisor creado con éxito'}), 201
 
@@ -97,58 +148,108 @@ def add_supervisor():
         return jsonify({'error': 'Foto no válida'}), 400
     
 
-# Ruta PUT para editar un supervisor
-@supervisor_bp.route('/supervisores/<int:idSupervisor>', methods=['PUT'])
-def update_supervisor(idSupervisor):
-    try:
-        nombre = request.json.get('nombre')
-        apellidos = request.json.get('apellidos')
-        estado = request.json.get('estado')
-
-        if not all([nombre, apellidos, estado]):
-            return jsonify({'error': 'Faltan datos obligatorios'}), 400
-
-        connection = get_db_connection()
-        if connection and connection.is_connected():
-            cursor = connection.cursor()
+# Datos de la petición: JSON o formulario (multipart si se envía una foto)
+def datos_peticion():
+    return request.get_json(silent=True) or request.form
 
-            cursor.execute("SELECT * FROM supervisor WHERE idSupervisor = %s", (idSupervisor,))
-            if not cursor.fetchone():
-                return jsonify({'error': f'El supervisor con id {idSupervisor} no existe'}), 404
 
-            update_query = "UPDATE supervisor SET nombre = %s, apellidos = %s, estado = %s WHERE idSupervisor = %s"
-            cursor.execute(update_query, (nombre, apellidos, estado, idSupervisor))
-            connection.commit()
+def actualizar_supervisor(idSupervisor, cambios, foto):
+    """UPDATE solo de las columnas recibidas, en una sentencia y con una sola conexión."""
+    try:
+        version = if_match_version()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-            return jsonify({'message': f'Supervisor con id {idSupervisor} actualizado con éxito'}), 200
+    if foto and allowed_file(foto.filename):
+        cambios['foto'] = guardar_foto(foto)
+    if not cambios:
+        return jsonify({'error': 'No hay campos para actualizar'}), 400
 
+    connection = None
+    try:
+        connection = get_db_connection()
+        if connection is None:
+            return sin_conexion()
+        cursor = connection.cursor()
+        columnas = ', '.join(f'{columna} = %s' for columna in cambios)
+        query, params = condicion_version(
+            f"UPDATE supervisor SET {columnas}, version = version + 1 WHERE idSupervisor = %s",
+            tuple(cambios.values()) + (idSupervisor,), version)
+        cursor.execute(query, params)
+        if cursor.rowcount == 0:
+            return sin_cambios(connection, 'supervisor', idSupervisor, version,
+                               f'El supervisor con id {idSupervisor} no existe')
+
+        # La fila completa para los suscriptores y el nuevo ETag
+        supervisor = repositorio.leer_supervisor(connection, idSupervisor)
+        del supervisor['idSupervisor']
+        registrar_cambios(connection, [('supervisor', 'update', idSupervisor, supervisor)])
+        connection.commit()
     except Exception as e:
         return jsonify({'error': f'Error al actualizar el supervisor: {e}'}), 500
-
     finally:
         if connection and connection.is_connected():
             connection.close()
 
+    supervisores_cache.clear()
+    nueva = supervisor.pop('version')
+    emitir('supervisor', 'update', idSupervisor, supervisor)
+    response = jsonify({'message': f'Supervisor con id {idSupervisor} actualizado con éxito', 'version': nueva})
+    response.set_etag(str(nueva))
+    return response, 200
+
+
+# Ruta PUT para editar un supervisor
+@supervisor_bp.route('/supervisores/<int:idSupervisor>', methods=['PUT'])
+def update_supervisor(idSupervisor):
+    data = datos_peticion()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'El cuerpo debe ser un objeto JSON'}), 400
+    if not all(data.get(campo) for campo in SUPERVISOR_CAMPOS):
+        return jsonify({'error': 'Faltan datos obligatorios'}), 400
+    no_validos = valores_no_validos(data, SUPERVISOR_CAMPOS)
+    if no_validos:
+        return jsonify({'error': f"Valores vacíos o no válidos: {', '.join(no_validos)}"}), 400
+    return actualizar_supervisor(idSupervisor, {campo: data[campo] for campo in SUPERVISOR_CAMPOS}, None)
+
+
+# Ruta PATCH para cambiar solo los campos enviados (y la foto, si se envía)
+@supervisor_bp.route('/supervisores/<int:idSupervisor>', methods=['PATCH'])
+def patch_supervisor(idSupervisor):
+    data = datos_peticion()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'El cuerpo debe ser un objeto JSON'}), 400
+    desconocidos = [campo for campo in data if campo not in SUPERVISOR_CAMPOS]
+    if desconocidos:
+        return jsonify({'error': f"Campos desconocidos: {', '.join(desconocidos)}"}), 400
+    no_validos = valores_no_validos(data, data)
+    if no_validos:
+        return jsonify({'error': f"Valores vacíos o no válidos: {', '.join(no_validos)}"}), 400
+    return actualizar_supervisor(idSupervisor, {campo: data[campo] for campo in data}, request.files.get('foto'))
+
 
 # Ruta DELETE para eliminar un supervisor por id
 @supervisor_bp.route('/supervisores/<int:idSupervisor>', methods=['DELETE'])
 def delete_supervisor(idSupervisor):
+    try:
+        version = if_match_version()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    connection = None
     try:
         connection = get_db_connection()
         if connection and connection.is_connected():
-            cursor = connection.cursor()
-            check_query = "SELECT * FROM supervisor WHERE idSupervisor = %s"
-            cursor.execute(check_query, (idSupervisor,))
-            supervisor = cursor.fetchone()
-
-            if not supervisor:
-                return jsonify({'error': f'El supervisor con id {idSupervisor} no existe'}), 404
-
-            delete_query = "DELETE FROM supervisor WHERE idSupervisor = %s"
-            cursor.execute(delete_query, (idSupervisor,))
+            if not repositorio.borrar_supervisor(connection, idSupervisor, version):
+                return sin_cambios(connection, 'supervisor', idSupervisor, version,
+                                   f'El supervisor con id {idSupervisor} no existe')
+            registrar_cambios(connection, [('supervisor', 'delete', idSupervisor, None)])
             connection.commit()
+            supervisores_cache.clear()
+            emitir('supervisor', 'delete', idSupervisor)
 
             return jsonify({'message': f'Supervisor con id {idSupervisor} eliminado con éxito'}), 200
+        return sin_conexion()
 
     except Exception as e:
         return jsonify({'error': f'Error al eliminar el supervisor: {e}'}), 500
@@ -156,4 +257,3 @@ def delete_supervisor(idSupervisor):
     finally:
         if connection and connection.is_connected():
             connection.close()
-
@@ -0,0 +1,364 @@
+#trabajos.py
+# Cola de trabajos en segundo plano para las operaciones pesadas (variantes de las fotos,
+# importaciones grandes, borrados en cascada). Los trabajos se guardan en SQLite, así que
+# sobreviven a un reinicio; cada proceso los ejecuta en su pool de hilos, con reintentos
+# con espera exponencial y un límite de trabajos simultáneos por tipo entre todos los procesos.
+#
+# Los tipos se registran con @tarea('tipo') en el módulo que los implementa y se encolan
+# con encolar('tipo', payload); el cliente consulta el avance en GET /jobs/<id>.
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from flask import Blueprint, has_request_context, jsonify, url_for
+
+import configuracion
+from seguridad import verificar_token
+
+trabajos_bp = Blueprint('trabajos', __name__)
+trabajos_bp.before_request(verificar_token)
+
+TRABAJOS_DIR = configuracion.get('TRABAJOS_DIR', 'trabajos')   # Base de datos de la cola y archivos temporales
+TRABAJOS_DB = os.path.join(TRABAJOS_DIR, 'cola.sqlite3')
+TRABAJOS_WORKERS = configuracion.get('TRABAJOS_WORKERS', 4, int)              # Hilos por proceso
+TRABAJOS_POLL = configuracion.get('TRABAJOS_POLL', 1.0, float)                # Segundos entre búsquedas de trabajos
+TRABAJOS_BACKOFF = configuracion.get('TRABAJOS_BACKOFF', 5.0, float)          # Espera del primer reintento; se duplica
+TRABAJOS_VENCIMIENTO = configuracion.get('TRABAJOS_VENCIMIENTO', 120.0, float)  # Sin latido en N s: el proceso murió
+TRABAJOS_RETENCION = configuracion.get('TRABAJOS_RETENCION', 7 * 86400, int)  # Segundos que se conservan los terminados
+
+PENDIENTE, EN_CURSO, COMPLETADO, FALLIDO = 'pendiente', 'en_curso', 'completado', 'fallido'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    clave TEXT,
+    estado TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    resultado TEXT,
+    error TEXT,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    max_intentos INTEGER NOT NULL,
+    hechos INTEGER,
+    total INTEGER,
+    disponible REAL NOT NULL,
+    latido REAL,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, disponible);
+CREATE INDEX IF NOT EXISTS idx_trabajos_clave ON trabajos (tipo, clave);
+"""
+
+Tipo = namedtuple('Tipo', 'fn concurrencia intentos')
+_tipos = {}
+_app = None
+_schema_lock = threading.Lock()
+_schema_pid = None
+
+
+class SinReintentos(Exception):
+    """Fallo que repetir el trabajo no arregla (p. ej. un conflicto de versión): se da por fallido."""
+
+
+def tarea(tipo, concurrencia=1, intentos=3):
+    """Registra fn(trabajo) como el tipo de trabajo 'tipo'.
+
+    concurrencia: trabajos de este tipo a la vez entre todos los procesos.
+    intentos: ejecuciones como máximo; solo se reintenta si fn lanza una excepción
+    (salvo SinReintentos), así que con más de uno fn debe poder repetirse sin efectos duplicados.
+    """
+    def decorador(fn):
+        _tipos[tipo] = Tipo(fn, concurrencia, intentos)
+        return fn
+    return decorador
+
+
+def _conectar():
+    global _schema_pid
+    with _schema_lock:
+        if _schema_pid != os.getpid():
+            os.makedirs(TRABAJOS_DIR, exist_ok=True)
+            db = sqlite3.connect(TRABAJOS_DB, timeout=30)
+            try:
+                db.execute('PRAGMA journal_mode=WAL')
+                db.executescript(SCHEMA)
+            finally:
+                db.close()
+            _schema_pid = os.getpid()
+    return sqlite3.connect(TRABAJOS_DB, timeout=30, isolation_level=None)
+
+
+@contextmanager
+def _transaccion():
+    # BEGIN IMMEDIATE: los procesos que reclaman trabajos a la vez se turnan
+    db = _conectar()
+    try:
+        db.execute('BEGIN IMMEDIATE')
+        yield db
+        db.execute('COMMIT')
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    finally:
+        db.close()
+
+
+class Trabajo:
+    """Lo que recibe la función de un tipo: el payload y cómo informar del avance."""
+
+    def __init__(self, id, tipo, payload, intento):
+        self.id = id
+        self.tipo = tipo
+        self.payload = payload
+        self.intento = intento
+
+    def progreso(self, hechos, total=None):
+        ahora = time.time()
+        db = _conectar()
+        try:
+            db.execute("UPDATE trabajos SET hechos = ?, total = ?, latido = ?, actualizado = ? WHERE id = ?",
+                       (hechos, total, ahora, ahora, self.id))
+        finally:
+            db.close()
+
+
+def encolar(tipo, payload, clave=None):
+    """Guarda un trabajo y devuelve su id.
+
+    Con clave, si ya hay un trabajo del mismo tipo y clave pendiente o en curso se
+    devuelve ese en lugar de crear otro.
+    """
+    if tipo not in _tipos:
+        raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+    ahora = time.time()
+    with _transaccion() as db:
+        if clave is not None:
+            row = db.execute("SELECT id FROM trabajos WHERE tipo = ? AND clave = ? AND estado IN (?, ?)",
+                             (tipo, clave, PENDIENTE, EN_CURSO)).fetchone()
+            if row:
+                return row[0]
+        id = uuid.uuid4().hex
+        db.execute("""
+            INSERT INTO trabajos (id, tipo, clave, estado, payload, max_intentos, disponible, creado, actualizado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (id, tipo, clave, PENDIENTE, json.dumps(payload), _tipos[tipo].intentos, ahora, ahora, ahora))
+    # Dentro de una petición el despachador de este worker lo recoge enseguida;
+    # fuera (p. ej. al preparar la app en el master de gunicorn) espera a los workers
+    if has_request_context():
+        despachador.iniciar()
+    despachador.despertar()
+    return id
+
+
+def _fecha(ts):
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+def consultar(id):
+    db = _conectar()
+    try:
+        db.row_factory = sqlite3.Row
+        row = db.execute("SELECT * FROM trabajos WHERE id = ?", (id,)).fetchone()
+    finally:
+        db.close()
+    if row is None:
+        return None
+    return {
+        'id': row['id'],
+        'tipo': row['tipo'],
+        'estado': row['estado'],
+        'intentos': row['intentos'],
+        'max_intentos': row['max_intentos'],
+        'hechos': row['hechos'],
+        'total': row['total'],
+        'progreso': round(100.0 * row['hechos'] / row['total'], 1) if row['total'] else None,
+        'resultado': json.loads(row['resultado']) if row['resultado'] is not None else None,
+        'error': row['error'],
+        'creado': _fecha(row['creado']),
+        'actualizado': _fecha(row['actualizado']),
+    }
+
+
+def aceptado(id):
+    """Respuesta 202 de los endpoints que encolan un trabajo."""
+    url = url_for('trabajos.get_job', id=id)
+    return jsonify({'job': id, 'estado': PENDIENTE, 'url': url}), 202, {'Location': url}
+
+
+class Despachador:
+    """Busca trabajos pendientes y los ejecuta en un pool de hilos de este proceso."""
+
+    def __init__(self):
+        self._pid = None
+        self._executor = None
+        self._en_curso = {}   # id -> tipo
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+
+    def iniciar(self):
+        # Los hilos no sobreviven a un fork: cada worker arranca su propio despachador
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._en_curso = {}
+            self._executor = ThreadPoolExecutor(max_workers=TRABAJOS_WORKERS, thread_name_prefix='trabajos')
+        threading.Thread(target=self._run, daemon=True, name='despachador').start()
+
+    def despertar(self):
+        self._despertar.set()
+
+    def _run(self):
+        ultimo_latido = ultima_limpieza = 0.0
+        while True:
+            try:
+                ahora = time.time()
+                if ahora - ultimo_latido >= TRABAJOS_VENCIMIENTO / 4:
+                    self._latir(ahora)
+                    _recuperar(ahora)
+                    ultimo_latido = ahora
+                if ahora - ultima_limpieza >= 3600:
+                    _limpiar(ahora)
+                    ultima_limpieza = ahora
+                self._reclamar(ahora)
+            except RuntimeError:
+                return  # Pool de hilos cerrado al salir
+            except Exception as e:
+                print(f"Error en la cola de trabajos: {e}")
+            self._despertar.wait(TRABAJOS_POLL)
+            self._despertar.clear()
+
+    def _latir(self, ahora):
+        with self._lock:
+            ids = list(self._en_curso)
+        if ids:
+            with _transaccion() as db:
+                db.executemany("UPDATE trabajos SET latido = ? WHERE id = ?", [(ahora, id) for id in ids])
+
+    def _reclamar(self, ahora):
+        with self._lock:
+            libres = TRABAJOS_WORKERS - len(self._en_curso)
+        if libres <= 0:
+            return
+        elegidos = []
+        with _transaccion() as db:
+            ocupados = dict(db.execute("SELECT tipo, COUNT(*) FROM trabajos WHERE estado = ? GROUP BY tipo",
+                                       (EN_CURSO,)).fetchall())
+            filas = db.execute("""
+                SELECT id, tipo, payload, intentos FROM trabajos
+                WHERE estado = ? AND disponible <= ? ORDER BY disponible LIMIT 100
+            """, (PENDIENTE, ahora)).fetchall()
+            for id, tipo, payload, intentos in filas:
+                definicion = _tipos.get(tipo)
+                if definicion is None or ocupados.get(tipo, 0) >= definicion.concurrencia:
+                    continue
+                ocupados[tipo] = ocupados.get(tipo, 0) + 1
+                elegidos.append(Trabajo(id, tipo, json.loads(payload), intentos + 1))
+                if len(elegidos) == libres:
+                    break
+            db.executemany("""
+                UPDATE trabajos SET estado = ?, intentos = intentos + 1, latido = ?, actualizado = ? WHERE id = ?
+            """, [(EN_CURSO, ahora, ahora, trabajo.id) for trabajo in elegidos])
+        for i, trabajo in enumerate(elegidos):
+            with self._lock:
+                self._en_curso[trabajo.id] = trabajo.tipo
+            try:
+                self._executor.submit(self._ejecutar, trabajo)
+            except RuntimeError:
+                # El intérprete está terminando: devolver a la cola lo que no llegó a empezar
+                _devolver(elegidos[i:])
+                raise
+
+    def _ejecutar(self, trabajo):
+        try:
+            # Mismo contexto que una petición: conexión del pool, JSON de la app, eventos...
+            with _app.app_context():
+                resultado = _tipos[trabajo.tipo].fn(trabajo)
+            _terminar(trabajo, resultado)
+        except Exception as e:
+            _fallar(trabajo, e)
+        finally:
+            with self._lock:
+                self._en_curso.pop(trabajo.id, None)
+            self.despertar()  # Queda un hilo libre
+
+
+def _terminar(trabajo, resultado):
+    ahora = time.time()
+    with _transaccion() as db:
+        db.execute("UPDATE trabajos SET estado = ?, resultado = ?, error = NULL, actualizado = ? WHERE id = ?",
+                   (COMPLETADO, json.dumps(resultado, default=str), ahora, trabajo.id))
+
+
+def _fallar(trabajo, error):
+    ahora = time.time()
+    print(f"Error en el trabajo {trabajo.tipo} {trabajo.id} (intento {trabajo.intento}): {error}")
+    with _transaccion() as db:
+        row = db.execute("SELECT max_intentos FROM trabajos WHERE id = ?", (trabajo.id,)).fetchone()
+        if row and trabajo.intento < row[0] and not isinstance(error, SinReintentos):
+            # Espera exponencial con algo de azar para no reintentar todos a la vez
+            espera = TRABAJOS_BACKOFF * 2 ** (trabajo.intento - 1) * random.uniform(0.8, 1.2)
+            db.execute("UPDATE trabajos SET estado = ?, error = ?, disponible = ?, actualizado = ? WHERE id = ?",
+                       (PENDIENTE, str(error), ahora + espera, ahora, trabajo.id))
+        else:
+            db.execute("UPDATE trabajos SET estado = ?, error = ?, actualizado = ? WHERE id = ?",
+                       (FALLIDO, str(error), ahora, trabajo.id))
+
+
+def _devolver(trabajos):
+    ahora = time.time()
+    with _transaccion() as db:
+        db.executemany("UPDATE trabajos SET estado = ?, intentos = intentos - 1, actualizado = ? WHERE id = ?",
+                       [(PENDIENTE, ahora, trabajo.id) for trabajo in trabajos])
+
+
+def _recuperar(ahora):
+    # Trabajos en curso de procesos que murieron o se reiniciaron: se reintentan si quedan intentos
+    limite = ahora - TRABAJOS_VENCIMIENTO
+    with _transaccion() as db:
+        db.execute("""
+            UPDATE trabajos SET estado = ?, error = 'Interrumpido: el proceso que lo ejecutaba terminó', actualizado = ?
+            WHERE estado = ? AND latido < ? AND intentos >= max_intentos
+        """, (FALLIDO, ahora, EN_CURSO, limite))
+        db.execute("UPDATE trabajos SET estado = ?, disponible = ?, actualizado = ? WHERE estado = ? AND latido < ?",
+                   (PENDIENTE, ahora, ahora, EN_CURSO, limite))
+
+
+def _limpiar(ahora):
+    with _transaccion() as db:
+        db.execute("DELETE FROM trabajos WHERE estado IN (?, ?) AND actualizado < ?",
+                   (COMPLETADO, FALLIDO, ahora - TRABAJOS_RETENCION))
+
+
+despachador = Despachador()
+
+
+def iniciar():
+    """Arranca el despachador de este proceso (en cada worker, tras el fork)."""
+    despachador.iniciar()
+
+
+def init_app(app):
+    global _app
+    _app = app
+
+
+# GET: Estado y avance de un trabajo
+@trabajos_bp.route('/jobs/<id>', methods=['GET'])
+def get_job(id):
+    try:
+        trabajo = consultar(id)
+    except sqlite3.Error as e:
+        return jsonify({'error': f'Error al consultar el trabajo: {e}'}), 500
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(trabajo), 200
@@ -0,0 +1,45 @@
+#versiones.py
+# Concurrencia optimista: la columna version de cada fila viaja como ETag y el cliente la
+# devuelve en If-Match; la escritura solo se aplica si la versión sigue siendo la misma.
+from flask import jsonify, request
+
+from repositorio import version_de
+
+
+def if_match_version():
+    """Versión pedida en If-Match (None si no hay cabecera o es '*').
+
+    Se acepta el ETag tal como lo devolvió el GET: la versión de la fila, seguida en
+    GET /empleados/<id> de las de las filas relacionadas ("7-2-5-1"), que no cuentan aquí.
+    Lanza ValueError si la cabecera no contiene una única versión numérica.
+    """
+    if not request.headers.get('If-Match'):
+        return None
+    if request.if_match.star_tag:
+        return None
+    tags = request.if_match.as_set(include_weak=True)
+    version = next(iter(tags)).split('-', 1)[0] if len(tags) == 1 else ''
+    if not version.isdigit():
+        raise ValueError('If-Match debe contener una sola versión, p. ej. "3"')
+    return int(version)
+
+
+def condicion_version(query, params, version):
+    # Añade "AND version = %s" a la consulta si el cliente envió If-Match
+    if version is None:
+        return query, params
+    return query + " AND version = %s", tuple(params) + (version,)
+
+
+def sin_cambios(connection, tabla, id, version, no_existe):
+    """Respuesta cuando la escritura no afectó a ninguna fila: 404 o, con If-Match, 412.
+
+    Solo se consulta la fila en este caso, nunca antes de escribir.
+    """
+    if version is not None:
+        actual = version_de(connection, tabla, id)
+        if actual is not None:
+            response = jsonify({'error': 'La fila cambió desde que se leyó', 'version': actual})
+            response.set_etag(str(actual))
+            return response, 412
+    return jsonify({'error': no_existe}), 404